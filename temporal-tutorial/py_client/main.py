@@ -65,7 +65,8 @@ async def handle_start_workflow(
             from_account=from_account,
             to_account=to_account,
             amount=str(parsed_amount),
-            reference=reference
+            reference=reference,
+            transfer_mode=os.getenv("TRANSFER_MODE", "two-step")
         )
         
         # Extract baggage info for the response
@@ -6,6 +6,8 @@ class PaymentDetails:
     to_account: str
     amount: str
     reference: str = ""
+    # two-step, two-step-local, atomic, atomic-local or entity (see the worker's MoneyTransferWorkflow)
+    transfer_mode: str = "two-step"
 
 @dataclass
 class WithdrawRequest:
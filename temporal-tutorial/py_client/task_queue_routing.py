@@ -0,0 +1,69 @@
+import asyncio
+import json
+import os
+import time
+import urllib.request
+from typing import FrozenSet, Optional
+from urllib.parse import urlencode
+
+# Must match the worker's `task_queues.routing_task_queue`
+ROUTING_TASK_QUEUE_SEPARATOR = "@"
+
+
+class RoutingTaskQueueResolver:
+    """
+    Picks the task queue for a new workflow when the workers poll per-routing-key
+    task queues (`WORKER_ROUTING_TASK_QUEUES=true`).
+
+    Routing keys routed to a sandbox of the worker workload go to
+    `<task queue>@<routing key>`, which only that sandbox's worker polls;
+    everything else falls back to the baseline task queue. The routed keys are
+    fetched from the route server and cached for the refresh interval.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("ROUTING_TASK_QUEUES", "false").lower() == "true"
+        self.route_server_addr = os.getenv("ROUTES_API_ROUTE_SERVER_ADDR", "http://routeserver.signadot.svc:7778")
+        self.baseline_kind = os.getenv("ROUTES_API_BASELINE_KIND", "Deployment")
+        self.baseline_namespace = os.getenv("ROUTES_API_BASELINE_NAMESPACE", "temporal")
+        self.baseline_name = os.getenv("ROUTES_API_BASELINE_NAME", "temporal-worker")
+        self.refresh_interval = float(os.getenv("ROUTES_API_REFRESH_INTERVAL_SECONDS", "10"))
+        self._routed_keys: FrozenSet[str] = frozenset()
+        self._fetched_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _fetch_routed_keys(self) -> FrozenSet[str]:
+        query = urlencode({
+            'baselineKind': self.baseline_kind,
+            'baselineNamespace': self.baseline_namespace,
+            'baselineName': self.baseline_name
+        })
+        url = f"{self.route_server_addr.rstrip('/')}/api/v1/workloads/routing-rules?{query}"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            data = json.load(response)
+        return frozenset(
+            str(rule['routingKey']) for rule in data.get('routingRules') or []
+            if isinstance(rule, dict) and rule.get('routingKey') is not None
+        )
+
+    async def _routed(self) -> FrozenSet[str]:
+        if self._lock is None:
+            # Created lazily so it binds to the server's event loop
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if time.monotonic() - self._fetched_at >= self.refresh_interval:
+                try:
+                    self._routed_keys = await asyncio.to_thread(self._fetch_routed_keys)
+                except Exception as e:
+                    # Keep the last known keys; retried on the next workflow start
+                    print(f"Error fetching routing rules: {e}")
+                else:
+                    self._fetched_at = time.monotonic()
+            return self._routed_keys
+
+    async def resolve(self, task_queue: str, routing_key: Optional[str]) -> str:
+        if not self.enabled or not routing_key:
+            return task_queue
+        if routing_key in await self._routed():
+            return f"{task_queue}{ROUTING_TASK_QUEUE_SEPARATOR}{routing_key}"
+        return task_queue
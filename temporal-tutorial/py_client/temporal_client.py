@@ -4,7 +4,11 @@ from typing import Dict
 
 from temporalio.client import Client
 from temporalio.contrib.opentelemetry import TracingInterceptor
+from opentelemetry import baggage
 from models import PaymentDetails
+from task_queue_routing import RoutingTaskQueueResolver
+
+task_queue_resolver = RoutingTaskQueueResolver()
 
 async def start_workflow_with_routing(payment_details: PaymentDetails) -> Dict:
     """
@@ -18,16 +22,23 @@ async def start_workflow_with_routing(payment_details: PaymentDetails) -> Dict:
         interceptors=[TracingInterceptor()]
     )
     
+    # Sandboxed routing keys go straight to the task queue only their worker polls
+    task_queue = await task_queue_resolver.resolve(
+        os.getenv("TASK_QUEUE", "money-transfer"),
+        baggage.get_baggage("sd-routing-key")
+    )
+    
     workflow_id = f"money-transfer-{uuid.uuid4()}"
     handle = await client.start_workflow(
         "MoneyTransferWorkflow",
         payment_details,
         id=workflow_id,
-        task_queue="money-transfer"
+        task_queue=task_queue
     )
     
     return {
         "message": f"Started workflow with ID: {handle.id}, Run ID: {handle.result_run_id}",
         "workflow_id": handle.id,
-        "run_id": handle.result_run_id
+        "run_id": handle.result_run_id,
+        "task_queue": task_queue
     } 
\ No newline at end of file
@@ -0,0 +1,322 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+logger = logging.getLogger("temporal_worker.product.account_store")
+
+T = TypeVar("T")
+
+# Demo accounts every store starts with; other accounts start at DEFAULT_BALANCE
+INITIAL_BALANCES = {
+    "acc_001": Decimal('1000.00'),
+    "acc_002": Decimal('500.00'),
+    "acc_003": Decimal('2500.00'),
+    "acc_004": Decimal('750.00')
+}
+DEFAULT_BALANCE = Decimal('1000.00')
+# Completed activity results are kept this long by default, for retries to find
+DEFAULT_RESULT_TTL_SECONDS = 86400.0
+
+# (account ID, expected version, new balance)
+BalanceUpdate = Tuple[str, int, Decimal]
+
+
+class AccountStore(ABC):
+    """
+    Storage for account balances used by BankingActivities.
+
+    Every stored balance has a version that changes with each update, so
+    concurrent read-modify-write updates can be made safe with `compare_and_set`.
+    Unknown accounts have DEFAULT_BALANCE at version 0.
+
+    An update can also record the result of the operation that made it, under
+    an idempotency key, atomically with the balance change; `get_result` then
+    returns it (until `result_ttl` seconds have passed) so a retried operation
+    is not applied twice. `compare_and_set_many` does the same for several
+    accounts and results at once, all or nothing.
+    """
+
+    def __init__(self, result_ttl: float = DEFAULT_RESULT_TTL_SECONDS):
+        self.result_ttl = result_ttl
+
+    @abstractmethod
+    async def get_account(self, account_id: str) -> Tuple[Decimal, int]:
+        """Current balance and version of `account_id`."""
+
+    @abstractmethod
+    async def compare_and_set_many(self, updates: Sequence[BalanceUpdate],
+                                   results: Sequence[Tuple[str, str]] = ()) -> bool:
+        """
+        Store every new balance if every account is still at its expected version,
+        and record the (idempotency key, result) pairs with them; if any account
+        changed meanwhile, store nothing and return False.
+        """
+
+    @abstractmethod
+    async def get_result(self, key: str) -> Optional[str]:
+        """The result recorded under `key`, unless it expired."""
+
+    async def compare_and_set(self, account_id: str, expected_version: int, balance: Decimal,
+                              result: Optional[Tuple[str, str]] = None) -> bool:
+        """
+        Store `balance` if the account is still at `expected_version`; False if it
+        changed meanwhile. `result` is an (idempotency key, result) pair recorded
+        along with the new balance.
+        """
+        return await self.compare_and_set_many([(account_id, expected_version, balance)], [result] if result else [])
+
+    async def get_accounts(self, account_ids: Iterable[str]) -> Dict[str, Tuple[Decimal, int]]:
+        """Current balance and version of each of `account_ids`."""
+        return {account_id: await self.get_account(account_id) for account_id in set(account_ids)}
+
+    async def get_results(self, keys: Iterable[str]) -> Dict[str, str]:
+        """The unexpired results recorded under any of `keys`."""
+        results = {}
+        for key in keys:
+            result = await self.get_result(key)
+            if result is not None:
+                results[key] = result
+        return results
+
+    async def get_balance(self, account_id: str) -> Decimal:
+        """Current balance of `account_id`."""
+        balance, _ = await self.get_account(account_id)
+        return balance
+
+    async def close(self) -> None:
+        """Release the store's connections."""
+
+
+class MemoryAccountStore(AccountStore):
+    """Balances kept in this process only; the default, for demos and tests."""
+
+    def __init__(self, result_ttl: float = DEFAULT_RESULT_TTL_SECONDS):
+        super().__init__(result_ttl)
+        # account ID -> (balance, version)
+        self._accounts: Dict[str, Tuple[Decimal, int]] = {
+            account_id: (balance, 1) for account_id, balance in INITIAL_BALANCES.items()
+        }
+        # key -> (result, expiry); insertion order is expiry order as the TTL is fixed
+        self._results: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+    async def get_account(self, account_id: str) -> Tuple[Decimal, int]:
+        return self._accounts.get(account_id, (DEFAULT_BALANCE, 0))
+
+    async def compare_and_set_many(self, updates: Sequence[BalanceUpdate],
+                                   results: Sequence[Tuple[str, str]] = ()) -> bool:
+        for account_id, expected_version, _ in updates:
+            if self._accounts.get(account_id, (DEFAULT_BALANCE, 0))[1] != expected_version:
+                return False
+        for account_id, expected_version, balance in updates:
+            self._accounts[account_id] = (balance, expected_version + 1)
+        if results:
+            now = time.time()
+            while self._results and next(iter(self._results.values()))[1] <= now:
+                self._results.popitem(last=False)
+            for key, value in results:
+                self._results.pop(key, None)
+                self._results[key] = (value, now + self.result_ttl)
+        return True
+
+    async def get_result(self, key: str) -> Optional[str]:
+        entry = self._results.get(key)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+
+class SqliteAccountStore(AccountStore):
+    """
+    Balances in a SQLite database in WAL mode, so local runs have real storage
+    without any external service.
+
+    Queries run on a pool of `pool_size` connections, each used by one thread at
+    a time, so readers proceed in parallel with the single writer WAL allows.
+    Every query uses a fixed SQL string, which sqlite3 compiles once per
+    connection and then reuses from its statement cache. Expired results are
+    deleted every `_PURGE_EVERY` recorded results.
+    """
+
+    _SELECT_ACCOUNT = "SELECT balance, version FROM accounts WHERE account_id = ?"
+    _UPDATE_IF_VERSION = "UPDATE accounts SET balance = ?, version = version + 1 WHERE account_id = ? AND version = ?"
+    _INSERT_IF_ABSENT = "INSERT OR IGNORE INTO accounts (account_id, balance, version) VALUES (?, ?, 1)"
+    _SELECT_RESULT = "SELECT result FROM results WHERE key = ? AND expires_at > ?"
+    _INSERT_RESULT = "INSERT OR REPLACE INTO results (key, result, expires_at) VALUES (?, ?, ?)"
+    _PURGE_RESULTS = "DELETE FROM results WHERE expires_at <= ?"
+    _PURGE_EVERY = 1000
+
+    def __init__(self, path: str, pool_size: int = 4, busy_timeout: float = 5.0,
+                 result_ttl: float = DEFAULT_RESULT_TTL_SECONDS):
+        super().__init__(result_ttl)
+        self.path = path
+        self.pool_size = pool_size
+        self.busy_timeout = busy_timeout
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="account-store")
+        # Opened on first use, on the pool's threads
+        self._connections: Optional["asyncio.Queue[sqlite3.Connection]"] = None
+        self._opening: Optional["asyncio.Future[List[sqlite3.Connection]]"] = None
+        self._results_recorded = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Handed between pool threads, but only ever used by one at a time
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _open(self) -> List[sqlite3.Connection]:
+        """Connect and create the schema; runs on a pool thread, as it blocks on the disk."""
+        first = self._connect()
+        first.execute(
+            "CREATE TABLE IF NOT EXISTS accounts "
+            "(account_id TEXT PRIMARY KEY, balance TEXT NOT NULL, version INTEGER NOT NULL DEFAULT 1)"
+        )
+        # Databases created before balances were versioned
+        columns = {row[1] for row in first.execute("PRAGMA table_info(accounts)")}
+        if "version" not in columns:
+            first.execute("ALTER TABLE accounts ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        first.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result TEXT NOT NULL, expires_at REAL NOT NULL)")
+        first.execute("CREATE INDEX IF NOT EXISTS results_expires_at ON results (expires_at)")
+        first.executemany(
+            self._INSERT_IF_ABSENT,
+            [(account_id, str(balance)) for account_id, balance in INITIAL_BALANCES.items()]
+        )
+        connections = [first] + [self._connect() for _ in range(self.pool_size - 1)]
+        logger.info(f"SqliteAccountStore: Opened {self.path} with {self.pool_size} connections")
+        return connections
+
+    async def _connection_pool(self) -> "asyncio.Queue[sqlite3.Connection]":
+        if self._opening is None:
+            # No await before the assignment, so concurrent first calls open the pool once
+            self._opening = asyncio.get_running_loop().run_in_executor(self._executor, self._open)
+        try:
+            # Shielded: a cancelled caller must not cancel the opening the others wait for
+            connections = await asyncio.shield(self._opening)
+        except Exception:
+            self._opening = None
+            raise
+        if self._connections is None:
+            self._connections = asyncio.Queue()
+            for conn in connections:
+                self._connections.put_nowait(conn)
+        return self._connections
+
+    async def _run(self, query: Callable[[sqlite3.Connection], T]) -> T:
+        pool = self._connections if self._connections is not None else await self._connection_pool()
+        conn = await pool.get()
+        future = asyncio.get_running_loop().run_in_executor(self._executor, query, conn)
+
+        def release(done: "asyncio.Future[T]") -> None:
+            # Only once the query is done with the connection, even if the caller was cancelled
+            pool.put_nowait(conn)
+            if not done.cancelled():
+                done.exception()  # retrieved here, as a cancelled caller never awaits it
+
+        future.add_done_callback(release)
+        # Shielded: cancelling the caller cannot stop a query already running on a pool thread
+        return await asyncio.shield(future)
+
+    async def get_account(self, account_id: str) -> Tuple[Decimal, int]:
+        row = await self._run(lambda conn: conn.execute(self._SELECT_ACCOUNT, (account_id,)).fetchone())
+        return (Decimal(row[0]), row[1]) if row is not None else (DEFAULT_BALANCE, 0)
+
+    def _update(self, conn: sqlite3.Connection, update: BalanceUpdate) -> bool:
+        account_id, expected_version, balance = update
+        if expected_version == 0:
+            return conn.execute(self._INSERT_IF_ABSENT, (account_id, str(balance))).rowcount == 1
+        return conn.execute(self._UPDATE_IF_VERSION, (str(balance), account_id, expected_version)).rowcount == 1
+
+    async def compare_and_set(self, account_id: str, expected_version: int, balance: Decimal,
+                              result: Optional[Tuple[str, str]] = None) -> bool:
+        if result is None:
+            # A single statement is atomic on its own
+            return await self._run(lambda conn: self._update(conn, (account_id, expected_version, balance)))
+        return await super().compare_and_set(account_id, expected_version, balance, result)
+
+    async def compare_and_set_many(self, updates: Sequence[BalanceUpdate],
+                                   results: Sequence[Tuple[str, str]] = ()) -> bool:
+        now = time.time()
+        purge = self._results_recorded // self._PURGE_EVERY != (self._results_recorded + len(results)) // self._PURGE_EVERY
+        self._results_recorded += len(results)
+
+        def update_and_record(conn: sqlite3.Connection) -> bool:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if not all(self._update(conn, update) for update in updates):
+                    conn.execute("ROLLBACK")
+                    return False
+                conn.executemany(self._INSERT_RESULT, [(key, value, now + self.result_ttl) for key, value in results])
+                if purge:
+                    conn.execute(self._PURGE_RESULTS, (now,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            return True
+
+        return await self._run(update_and_record)
+
+    async def get_result(self, key: str) -> Optional[str]:
+        row = await self._run(lambda conn: conn.execute(self._SELECT_RESULT, (key, time.time())).fetchone())
+        return row[0] if row is not None else None
+
+    async def get_accounts(self, account_ids: Iterable[str]) -> Dict[str, Tuple[Decimal, int]]:
+        account_ids = list(set(account_ids))
+        if not account_ids:
+            return {}
+        query = f"SELECT account_id, balance, version FROM accounts WHERE account_id IN ({','.join('?' * len(account_ids))})"
+        rows = await self._run(lambda conn: conn.execute(query, account_ids).fetchall())
+        accounts = {account_id: (DEFAULT_BALANCE, 0) for account_id in account_ids}
+        accounts.update((account_id, (Decimal(balance), version)) for account_id, balance, version in rows)
+        return accounts
+
+    async def get_results(self, keys: Iterable[str]) -> Dict[str, str]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        query = f"SELECT key, result FROM results WHERE expires_at > ? AND key IN ({','.join('?' * len(keys))})"
+        rows = await self._run(lambda conn: conn.execute(query, [time.time(), *keys]).fetchall())
+        return dict(rows)
+
+    async def close(self) -> None:
+        if self._connections is not None:
+            while not self._connections.empty():
+                self._connections.get_nowait().close()
+            self._connections = None
+        self._opening = None
+        self._executor.shutdown(wait=False)
+
+
+def account_store_from_env() -> AccountStore:
+    """
+    The account store selected by ACCOUNT_STORE (`memory` or `sqlite`). A memory
+    store is per process, so with WORKER_PROCESSES > 1 the default is `sqlite`, in
+    the temporary directory the pool already uses for its shared state unless
+    ACCOUNT_STORE_PATH is set (the working directory may be read-only).
+    """
+    worker_processes = int(os.environ.get("WORKER_PROCESSES", "1"))
+    kind = os.environ.get("ACCOUNT_STORE", "sqlite" if worker_processes > 1 else "memory").lower()
+    if kind == "memory" and worker_processes > 1:
+        logger.warning(
+            f"ACCOUNT_STORE=memory with WORKER_PROCESSES={worker_processes}: each worker process keeps "
+            f"its own balances, so transfers handled by different processes see different accounts"
+        )
+    result_ttl = float(os.environ.get("ACCOUNT_RESULT_TTL_SECONDS", str(DEFAULT_RESULT_TTL_SECONDS)))
+    if kind == "memory":
+        return MemoryAccountStore(result_ttl=result_ttl)
+    if kind == "sqlite":
+        return SqliteAccountStore(
+            os.environ.get("ACCOUNT_STORE_PATH") or
+            (os.path.join(tempfile.gettempdir(), "accounts.db") if worker_processes > 1 else "accounts.db"),
+            pool_size=int(os.environ.get("ACCOUNT_STORE_POOL_SIZE", "4")),
+            result_ttl=result_ttl
+        )
+    raise ValueError(f"Unknown ACCOUNT_STORE '{kind}', expected 'memory' or 'sqlite'")
@@ -1,105 +1,416 @@
-import uuid
 import asyncio
+import contextlib
+import dataclasses
+import json
+import os
+import random
+import uuid
 from decimal import Decimal
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Type, TypeVar
 from temporalio import activity
+from temporalio.client import Client
 from temporalio.exceptions import ApplicationError
-from models import WithdrawRequest, WithdrawResponse, DepositRequest, DepositResponse
+from models import (
+    WithdrawRequest, WithdrawResponse, DepositRequest, DepositResponse, TransferRequest, TransferResponse,
+    TransferResultBatch, AccountCheckpoint, AccountCheckpointResponse, AccountEntityInput, AccountEntitySignal
+)
+from account_store import AccountStore, account_store_from_env
 
 import logging
 logger = logging.getLogger("temporal_worker.product.activities")
 
+R = TypeVar("R")
+
+
+def _debit(current_balance: Decimal, amount: str) -> Decimal:
+    # Business logic failure - Temporal won't retry this
+    if current_balance < Decimal(amount):
+        raise ApplicationError(
+            f"Insufficient funds: balance={current_balance}, requested={amount}",
+            non_retryable=True
+        )
+    return current_balance - Decimal(amount)
+
+
+def _credit(current_balance: Decimal, amount: str) -> Decimal:
+    return current_balance + Decimal(amount)
+
 class BankingActivities:
-    """Banking activities implementation"""
+    """
+    Banking activities implementation
+
+    Balance updates are read-modify-write with an optimistic compare-and-set, retried
+    on conflicts, so concurrent transfers (in this or other worker processes) never
+    lose updates while unrelated accounts proceed in parallel. With ACCOUNT_LOCK_SHARDS
+    set, updates to the same account within a process also queue on a lock shard
+    instead of racing, trading some throughput for fewer wasted store round trips.
+
+    Each balance change is recorded together with the activity's response under an
+    idempotency key (workflow ID, run ID, activity ID and payment reference), so a
+    retry after a lost result returns the recorded response instead of applying the
+    change again. Recorded responses expire after ACCOUNT_RESULT_TTL_SECONDS.
+
+    `transfer` debits one account and credits another in a single compare-and-set
+    of both balances, so a transfer costs one activity and one store transaction.
+
+    `withdraw_batch`/`deposit_batch` apply many requests in chunks of
+    ACCOUNT_BATCH_CHUNK_SIZE: each chunk costs one read of its recorded results,
+    one read of its accounts and one all-or-nothing write of every changed balance
+    and every item's response, whatever the number of requests per account.
+    """
+    
+    def __init__(self, store: Optional[AccountStore] = None):
+        # Balances live in the store selected by ACCOUNT_STORE unless one is passed in
+        self.store = store if store is not None else account_store_from_env()
+        self.update_attempts = int(os.environ.get("ACCOUNT_UPDATE_ATTEMPTS", "20"))
+        self.lock_shards = int(os.environ.get("ACCOUNT_LOCK_SHARDS", "0"))
+        self.batch_chunk_size = int(os.environ.get("ACCOUNT_BATCH_CHUNK_SIZE", "500"))
+        # Created on first use, inside the event loop
+        self._locks: Optional[List[asyncio.Lock]] = None
+        # Compare-and-set conflicts and deduplicated retries so far (reported by the benchmarks)
+        self.conflicts = 0
+        self.deduplicated = 0
     
     @activity.defn
     async def withdraw(self, request: WithdrawRequest) -> WithdrawResponse:
         """Withdraw money from account"""
         logger.info(f"Processing withdrawal: {request.account_id}, amount: {request.amount}")
         
-        # Get current balance
-        current_balance = await self._get_account_balance(request.account_id)
-        
-        # Business logic failure - Temporal won't retry this
-        if current_balance < Decimal(request.amount):
-            raise ApplicationError(
-                f"Insufficient funds: balance={current_balance}, requested={request.amount}",
-                non_retryable=True
-            )
+        dedup_key = self._dedup_key(request.reference)
+        completed = await self._completed_response(dedup_key, WithdrawResponse)
+        if completed is not None:
+            return completed
         
-        # Simulate withdrawal processing time
-        await asyncio.sleep(0.5)
+        def debit(current_balance: Decimal) -> Decimal:
+            return _debit(current_balance, request.amount)
         
         # Generate transaction ID
         transaction_id = str(uuid.uuid4())
         
-        # Calculate new balance
-        new_balance = current_balance - Decimal(request.amount)
+        def respond(new_balance: Decimal) -> WithdrawResponse:
+            return WithdrawResponse(
+                transaction_id=transaction_id,
+                account_id=request.account_id,
+                amount=request.amount,
+                balance_after=str(new_balance),
+                success=True,
+                message="Withdrawal successful"
+            )
         
         # Update account balance - if this fails, Temporal will retry
-        await self._update_account_balance(request.account_id, new_balance)
+        response = await self._update_account_balance(request.account_id, debit, respond, dedup_key, WithdrawResponse)
         
-        logger.info(f"Withdrawal successful: {transaction_id}")
+        logger.info(f"Withdrawal successful: {response.transaction_id}")
         
-        return WithdrawResponse(
-            transaction_id=transaction_id,
-            account_id=request.account_id,
-            amount=request.amount,
-            balance_after=str(new_balance),
-            success=True,
-            message="Withdrawal successful"
-        )
+        return response
     
     @activity.defn
     async def deposit(self, request: DepositRequest) -> DepositResponse:
         """Deposit money to account"""
         logger.info(f"Processing deposit: {request.account_id}, amount: {request.amount}")
         
-        # Get current balance
-        current_balance = await self._get_account_balance(request.account_id)
+        dedup_key = self._dedup_key(request.reference)
+        completed = await self._completed_response(dedup_key, DepositResponse)
+        if completed is not None:
+            return completed
         
-        # Simulate deposit processing time
-        await asyncio.sleep(0.3)
+        def credit(current_balance: Decimal) -> Decimal:
+            return _credit(current_balance, request.amount)
         
         # Generate transaction ID
         transaction_id = str(uuid.uuid4())
         
-        # Calculate new balance
-        new_balance = current_balance + Decimal(request.amount)
+        def respond(new_balance: Decimal) -> DepositResponse:
+            return DepositResponse(
+                transaction_id=transaction_id,
+                account_id=request.account_id,
+                amount=request.amount,
+                balance_after=str(new_balance),
+                success=True,
+                message="Deposit successful"
+            )
         
         # Update account balance - if this fails, Temporal will retry
-        await self._update_account_balance(request.account_id, new_balance)
+        response = await self._update_account_balance(request.account_id, credit, respond, dedup_key, DepositResponse)
+        
+        logger.info(f"Deposit successful: {response.transaction_id}")
         
-        logger.info(f"Deposit successful: {transaction_id}")
+        return response
+    
+    @activity.defn
+    async def transfer(self, request: TransferRequest) -> TransferResponse:
+        """Move money between accounts: both legs are applied together or not at all"""
+        logger.info(f"Processing transfer: {request.from_account} -> {request.to_account}, amount: {request.amount}")
         
-        return DepositResponse(
-            transaction_id=transaction_id,
-            account_id=request.account_id,
-            amount=request.amount,
-            balance_after=str(new_balance),
-            success=True,
-            message="Deposit successful"
+        dedup_key = self._dedup_key(request.reference)
+        completed = await self._completed_response(dedup_key, TransferResponse)
+        if completed is not None:
+            return completed
+        
+        transaction_id = str(uuid.uuid4())
+        
+        async def attempt(n: int) -> Optional[TransferResponse]:
+            if n:
+                completed = await self._completed_response(dedup_key, TransferResponse)
+                if completed is not None:
+                    return completed
+            accounts = await self.store.get_accounts([request.from_account, request.to_account])
+            balances = {account_id: balance for account_id, (balance, _) in accounts.items()}
+            balances[request.from_account] = _debit(balances[request.from_account], request.amount)
+            balances[request.to_account] = _credit(balances[request.to_account], request.amount)
+            response = TransferResponse(
+                transaction_id=transaction_id,
+                from_account=request.from_account,
+                to_account=request.to_account,
+                amount=request.amount,
+                from_balance_after=str(balances[request.from_account]),
+                to_balance_after=str(balances[request.to_account]),
+                success=True,
+                message="Transfer successful"
+            )
+            updates = [(account_id, version, balances[account_id]) for account_id, (_, version) in accounts.items()]
+            recorded = (dedup_key, json.dumps(dataclasses.asdict(response)))
+            if not await self.store.compare_and_set_many(updates, [recorded]):
+                return None
+            logger.info(f"Transfer successful: {response.transaction_id}")
+            return response
+        
+        return await self._retry_on_conflict(
+            [request.from_account, request.to_account], attempt,
+            f"accounts {request.from_account}, {request.to_account}"
         )
     
-    async def _get_account_balance(self, account_id: str) -> Decimal:
-        """Simulate getting account balance from database"""
-        # In real implementation, this would query actual database
-        # For demo purposes, return mock balances
-        mock_balances = {
-            "acc_001": Decimal('1000.00'),
-            "acc_002": Decimal('500.00'),
-            "acc_003": Decimal('2500.00'),
-            "acc_004": Decimal('750.00')
-        }
-        
-        # Simulate database query delay
-        await asyncio.sleep(0.1)
-        
-        return mock_balances.get(account_id, Decimal('1000.00'))
+    @activity.defn
+    async def checkpoint_account(self, checkpoint: AccountCheckpoint) -> AccountCheckpointResponse:
+        """Apply an account entity's net balance change to the account store"""
+        logger.info(f"Checkpointing account {checkpoint.account_id}: {checkpoint.delta}")
+        
+        dedup_key = self._dedup_key(checkpoint.reference)
+        completed = await self._completed_response(dedup_key, AccountCheckpointResponse)
+        if completed is not None:
+            return completed
+        
+        def apply_delta(current_balance: Decimal) -> Decimal:
+            return current_balance + Decimal(checkpoint.delta)
+        
+        def respond(new_balance: Decimal) -> AccountCheckpointResponse:
+            return AccountCheckpointResponse(account_id=checkpoint.account_id, balance_after=str(new_balance))
+        
+        return await self._update_account_balance(
+            checkpoint.account_id, apply_delta, respond, dedup_key, AccountCheckpointResponse
+        )
+    
+    @activity.defn
+    async def withdraw_batch(self, requests: List[WithdrawRequest]) -> List[WithdrawResponse]:
+        """Withdraw money from many accounts; a request with insufficient funds fails on its own"""
+        logger.info(f"Processing withdrawal batch: {len(requests)} requests")
+        return await self._apply_batch(requests, _debit, WithdrawResponse, "Withdrawal")
+    
+    @activity.defn
+    async def deposit_batch(self, requests: List[DepositRequest]) -> List[DepositResponse]:
+        """Deposit money to many accounts"""
+        logger.info(f"Processing deposit batch: {len(requests)} requests")
+        return await self._apply_batch(requests, _credit, DepositResponse, "Deposit")
+    
+    async def _apply_batch(self, requests: List[Any], change: Callable[[Decimal, str], Decimal],
+                           response_type: Type[R], operation: str) -> List[R]:
+        responses: List[Any] = [None] * len(requests)
+        for start in range(0, len(requests), self.batch_chunk_size):
+            chunk = range(start, min(start + self.batch_chunk_size, len(requests)))
+            await self._apply_chunk(requests, chunk, change, response_type, operation, responses)
+            activity.heartbeat(chunk.stop)
+        applied = sum(1 for response in responses if response.success)
+        logger.info(f"{operation} batch done: {applied}/{len(requests)} applied")
+        return responses
+    
+    async def _apply_chunk(self, requests: List[Any], chunk: range, change: Callable[[Decimal, str], Decimal],
+                           response_type: Type[R], operation: str, responses: List[Any]):
+        """Apply `requests[chunk]` in request order, recording each item's response under its own key"""
+        dedup_keys = {i: self._dedup_key(f"{i}:{requests[i].reference}") for i in chunk}
+        
+        async def attempt(n: int) -> Optional[bool]:
+            recorded = await self.store.get_results(dedup_keys.values())
+            pending = []
+            for i in chunk:
+                if dedup_keys[i] in recorded:
+                    responses[i] = response_type(**json.loads(recorded[dedup_keys[i]]))
+                else:
+                    pending.append(i)
+            if not pending:
+                self.deduplicated += len(chunk)
+                return True
+            accounts = await self.store.get_accounts(requests[i].account_id for i in pending)
+            balances = {account_id: balance for account_id, (balance, _) in accounts.items()}
+            results = []
+            for i in pending:
+                request = requests[i]
+                try:
+                    balances[request.account_id] = change(balances[request.account_id], request.amount)
+                    transaction_id, success, message = str(uuid.uuid4()), True, f"{operation} successful"
+                except ApplicationError as e:
+                    transaction_id, success, message = "", False, e.message
+                responses[i] = response_type(
+                    transaction_id=transaction_id,
+                    account_id=request.account_id,
+                    amount=request.amount,
+                    balance_after=str(balances[request.account_id]),
+                    success=success,
+                    message=message
+                )
+                results.append((dedup_keys[i], json.dumps(dataclasses.asdict(responses[i]))))
+            # Every account read is written back (even if unchanged), so failed items are decided on current balances
+            updates = [(account_id, version, balances[account_id]) for account_id, (_, version) in accounts.items()]
+            if not await self.store.compare_and_set_many(updates, results):
+                return None
+            self.deduplicated += len(chunk) - len(pending)
+            return True
+        
+        # A retried activity skips the chunks already applied: their responses are recorded
+        await self._retry_on_conflict(
+            {requests[i].account_id for i in chunk}, attempt,
+            f"the accounts of batch items {chunk.start}-{chunk.stop - 1}"
+        )
+    
+    def _dedup_key(self, reference: str) -> str:
+        """Idempotency key of the current activity; the same for every retry of it"""
+        info = activity.info()
+        return f"{info.workflow_id}/{info.workflow_run_id}/{info.activity_id}/{reference}"
+    
+    async def _completed_response(self, dedup_key: str, response_type: Type[R]) -> Optional[R]:
+        """The response recorded by an earlier attempt of this activity, if it already applied its change"""
+        recorded = await self.store.get_result(dedup_key)
+        if recorded is None:
+            return None
+        self.deduplicated += 1
+        logger.info(f"Already applied, returning the recorded result: {dedup_key}")
+        return response_type(**json.loads(recorded))
+    
+    @contextlib.asynccontextmanager
+    async def _account_locks(self, account_ids: Iterable[str]) -> AsyncIterator[None]:
+        """Hold the in-process lock shards of `account_ids` (none unless ACCOUNT_LOCK_SHARDS is set)."""
+        if self.lock_shards <= 0:
+            yield
+            return
+        if self._locks is None:
+            self._locks = [asyncio.Lock() for _ in range(self.lock_shards)]
+        async with contextlib.AsyncExitStack() as stack:
+            # Always taken in shard order, so updates sharing accounts cannot deadlock
+            for shard in sorted({hash(account_id) % self.lock_shards for account_id in account_ids}):
+                await stack.enter_async_context(self._locks[shard])
+            yield
+    
+    async def _retry_on_conflict(self, account_ids: Iterable[str], attempt: Callable[[int], Awaitable[Optional[R]]],
+                                 accounts: str) -> R:
+        """
+        Run `attempt(n)`, a read-modify-write of `account_ids` ending in a compare-and-set,
+        until it returns a result rather than None for a conflict, under the accounts'
+        lock shards. `accounts` describes them in the error raised after too many conflicts.
+        """
+        async with self._account_locks(account_ids):
+            for n in range(self.update_attempts):
+                result = await attempt(n)
+                if result is not None:
+                    return result
+                self.conflicts += 1
+                # Changed since we read it: back off (with jitter, so the racers spread out) and re-read
+                await asyncio.sleep(random.uniform(0, min(0.05, 0.001 * 2 ** n)))
+        # Retryable: Temporal retries the activity after its backoff
+        raise ApplicationError(f"Too many concurrent updates to {accounts}")
     
-    async def _update_account_balance(self, account_id: str, new_balance: Decimal):
-        """Simulate updating account balance in database"""
-        # In real implementation, this would update actual database
-        logger.info(f"Updated balance for {account_id}: {new_balance}")
+    async def _update_account_balance(self, account_id: str, update: Callable[[Decimal], Decimal],
+                                      respond: Callable[[Decimal], R], dedup_key: str,
+                                      response_type: Type[R]) -> R:
+        """
+        Apply `update` to the account balance in the account store, recording and
+        returning `respond(new balance)` (a `response_type`) under `dedup_key`
+        """
+        async def attempt(n: int) -> Optional[R]:
+            if n:
+                # A concurrent attempt of this same activity may be what changed the balance
+                completed = await self._completed_response(dedup_key, response_type)
+                if completed is not None:
+                    return completed
+            current_balance, version = await self.store.get_account(account_id)
+            new_balance = update(current_balance)
+            response = respond(new_balance)
+            recorded = (dedup_key, json.dumps(dataclasses.asdict(response)))
+            if not await self.store.compare_and_set(account_id, version, new_balance, recorded):
+                return None
+            logger.info(f"Updated balance for {account_id}: {new_balance}")
+            return response
         
-        # Simulate database update delay
-        await asyncio.sleep(0.1)
\ No newline at end of file
+        return await self._retry_on_conflict([account_id], attempt, f"account {account_id}")
+
+class AccountEntityActivities:
+    """
+    Delivers debit/credit signals to AccountEntityWorkflows, starting the entity on
+    `task_queue` if it is not running (signal-with-start).
+
+    Uses `client` or, by default, a connection to TEMPORAL_SERVER_URL made on first
+    use. That connection has no tracing interceptor, so an entity, which serves
+    every transfer of its account, never inherits one transfer's routing key.
+    """
+
+    def __init__(self, task_queue: str, client: Optional[Client] = None):
+        self.task_queue = task_queue
+        self._client = client
+        # Created on first use, inside the event loop
+        self._connect_lock: Optional[asyncio.Lock] = None
+
+    async def _get_client(self) -> Client:
+        if self._client is None:
+            if self._connect_lock is None:
+                self._connect_lock = asyncio.Lock()
+            async with self._connect_lock:
+                if self._client is None:
+                    self._client = await Client.connect(os.environ["TEMPORAL_SERVER_URL"])
+        return self._client
+
+    @activity.defn
+    async def signal_account_entity(self, request: AccountEntitySignal) -> None:
+        """Signal an account's entity workflow, starting it first if needed"""
+        client = await self._get_client()
+        await client.start_workflow(
+            "AccountEntityWorkflow",
+            AccountEntityInput(account_id=request.account_id),
+            id=request.workflow_id,
+            task_queue=self.task_queue,
+            start_signal=request.signal,
+            start_signal_args=[request.operation]
+        )
+        logger.info(f"Signalled {request.signal} {request.operation.operation_id} to {request.workflow_id}")
+
+
+class TransferResultSink:
+    """
+    Where bulk transfers stream their per-transfer results, a batch at a time, so
+    no workflow has to carry them in its history or result.
+
+    With TRANSFER_RESULTS_DIR set, each batch is written as JSON lines to
+    `<dir>/<bulk ID>/<offset>.jsonl`, replacing the file atomically, so a retried
+    activity rewrites the same file instead of duplicating results. Otherwise
+    batches are only logged.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory if directory is not None else os.environ.get("TRANSFER_RESULTS_DIR", "")
+
+    @activity.defn
+    def record_transfer_results(self, batch: TransferResultBatch) -> None:
+        """Record the results of one batch of a bulk transfer"""
+        failed = [result for result in batch.results if not result.success]
+        logger.info(
+            f"Bulk transfer {batch.bulk_id}: transfers {batch.offset}-{batch.offset + len(batch.results) - 1} done, "
+            f"{len(failed)} failed"
+        )
+        for result in failed:
+            logger.warning(f"Bulk transfer {batch.bulk_id}: transfer {result.reference or '(no reference)'} failed: {result.message}")
+        if not self.directory:
+            return
+        directory = os.path.join(self.directory, batch.bulk_id.replace("/", "_"))
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{batch.offset:010d}.jsonl")
+        with open(f"{path}.tmp", "w") as f:
+            for result in batch.results:
+                f.write(json.dumps(dataclasses.asdict(result)) + "\n")
+        os.replace(f"{path}.tmp", path)
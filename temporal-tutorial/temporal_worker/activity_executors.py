@@ -0,0 +1,143 @@
+import asyncio
+import functools
+import inspect
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from temporalio import activity
+
+import metrics
+
+logger = logging.getLogger("temporal_worker.activity_executors")
+
+THREAD_POOL = "thread"
+PROCESS_POOL = "process"
+_POOLS = (THREAD_POOL, PROCESS_POOL)
+_POOL_ATTR = "__temporal_worker_pool__"
+
+
+def offload(pool: str) -> Callable[[Callable], Callable]:
+    """
+    Run a sync activity in the worker's thread pool (blocking I/O, the default for
+    sync activities) or process pool (CPU-bound work), e.g.:
+
+        @activity.defn
+        @offload(PROCESS_POOL)
+        def score_fraud(request: ScoreRequest) -> float: ...
+
+    Process pool activities, their arguments and results must be picklable; they
+    cannot use `activity.info()` or heartbeat, and cancellation does not reach them.
+    """
+    if pool not in _POOLS:
+        raise ValueError(f"Unknown activity pool '{pool}', expected one of {', '.join(_POOLS)}")
+
+    def mark(fn: Callable) -> Callable:
+        setattr(fn, _POOL_ATTR, pool)
+        return fn
+
+    return mark
+
+
+def _timed_call(fn: Callable, args: Tuple[Any, ...]) -> Tuple[float, Any]:
+    """Run `fn` in a pool worker, returning when it started along with its result."""
+    started_at = time.time()
+    return started_at, fn(*args)
+
+
+class TimedThreadPoolExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that reports how long each call waited for a free thread."""
+
+    def submit(self, fn: Callable, /, *args: Any, **kwargs: Any) -> Future:
+        submitted_at = time.monotonic()
+
+        def timed() -> Any:
+            metrics.observe_activity_queueing(THREAD_POOL, time.monotonic() - submitted_at)
+            return fn(*args, **kwargs)
+
+        return super().submit(timed)
+
+
+class ActivityExecutors:
+    """
+    Thread and process pools for sync activities.
+
+    The thread pool is every Worker's `activity_executor`: sync activities assigned
+    to it are registered unchanged, so Temporal runs them there with thread-safe
+    heartbeating and cancellation. Activities assigned to the process pool (by
+    `offload` or WORKER_ACTIVITY_POOLS) are registered as async wrappers that submit
+    them to it, keeping CPU-bound work off the event loop serving polling and
+    routing. Queueing delay is measured per pool (for a thread pool passed in, only
+    if it is a TimedThreadPoolExecutor). Pools not passed in are created on first
+    use and owned, i.e. shut down by `shutdown`.
+    """
+
+    def __init__(self, thread_pool: Optional[ThreadPoolExecutor] = None,
+                 process_pool: Optional[ProcessPoolExecutor] = None, max_concurrent_activities: int = 100):
+        self._pools: Dict[str, Optional[Executor]] = {THREAD_POOL: thread_pool, PROCESS_POOL: process_pool}
+        self._owned: List[Executor] = []
+        # One thread per activity slot by default, so no sync activity waits for a thread
+        self.threads = int(os.environ.get("WORKER_ACTIVITY_THREADS", "0")) or max_concurrent_activities
+        self.processes = int(os.environ.get("WORKER_ACTIVITY_PROCESSES", "0")) or os.cpu_count() or 1
+        # Activity name -> pool, overriding `offload`, e.g. "calculate_fee=process,render_receipt=thread"
+        self.assignments: Dict[str, str] = {}
+        for entry in os.environ.get("WORKER_ACTIVITY_POOLS", "").split(","):
+            if entry.strip():
+                name, _, pool = entry.partition("=")
+                if pool.strip() not in _POOLS:
+                    raise ValueError(f"WORKER_ACTIVITY_POOLS: unknown pool '{pool.strip()}' for activity '{name.strip()}'")
+                self.assignments[name.strip()] = pool.strip()
+
+    def _executor(self, pool: str) -> Executor:
+        executor = self._pools[pool]
+        if executor is None:
+            if pool == THREAD_POOL:
+                executor = TimedThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="activity")
+            else:
+                # Spawned, like the worker pool: forking a process running the SDK's threads is unsafe
+                executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"ActivityExecutors: Created {pool} pool")
+            self._pools[pool] = executor
+            self._owned.append(executor)
+        return executor
+
+    def thread_pool(self) -> ThreadPoolExecutor:
+        """The `activity_executor` for Workers: runs the sync activities left unwrapped by `wrap`."""
+        return self._executor(THREAD_POOL)
+
+    def wrap(self, fn: Callable) -> Callable:
+        """
+        Return the activity to register for `fn`: async activities and thread pool ones
+        as-is, process pool ones wrapped to run there.
+        """
+        if inspect.iscoroutinefunction(fn):
+            return fn
+        name = activity._Definition.must_from_callable(fn).name
+        pool = self.assignments.get(name) or getattr(fn, _POOL_ATTR, THREAD_POOL)
+        if pool == THREAD_POOL:
+            return fn
+        executors = self
+
+        # Not `updated`: the wrapper gets its own activity definition, not a copy of fn's
+        @functools.wraps(fn, updated=())
+        async def run_in_pool(*args: Any) -> Any:
+            submitted_at = time.time()
+            started_at, result = await asyncio.get_running_loop().run_in_executor(
+                executors._executor(PROCESS_POOL), functools.partial(_timed_call, fn, args)
+            )
+            metrics.observe_activity_queueing(PROCESS_POOL, started_at - submitted_at)
+            return result
+
+        return activity.defn(name=name)(run_in_pool)
+
+    def wrap_all(self, activities: List[Callable]) -> List[Callable]:
+        return [self.wrap(fn) for fn in activities]
+
+    def shutdown(self) -> None:
+        """Shut down the pools created here; activities still queued are dropped."""
+        for executor in self._owned:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._owned.clear()
@@ -0,0 +1,106 @@
+import json
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Mapping, Optional
+from urllib.parse import unquote_plus
+
+from temporalio.api.common.v1 import Payload
+
+ROUTING_KEY = "sd-routing-key"
+# Header the OpenTelemetry TracingInterceptor stores the propagated context in
+TRACER_HEADER = "_tracer-data"
+
+# `"baggage": "<value>"` in the tracer header's JSON object; group 2 flags escapes
+_BAGGAGE_FIELD = re.compile(rb'"baggage"\s*:\s*"([^"\\]*)(\\?)')
+_member_patterns: Dict[str, "re.Pattern[str]"] = {}
+logger = logging.getLogger("temporal_worker.baggage_parser")
+
+
+def _member_pattern(key: str) -> "re.Pattern[str]":
+    pattern = _member_patterns.get(key)
+    if pattern is None:
+        # `<key>=<value>` as a whole list member; properties after `;` are not part of the value
+        pattern = re.compile(rf"(?:^|,)[ \t]*{re.escape(key)}[ \t]*=[ \t]*([^,;]*)")
+        _member_patterns[key] = pattern
+    return pattern
+
+
+def routing_key_from_baggage(baggage_header: str, key: str = ROUTING_KEY) -> str:
+    """
+    Return the value of `key` from a W3C `baggage` header value, or "" if absent.
+    Only the matching list member is extracted and decoded.
+    """
+    match = _member_pattern(key).search(baggage_header)
+    if match is None:
+        return ""
+    value = match.group(1).rstrip(" \t")
+    return unquote_plus(value) if "%" in value or "+" in value else value
+
+
+def _baggage_from_tracer_data(data: bytes) -> Optional[str]:
+    """
+    Find the `baggage` string in the tracer header's JSON object without
+    decoding the rest of the carrier. Returns None if there is no baggage.
+    """
+    match = _BAGGAGE_FIELD.search(data)
+    if match is None:
+        return None
+    if match.group(2):
+        # Escaped characters (not produced by the W3C propagator): decode properly
+        try:
+            return json.loads(data).get("baggage")
+        except (ValueError, AttributeError) as e:
+            raise ValueError(str(e)) from e
+    return match.group(1).decode()
+
+
+def routing_key_from_headers(headers: Optional[Mapping[str, Payload]], key: str = ROUTING_KEY) -> str:
+    """
+    Return the routing key propagated in Temporal headers by the OpenTelemetry
+    TracingInterceptor, or "" if there is none. Works for workflow and activity
+    inputs alike.
+    """
+    if not headers:
+        return ""
+    payload = headers.get(TRACER_HEADER)
+    if payload is None or not payload.data:
+        return ""
+    try:
+        baggage_header = _baggage_from_tracer_data(payload.data)
+    except ValueError as e:
+        logger.debug(f"Malformed {TRACER_HEADER} header: {e}")
+        return ""
+    if not baggage_header:
+        return ""
+    return routing_key_from_baggage(baggage_header, key)
+
+
+class RoutingKeyCache:
+    """
+    Routing keys per workflow run. Every task of a run carries the same baggage,
+    so the header only needs parsing once per run. Bounded, least recently used
+    runs are evicted first. Shared by workflow activations (which run on worker
+    threads) and activities, hence the lock.
+    """
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._keys: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, run_id: str, headers: Optional[Mapping[str, Payload]]) -> str:
+        if not run_id:
+            return routing_key_from_headers(headers)
+        with self._lock:
+            routing_key = self._keys.get(run_id)
+            if routing_key is not None:
+                self._keys.move_to_end(run_id)
+                return routing_key
+        routing_key = routing_key_from_headers(headers)
+        with self._lock:
+            self._keys[run_id] = routing_key
+            if len(self._keys) > self.max_size:
+                self._keys.popitem(last=False)
+        return routing_key
@@ -0,0 +1,155 @@
+"""
+Batched vs single account update benchmark.
+
+Applies `--payments` withdrawals spread over `--accounts` accounts (so many
+payments share an account) once as single `withdraw` activities with up to
+`--concurrency` in flight, and once as `withdraw_batch` activities of
+`--batch-size` requests, against the in-memory store and a SQLite (WAL) store
+in a temporary directory. Store round trips are counted for both. Final
+balances are checked against the expected totals, a payment exceeding its
+account's balance must fail on its own, and retrying every batch must return
+the recorded responses without touching the balances again.
+
+Run from the temporal_worker directory:
+    python -m benchmarks.bench_account_batch --payments 20000 --accounts 200 --batch-size 500
+"""
+import argparse
+import asyncio
+import dataclasses
+import os
+import tempfile
+import time
+from collections import Counter
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+from temporalio.testing import ActivityEnvironment
+
+from account_store import DEFAULT_BALANCE, AccountStore, BalanceUpdate, MemoryAccountStore, SqliteAccountStore
+from activities import BankingActivities
+from models import WithdrawRequest
+
+AMOUNT = Decimal("1.00")
+
+
+class _CountingAccountStore(AccountStore):
+    """Forwards to `store`, counting the calls (round trips to a remote store)."""
+
+    def __init__(self, store: AccountStore):
+        super().__init__(store.result_ttl)
+        self.store = store
+        self.calls = 0
+
+    async def get_account(self, account_id: str) -> Tuple[Decimal, int]:
+        self.calls += 1
+        return await self.store.get_account(account_id)
+
+    async def compare_and_set(self, account_id: str, expected_version: int, balance: Decimal,
+                              result: Optional[Tuple[str, str]] = None) -> bool:
+        self.calls += 1
+        return await self.store.compare_and_set(account_id, expected_version, balance, result)
+
+    async def compare_and_set_many(self, updates: Sequence[BalanceUpdate],
+                                   results: Sequence[Tuple[str, str]] = ()) -> bool:
+        self.calls += 1
+        return await self.store.compare_and_set_many(updates, results)
+
+    async def get_result(self, key: str) -> Optional[str]:
+        self.calls += 1
+        return await self.store.get_result(key)
+
+    async def get_accounts(self, account_ids: Iterable[str]) -> Dict[str, Tuple[Decimal, int]]:
+        self.calls += 1
+        return await self.store.get_accounts(account_ids)
+
+    async def get_results(self, keys: Iterable[str]) -> Dict[str, str]:
+        self.calls += 1
+        return await self.store.get_results(keys)
+
+
+def _requests(payments: int, accounts: int, prefix: str) -> Any:
+    return [
+        WithdrawRequest(account_id=f"{prefix}_{i % accounts}", amount=str(AMOUNT), reference=f"payment-{i}")
+        for i in range(payments)
+    ]
+
+
+async def _check_balances(store: AccountStore, requests: Any) -> None:
+    for account_id, count in Counter(request.account_id for request in requests).items():
+        assert await store.get_balance(account_id) == DEFAULT_BALANCE - count * AMOUNT, account_id
+
+
+async def _run(name: str, store: AccountStore, args: argparse.Namespace) -> None:
+    counting = _CountingAccountStore(store)
+    activities = BankingActivities(counting)
+    env = ActivityEnvironment()
+
+    # Single activities: one activity ID per payment, as a workflow would schedule them
+    requests = _requests(args.payments, args.accounts, "single")
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def withdraw(i: int) -> None:
+        async with semaphore:
+            payment_env = ActivityEnvironment()
+            payment_env.info = dataclasses.replace(payment_env.info, activity_id=str(i))
+            await payment_env.run(activities.withdraw, requests[i])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(withdraw(i) for i in range(args.payments)))
+    elapsed = time.perf_counter() - start
+    await _check_balances(store, requests)
+    print(f"{name:<8} single  {args.payments / elapsed:8.0f}/s  {counting.calls:7d} store calls  "
+          f"{activities.conflicts} conflicts")
+
+    # Batches: one activity ID per batch
+    requests = _requests(args.payments, args.accounts, "batch")
+    batches = [requests[i:i + args.batch_size] for i in range(0, len(requests), args.batch_size)]
+    envs = []
+    for i in range(len(batches)):
+        batch_env = ActivityEnvironment()
+        batch_env.info = dataclasses.replace(batch_env.info, activity_id=str(i))
+        envs.append(batch_env)
+    counting.calls = activities.conflicts = 0
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(envs[i].run(activities.withdraw_batch, batch) for i, batch in enumerate(batches)))
+    elapsed = time.perf_counter() - start
+    assert all(response.success for batch in responses for response in batch)
+    await _check_balances(store, requests)
+    print(f"{name:<8} batched {args.payments / elapsed:8.0f}/s  {counting.calls:7d} store calls  "
+          f"{activities.conflicts} conflicts")
+
+    # Retries return the recorded responses and leave the balances alone
+    retried = await asyncio.gather(*(envs[i].run(activities.withdraw_batch, batch) for i, batch in enumerate(batches)))
+    assert retried == responses
+    await _check_balances(store, requests)
+
+    # An overdraft fails on its own; the rest of its batch is applied
+    overdraft = [
+        WithdrawRequest(account_id="overdraft", amount=str(DEFAULT_BALANCE), reference="all"),
+        WithdrawRequest(account_id="overdraft", amount=str(AMOUNT), reference="one-more"),
+        WithdrawRequest(account_id="other", amount=str(AMOUNT), reference="unrelated"),
+    ]
+    results = await env.run(activities.withdraw_batch, overdraft)
+    assert [response.success for response in results] == [True, False, True], results
+    assert await store.get_balance("overdraft") == 0
+    assert await store.get_balance("other") == DEFAULT_BALANCE - AMOUNT
+    await store.close()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payments", type=int, default=5000, help="Withdrawals per mode")
+    parser.add_argument("--accounts", type=int, default=100, help="Accounts the withdrawals are spread over")
+    parser.add_argument("--batch-size", type=int, default=500, help="Requests per withdraw_batch activity")
+    parser.add_argument("--concurrency", type=int, default=32, help="Single withdrawals in flight")
+    args = parser.parse_args()
+    # Every account must cover its share of the payments
+    assert DEFAULT_BALANCE >= AMOUNT * -(-args.payments // args.accounts), "too few accounts for --payments"
+
+    await _run("memory", MemoryAccountStore(), args)
+    with tempfile.TemporaryDirectory() as tmp:
+        await _run("sqlite", SqliteAccountStore(os.path.join(tmp, "accounts.db")), args)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
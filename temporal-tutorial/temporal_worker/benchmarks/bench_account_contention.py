@@ -0,0 +1,143 @@
+"""
+Account contention benchmark.
+
+Runs `--transfers` withdraw+deposit pairs through BankingActivities against a
+SQLite (WAL) account store, picking source and destination accounts from a
+Zipf distribution over `--accounts` accounts: skew 0 is uniform, higher skews
+concentrate traffic on a few hot accounts. `--instances` BankingActivities
+instances with their own connection pools share the database, standing in for
+several worker processes. For each skew it compares:
+
+  cas           optimistic compare-and-set only (ACCOUNT_LOCK_SHARDS=0)
+  sharded+cas   per-account lock shards in each instance, plus compare-and-set
+  global lock   a single lock per instance (ACCOUNT_LOCK_SHARDS=1)
+
+and checks every final balance against a sequential replay, so lost updates
+would fail the run. `--latency-ms` adds a round trip to every store query,
+as a networked database would (local SQLite hides most of the cost of
+serializing updates).
+
+Run from the temporal_worker directory:
+    python -m benchmarks.bench_account_contention --transfers 2000 --skews 0,1,2
+"""
+import argparse
+import asyncio
+import dataclasses
+import logging
+import os
+import random
+import tempfile
+import time
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from temporalio.testing import ActivityEnvironment
+
+from account_store import DEFAULT_BALANCE, SqliteAccountStore
+from activities import BankingActivities
+from models import DepositRequest, WithdrawRequest
+
+AMOUNT = Decimal("0.01")
+MODES = (("cas", 0), ("sharded+cas", 64), ("global lock", 1))
+
+
+class _RemoteAccountStore(SqliteAccountStore):
+    """SQLite store with a simulated network round trip per query."""
+
+    def __init__(self, path: str, pool_size: int, latency: float):
+        super().__init__(path, pool_size=pool_size)
+        self.latency = latency
+
+    async def get_account(self, account_id: str) -> Tuple[Decimal, int]:
+        await asyncio.sleep(self.latency)
+        return await super().get_account(account_id)
+
+    async def compare_and_set(self, account_id: str, expected_version: int, balance: Decimal,
+                              result: Optional[Tuple[str, str]] = None) -> bool:
+        await asyncio.sleep(self.latency)
+        return await super().compare_and_set(account_id, expected_version, balance, result)
+
+    async def get_result(self, key: str) -> Optional[str]:
+        await asyncio.sleep(self.latency)
+        return await super().get_result(key)
+
+
+def _zipf_transfers(transfers: int, accounts: int, skew: float, seed: int) -> List[Tuple[str, str]]:
+    rng = random.Random(seed)
+    names = [f"acct_{i}" for i in range(accounts)]
+    weights = [1.0 / (rank + 1) ** skew for rank in range(accounts)]
+    pairs = []
+    while len(pairs) < transfers:
+        source, destination = rng.choices(names, weights, k=2)
+        if source != destination:
+            pairs.append((source, destination))
+    return pairs
+
+
+async def _run(pairs: List[Tuple[str, str]], lock_shards: int, instances: int,
+               concurrency: int, pool_size: int, latency: float, path: str) -> Tuple[float, int]:
+    os.environ["ACCOUNT_LOCK_SHARDS"] = str(lock_shards)
+    workers = [BankingActivities(_RemoteAccountStore(path, pool_size, latency)) for _ in range(instances)]
+    # The two activities of a transfer workflow, as scheduled by MoneyTransferWorkflow
+    withdraw_env = ActivityEnvironment()
+    withdraw_env.info = dataclasses.replace(withdraw_env.info, activity_id="1")
+    deposit_env = ActivityEnvironment()
+    deposit_env.info = dataclasses.replace(deposit_env.info, activity_id="2")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def transfer(i: int, source: str, destination: str) -> None:
+        activities = workers[i % instances]
+        reference = f"transfer-{i}"
+        async with semaphore:
+            await withdraw_env.run(
+                activities.withdraw, WithdrawRequest(account_id=source, amount=str(AMOUNT), reference=reference)
+            )
+            await deposit_env.run(
+                activities.deposit, DepositRequest(account_id=destination, amount=str(AMOUNT), reference=reference)
+            )
+
+    start = time.perf_counter()
+    await asyncio.gather(*(transfer(i, source, destination) for i, (source, destination) in enumerate(pairs)))
+    elapsed = time.perf_counter() - start
+
+    expected: Dict[str, Decimal] = {}
+    for source, destination in pairs:
+        expected[source] = expected.get(source, DEFAULT_BALANCE) - AMOUNT
+        expected[destination] = expected.get(destination, DEFAULT_BALANCE) + AMOUNT
+    for account_id, balance in expected.items():
+        actual = await workers[0].store.get_balance(account_id)
+        assert actual == balance, f"{account_id}: expected {balance}, got {actual} (lost update)"
+    for activities in workers:
+        await activities.store.close()
+    return len(pairs) / elapsed, sum(activities.conflicts for activities in workers)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transfers", type=int, default=1000, help="Transfers per run")
+    parser.add_argument("--accounts", type=int, default=1000, help="Accounts to pick from")
+    parser.add_argument("--skews", default="0,0.5,1,1.5,2", help="Comma-separated Zipf exponents")
+    parser.add_argument("--concurrency", type=int, default=32, help="Transfers in flight")
+    parser.add_argument("--instances", type=int, default=2, help="BankingActivities instances sharing the database")
+    parser.add_argument("--pool-size", type=int, default=4, help="SQLite connections per instance")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated round trip per store query")
+    args = parser.parse_args()
+    logging.getLogger("temporal_worker").setLevel(logging.WARNING)
+    os.environ["ACCOUNT_UPDATE_ATTEMPTS"] = "1000"
+
+    print(f"{'skew':>5}  " + "  ".join(f"{name:>26}" for name, _ in MODES))
+    for skew in (float(value) for value in args.skews.split(",")):
+        pairs = _zipf_transfers(args.transfers, args.accounts, skew, seed=1)
+        cells = []
+        for _, lock_shards in MODES:
+            with tempfile.TemporaryDirectory() as tmp:
+                rate, conflicts = await _run(
+                    pairs, lock_shards, args.instances, args.concurrency, args.pool_size,
+                    args.latency_ms / 1000, os.path.join(tmp, "accounts.db")
+                )
+            cells.append(f"{rate:8.0f}/s {conflicts:6d} conflicts")
+        print(f"{skew:5.1f}  " + "  ".join(f"{cell:>26}" for cell in cells))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
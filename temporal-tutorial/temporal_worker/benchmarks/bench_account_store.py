@@ -0,0 +1,95 @@
+"""
+Account store throughput benchmark.
+
+Runs `--transfers` transfers through BankingActivities with up to
+`--concurrency` in flight, as withdraw+deposit pairs (two-step) and as single
+`transfer` activities (atomic), against the in-memory store and a SQLite (WAL)
+store in a temporary directory. Each transfer uses its own pair of accounts,
+so no two transfers touch the same balance; every final balance is checked.
+Then every transfer is retried, which must return the recorded responses
+without touching the balances again.
+
+Run from the temporal_worker directory:
+    python -m benchmarks.bench_account_store --transfers 2000 --concurrency 32 --modes two-step,atomic
+"""
+import argparse
+import asyncio
+import dataclasses
+import os
+import tempfile
+import time
+from decimal import Decimal
+from typing import List
+
+from temporalio.testing import ActivityEnvironment
+
+from account_store import DEFAULT_BALANCE, AccountStore, MemoryAccountStore, SqliteAccountStore
+from activities import BankingActivities
+from benchmarks.common import format_latency_ms
+from models import DepositRequest, TransferRequest, WithdrawRequest
+
+AMOUNT = Decimal("10.00")
+
+
+async def _run(store: AccountStore, mode: str, transfers: int, concurrency: int) -> None:
+    activities = BankingActivities(store)
+    # The two activities of a transfer workflow, as scheduled by MoneyTransferWorkflow
+    withdraw_env = ActivityEnvironment()
+    withdraw_env.info = dataclasses.replace(withdraw_env.info, activity_id="1")
+    deposit_env = ActivityEnvironment()
+    deposit_env.info = dataclasses.replace(deposit_env.info, activity_id="2")
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def transfer(i: int) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            if mode == "atomic":
+                await withdraw_env.run(
+                    activities.transfer,
+                    TransferRequest(from_account=f"src_{i}", to_account=f"dst_{i}", amount=str(AMOUNT),
+                                    reference=f"transfer-{i}")
+                )
+                latencies.append(time.perf_counter() - start)
+                return
+            await withdraw_env.run(
+                activities.withdraw, WithdrawRequest(account_id=f"src_{i}", amount=str(AMOUNT), reference=f"transfer-{i}")
+            )
+            await deposit_env.run(
+                activities.deposit, DepositRequest(account_id=f"dst_{i}", amount=str(AMOUNT), reference=f"transfer-{i}")
+            )
+            latencies.append(time.perf_counter() - start)
+
+    for label in ("transfers", "retries"):
+        latencies.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(transfer(i) for i in range(transfers)))
+        elapsed = time.perf_counter() - start
+        for i in range(transfers):
+            assert await store.get_balance(f"src_{i}") == DEFAULT_BALANCE - AMOUNT, f"src_{i}"
+            assert await store.get_balance(f"dst_{i}") == DEFAULT_BALANCE + AMOUNT, f"dst_{i}"
+        print(
+            f"{type(store).__name__:<20} {mode:<8} {label:<9} {transfers / elapsed:8.0f}/s  "
+            f"latency {format_latency_ms(latencies)}"
+        )
+    assert activities.deduplicated == (transfers if mode == "atomic" else 2 * transfers), activities.deduplicated
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--transfers", type=int, default=1000, help="Transfers per store")
+    parser.add_argument("--concurrency", type=int, default=32, help="Transfers in flight")
+    parser.add_argument("--pool-size", type=int, default=4, help="SQLite connections")
+    parser.add_argument("--modes", default="two-step,atomic", help="Comma-separated: two-step, atomic")
+    args = parser.parse_args()
+
+    for mode in args.modes.split(","):
+        await _run(MemoryAccountStore(), mode, args.transfers, args.concurrency)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SqliteAccountStore(os.path.join(tmp, "accounts.db"), pool_size=args.pool_size)
+            await _run(store, mode, args.transfers, args.concurrency)
+            await store.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
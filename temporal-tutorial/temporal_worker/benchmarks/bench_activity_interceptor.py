@@ -0,0 +1,141 @@
+"""
+Per-activity interceptor overhead benchmark.
+
+First checks the baggage parser against a full decode (json.loads plus the
+OpenTelemetry W3C baggage propagator) on a set of header shapes, then measures:
+- the previous routing-key extraction (json.loads of the whole tracer header)
+- the baggage parser without caching
+- the whole activity interceptor (routing-key cache, routing decision and
+  dispatch to the next interceptor) per activity execution, for activities
+  scheduled by older workflows and for ones carrying a pinned routing decision
+
+Run from the temporal_worker directory:
+    python -m benchmarks.bench_activity_interceptor --activities 100000
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from opentelemetry import baggage
+from opentelemetry.baggage.propagation import W3CBaggagePropagator
+from temporalio import activity
+from temporalio.converter import PayloadConverter
+from temporalio.testing import ActivityEnvironment
+from temporalio.worker._interceptor import ActivityInboundInterceptor, ExecuteActivityInput
+
+from benchmarks.common import configure_routes_env
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+CASES = [
+    {},
+    {"traceparent": TRACEPARENT},
+    {"traceparent": TRACEPARENT, "baggage": "sd-routing-key=abc123"},
+    {"traceparent": TRACEPARENT, "baggage": "sd-routing-key=abc123,tenant=acme,user=42"},
+    {"traceparent": TRACEPARENT, "baggage": "tenant=acme, sd-routing-key=abc123,user=42"},
+    {"traceparent": TRACEPARENT, "baggage": "x-sd-routing-key=nope,sd-routing-keys=nope"},
+    {"traceparent": TRACEPARENT, "baggage": "note=sd-routing-key%3Dnope,sd-routing-key=a%2Fb+c"},
+    {"baggage": "tenant=\"quoted\",sd-routing-key=k1", "tracestate": "vendor=1"},
+]
+
+
+def _legacy_extract(headers) -> str:
+    """Routing-key extraction as the activity interceptor implemented it before."""
+    try:
+        if headers:
+            tracer_data = headers.get('_tracer-data')
+            if tracer_data and hasattr(tracer_data, 'data'):
+                data = json.loads(tracer_data.data)
+                if 'baggage' in data:
+                    for item in data['baggage'].split(','):
+                        if item.strip().startswith('sd-routing-key='):
+                            return item.split('=', 1)[1]
+    except Exception:
+        pass
+    return ""
+
+
+def _reference_extract(carrier: dict) -> str:
+    context = W3CBaggagePropagator().extract(carrier)
+    return str(baggage.get_baggage("sd-routing-key", context) or "")
+
+
+def _headers(carrier: dict) -> dict:
+    return {"_tracer-data": PayloadConverter.default.to_payloads([carrier])[0]}
+
+
+def check_parser() -> None:
+    from baggage_parser import routing_key_from_headers
+
+    for carrier in CASES:
+        expected = _reference_extract(carrier)
+        actual = routing_key_from_headers(_headers(carrier))
+        if actual != expected:
+            raise SystemExit(f"parser mismatch for {carrier}: got {actual!r}, expected {expected!r}")
+    if routing_key_from_headers({}) != "" or routing_key_from_headers(None) != "":
+        raise SystemExit("parser mismatch for missing headers")
+    print(f"parser matches the W3C propagator on {len(CASES)} header shapes")
+
+
+class _NoopNext(ActivityInboundInterceptor):
+    def __init__(self):
+        pass
+
+    async def execute_activity(self, input: ExecuteActivityInput):
+        return None
+
+
+async def _interceptor_rate(headers: dict, activities: int) -> float:
+    from interceptors import SelectiveTaskInterceptor
+    from routing import RoutesAPIClient
+
+    routes_client = RoutesAPIClient(sandbox_name="")
+    routes_client._apply_routing_keys({f"key-{i}" for i in range(1000)})
+    interceptor = SelectiveTaskInterceptor(routes_client, "", "bench").intercept_activity(_NoopNext())
+
+    @activity.defn(name="bench")
+    async def bench_activity() -> None:
+        pass
+
+    async def run_all() -> float:
+        input = ExecuteActivityInput(fn=bench_activity, args=[], executor=None, headers=headers)
+        start = time.perf_counter()
+        for _ in range(activities):
+            await interceptor.execute_activity(input)
+        return activities / (time.perf_counter() - start)
+
+    return await ActivityEnvironment().run(run_all)
+
+
+async def main(args) -> None:
+    from baggage_parser import routing_key_from_headers
+    from routing_decision import ROUTING_DECISION_HEADER, RoutingDecision
+
+    configure_routes_env("http://127.0.0.1:7778")
+    check_parser()
+    headers = _headers({"traceparent": TRACEPARENT, "baggage": "tenant=acme,user=42,sd-routing-key=abc123"})
+
+    start = time.perf_counter()
+    for _ in range(args.activities):
+        _legacy_extract(headers)
+    legacy_rate = args.activities / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(args.activities):
+        routing_key_from_headers(headers)
+    parser_rate = args.activities / (time.perf_counter() - start)
+
+    interceptor_rate = await _interceptor_rate(headers, args.activities)
+    pinned_headers = {**headers, ROUTING_DECISION_HEADER: RoutingDecision("", 1, "abc123").to_payload()}
+    pinned_rate = await _interceptor_rate(pinned_headers, args.activities)
+
+    print(f"legacy json.loads extraction: {legacy_rate:>12,.0f}/s  ({1e6 / legacy_rate:.2f} us)")
+    print(f"baggage parser (uncached):    {parser_rate:>12,.0f}/s  ({1e6 / parser_rate:.2f} us)")
+    print(f"activity interceptor (total): {interceptor_rate:>12,.0f}/s  ({1e6 / interceptor_rate:.2f} us)")
+    print(f"activity interceptor (pinned):{pinned_rate:>12,.0f}/s  ({1e6 / pinned_rate:.2f} us)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--activities", type=int, default=100000, help="Activity executions per measurement")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""
+Routing refresh cost: full lists vs ETag/304 vs revision deltas.
+
+Serves a large routing-rule list from the stand-in route server and measures
+RoutesAPIClient refresh latency when every poll downloads the full list, when
+the list is unchanged (304 Not Modified), and when one key changes between
+polls (incremental delta).
+
+Run from the temporal_worker directory:
+    python -m benchmarks.bench_conditional_refresh --keys 50000
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import configure_routes_env, format_latency_ms
+from benchmarks.route_server import RouteServer
+
+
+async def _refresh(server: RouteServer, refreshes: int, churn: bool) -> list:
+    from routing import RoutesAPIClient
+
+    client = RoutesAPIClient(sandbox_name="")
+    latencies = []
+    try:
+        # Prime the cache (and the ETag/revision cursor) with one full fetch
+        await client._perform_fetch_and_update()
+        for i in range(refreshes):
+            if churn:
+                server.set_routing_keys(server.routing_keys | {f"churn-{i}"})
+            start = time.perf_counter()
+            await client._perform_fetch_and_update()
+            latencies.append(time.perf_counter() - start)
+        assert client._routing_keys_cache == set(server.routing_keys)
+    finally:
+        await client.close()
+    return latencies
+
+
+async def main(args) -> None:
+    keys = [f"key-{i}" for i in range(args.keys)]
+    scenarios = [
+        ("full list, unchanged", False, False),
+        ("ETag, unchanged     ", True, False),
+        ("full list, 1 change ", False, True),
+        ("delta, 1 change     ", True, True),
+    ]
+    for label, conditional, churn in scenarios:
+        server = RouteServer(keys, conditional=conditional)
+        await server.start()
+        configure_routes_env(server.address)
+        try:
+            latencies = await _refresh(server, args.refreshes, churn)
+            print(f"{label}: {args.refreshes} refreshes, {server.not_modified_count} x 304, "
+                  f"{format_latency_ms(latencies)}")
+        finally:
+            await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", type=int, default=50000, help="Number of routing keys served")
+    parser.add_argument("--refreshes", type=int, default=50, help="Refreshes per scenario")
+    asyncio.run(main(parser.parse_args()))
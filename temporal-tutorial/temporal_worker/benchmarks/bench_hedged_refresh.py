@@ -0,0 +1,64 @@
+"""
+Routing refresh tail latency: single route server vs hedged requests.
+
+Runs two stand-in route servers that each stall a fraction of polling
+responses, then compares refresh latency percentiles for a client pointed at
+one server against a client that hedges across both.
+
+Run from the temporal_worker directory:
+    python -m benchmarks.bench_hedged_refresh --refreshes 300 --slow-probability 0.05
+"""
+import argparse
+import asyncio
+import os
+
+from benchmarks.common import configure_routes_env
+from benchmarks.route_server import RouteServer
+
+
+async def _refresh(addresses: str, refreshes: int, hedge_delay: float) -> dict:
+    from routing import RoutesAPIClient
+
+    configure_routes_env(addresses)
+    os.environ["ROUTES_API_HEDGE_DELAY_SECONDS"] = str(hedge_delay)
+    client = RoutesAPIClient(sandbox_name="")
+    try:
+        for _ in range(refreshes):
+            await client._perform_fetch_and_update()
+    finally:
+        await client.close()
+    return client.refresh_latency_percentiles()
+
+
+def _format(percentiles: dict) -> str:
+    return " ".join(f"{name}={value * 1000:.1f}ms" for name, value in percentiles.items())
+
+
+async def main(args) -> None:
+    keys = [f"key-{i}" for i in range(args.keys)]
+    servers = [
+        RouteServer(keys, conditional=False, slow_probability=args.slow_probability, slow_delay=args.slow_delay)
+        for _ in range(2)
+    ]
+    for server in servers:
+        await server.start()
+    os.environ["ROUTES_API_LATENCY_WINDOW"] = str(args.refreshes)
+    os.environ["ROUTES_API_READ_TIMEOUT_SECONDS"] = str(args.slow_delay * 2)
+    try:
+        single = await _refresh(servers[0].address, args.refreshes, hedge_delay=0)
+        print(f"single server:       {_format(single)}")
+        hedged = await _refresh(",".join(s.address for s in servers), args.refreshes, hedge_delay=args.hedge_delay)
+        print(f"hedged ({args.hedge_delay * 1000:.0f}ms delay): {_format(hedged)}")
+    finally:
+        for server in servers:
+            await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--refreshes", type=int, default=300)
+    parser.add_argument("--keys", type=int, default=100)
+    parser.add_argument("--slow-probability", type=float, default=0.05, help="Fraction of responses that stall")
+    parser.add_argument("--slow-delay", type=float, default=0.5, help="Stall duration in seconds")
+    parser.add_argument("--hedge-delay", type=float, default=0.02, help="Hedge after this many seconds")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,71 @@
+"""
+Routing-rule fetch benchmark: per-refresh session vs pooled session.
+
+Compares the previous behaviour (a new aiohttp.ClientSession for every refresh)
+against RoutesAPIClient's pooled, long-lived session, reporting fetch latency
+and the number of TCP connections the route server had to accept.
+
+Run from the temporal_worker directory:
+    python -m benchmarks.bench_routes_fetch --refreshes 500
+"""
+import argparse
+import asyncio
+import time
+
+import aiohttp
+
+from benchmarks.common import configure_routes_env, format_latency_ms
+from benchmarks.route_server import RouteServer
+
+
+async def _per_refresh_session(url: str, refreshes: int) -> list:
+    latencies = []
+    for _ in range(refreshes):
+        start = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as response:
+                await response.json()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def _pooled_session(refreshes: int) -> list:
+    from routing import RoutesAPIClient
+
+    client = RoutesAPIClient(sandbox_name="")
+    latencies = []
+    try:
+        for _ in range(refreshes):
+            start = time.perf_counter()
+            await client._perform_fetch_and_update()
+            latencies.append(time.perf_counter() - start)
+    finally:
+        await client.close()
+    return latencies
+
+
+async def main(args) -> None:
+    server = RouteServer([f"key-{i}" for i in range(args.keys)])
+    await server.start()
+    configure_routes_env(server.address)
+    try:
+        from routing import RoutesAPIClient
+        url = RoutesAPIClient(sandbox_name="")._build_routes_url()
+
+        latencies = await _per_refresh_session(url, args.refreshes)
+        print(f"per-refresh session: {args.refreshes} refreshes, "
+              f"{server.connection_count} connections, {format_latency_ms(latencies)}")
+
+        server.reset_counters()
+        latencies = await _pooled_session(args.refreshes)
+        print(f"pooled session:      {args.refreshes} refreshes, "
+              f"{server.connection_count} connections, {format_latency_ms(latencies)}")
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--refreshes", type=int, default=500, help="Number of routing refreshes per mode")
+    parser.add_argument("--keys", type=int, default=100, help="Number of routing keys served")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,81 @@
+"""
+Routing decision micro-benchmark.
+
+Measures decisions per second for RoutesAPIClient.should_process_sync, the
+async should_process wrapper, and the previous async implementation (which
+formatted the whole cache into debug log messages) for routing-key sets of
+10, 1k and 100k keys.
+
+Run from the temporal_worker directory:
+    python -m benchmarks.bench_should_process --decisions 200000
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.common import configure_routes_env
+
+logger = logging.getLogger("temporal_worker.benchmarks.should_process")
+
+
+async def _legacy_should_process(cached_keys, sandbox_name: str, routing_key):
+    """The per-task decision as it was implemented before the sync fast path."""
+    current_cached_keys = cached_keys
+    if sandbox_name:
+        if routing_key is None:
+            logger.debug("Sandbox worker: No routing key provided, will not process.")
+            return False
+        should = routing_key in current_cached_keys
+        logger.debug(
+            f"Sandbox worker: routing_key={routing_key}, cache={list(current_cached_keys)}, should_process={should}"
+        )
+        return should
+    if routing_key is None:
+        return True
+    should = routing_key not in current_cached_keys
+    logger.debug(
+        f"Baseline worker: routing_key={routing_key}, cache={list(current_cached_keys)}, should_process={should}"
+    )
+    return should
+
+
+async def _run(size: int, decisions: int) -> None:
+    from routing import RoutesAPIClient
+
+    client = RoutesAPIClient(sandbox_name="")
+    client._apply_routing_keys({f"key-{i}" for i in range(size)})
+    # Alternate hits and misses
+    probes = [f"key-{i}" if i % 2 else f"miss-{i}" for i in range(1024)]
+
+    start = time.perf_counter()
+    for i in range(decisions):
+        client.should_process_sync(probes[i & 1023])
+    sync_rate = decisions / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(decisions):
+        await client.should_process(probes[i & 1023])
+    async_rate = decisions / (time.perf_counter() - start)
+
+    # The legacy path builds list(cache) per call, so scale its iterations down
+    legacy_decisions = max(10, min(decisions, decisions * 100 // size))
+    cached_keys = set(client._routing_keys_cache)
+    start = time.perf_counter()
+    for i in range(legacy_decisions):
+        await _legacy_should_process(cached_keys, "", probes[i & 1023])
+    legacy_rate = legacy_decisions / (time.perf_counter() - start)
+
+    print(f"{size:>7} keys: sync={sync_rate:>12,.0f}/s  async={async_rate:>12,.0f}/s  legacy={legacy_rate:>12,.0f}/s")
+
+
+async def main(args) -> None:
+    configure_routes_env("http://127.0.0.1:7778")
+    for size in (10, 1000, 100000):
+        await _run(size, args.decisions)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--decisions", type=int, default=200000, help="Decisions per measurement")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""
+End-to-end routing propagation latency: polling vs watch stream.
+
+Starts the local stand-in route server, runs RoutesAPIClient's background
+updater in polling and in watch mode, publishes new routing keys and measures
+how long each takes to show up in the worker's routing cache.
+
+Run from the temporal_worker directory:
+    python -m benchmarks.bench_watch_propagation --interval 2 --updates 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from benchmarks.common import configure_routes_env, format_latency_ms
+from benchmarks.route_server import RouteServer
+
+
+async def _measure(server: RouteServer, watch: bool, updates: int, interval: int) -> list:
+    from routing import RoutesAPIClient
+
+    os.environ["ROUTES_API_WATCH"] = "true" if watch else "false"
+    client = RoutesAPIClient(sandbox_name="")
+    updater = asyncio.create_task(client._periodic_cache_updater())
+    latencies = []
+    try:
+        await asyncio.sleep(0.2)
+        for i in range(updates):
+            # Publish at a random point in the polling cycle
+            await asyncio.sleep(random.uniform(0, interval))
+            key = f"{'watch' if watch else 'poll'}-{i}"
+            server.set_routing_keys(server.routing_keys | {key})
+            start = time.perf_counter()
+            while key not in client._routing_keys_cache:
+                await asyncio.sleep(0.001)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        updater.cancel()
+        await asyncio.gather(updater, return_exceptions=True)
+        await client.close()
+    return latencies
+
+
+async def main(args) -> None:
+    server = RouteServer(["key-0"])
+    await server.start()
+    configure_routes_env(server.address, refresh_interval=args.interval)
+    try:
+        latencies = await _measure(server, watch=False, updates=args.updates, interval=args.interval)
+        print(f"polling ({args.interval}s): {server.request_count} requests, {format_latency_ms(latencies)}")
+        server.reset_counters()
+        latencies = await _measure(server, watch=True, updates=args.updates, interval=args.interval)
+        print(f"watch stream: {server.request_count} requests, {format_latency_ms(latencies)}")
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interval", type=int, default=2, help="Polling interval in seconds")
+    parser.add_argument("--updates", type=int, default=10, help="Routing updates to publish per mode")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,30 @@
+"""Shared helpers for the worker benchmarks."""
+import os
+from typing import List, Sequence
+
+
+def configure_routes_env(route_server_addr: str, refresh_interval: int = 120) -> None:
+    """Populate the environment variables RoutesAPIClient reads at construction."""
+    os.environ["ROUTES_API_ROUTE_SERVER_ADDR"] = route_server_addr
+    os.environ.setdefault("ROUTES_API_BASELINE_KIND", "Deployment")
+    os.environ.setdefault("ROUTES_API_BASELINE_NAMESPACE", "temporal")
+    os.environ.setdefault("ROUTES_API_BASELINE_NAME", "temporal-worker")
+    os.environ["ROUTES_API_REFRESH_INTERVAL_SECONDS"] = str(refresh_interval)
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of `samples` (pct in 0-100)."""
+    if not samples:
+        return 0.0
+    ordered: List[float] = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def format_latency_ms(samples: Sequence[float]) -> str:
+    """Format latency samples (seconds) as a p50/p99/max summary in milliseconds."""
+    return (
+        f"p50={percentile(samples, 50) * 1000:.2f}ms "
+        f"p99={percentile(samples, 99) * 1000:.2f}ms "
+        f"max={max(samples, default=0.0) * 1000:.2f}ms"
+    )
@@ -0,0 +1,180 @@
+"""
+Local stand-in for the Signadot route server.
+
+Serves `/api/v1/workloads/routing-rules` from an in-memory set of routing keys
+and counts the TCP connections it accepts, so the routing client can be
+exercised and measured without a cluster. Requests with `watch=true` get a
+chunked stream of newline-delimited JSON documents, one per change, with blank
+heartbeat lines in between.
+
+Every response carries a `revision` and an ETag, so the server also answers
+`If-None-Match` with 304 and `sinceRevision` with an added/removed delta.
+Pass `conditional=False` to serve only full, unconditional lists, and
+`slow_probability`/`slow_delay` to inject tail latency into polling responses.
+
+Run standalone:
+    python -m benchmarks.route_server --port 7778 --keys key-a,key-b
+"""
+import argparse
+import asyncio
+import logging
+import json
+import random
+from typing import Dict, FrozenSet, Iterable, List, Optional
+
+from aiohttp import web
+
+logger = logging.getLogger("temporal_worker.benchmarks.route_server")
+
+ROUTES_PATH = '/api/v1/workloads/routing-rules'
+
+
+class RouteServer:
+    """In-memory route server with connection accounting."""
+
+    def __init__(self, routing_keys: Iterable[str] = (), host: str = "127.0.0.1", port: int = 0,
+                 heartbeat_interval: float = 10.0, conditional: bool = True,
+                 slow_probability: float = 0.0, slow_delay: float = 0.0):
+        self.host = host
+        self.port = port
+        self.slow_probability = slow_probability
+        self.slow_delay = slow_delay
+        self.heartbeat_interval = heartbeat_interval
+        self.conditional = conditional
+        self.revision = 1
+        self._history: Dict[int, FrozenSet[str]] = {self.revision: frozenset(routing_keys)}
+        self.request_count = 0
+        self.not_modified_count = 0
+        self._transports = set()
+        self._watchers: List[asyncio.Queue] = []
+        self._runner = None
+
+    @property
+    def connection_count(self) -> int:
+        """Number of distinct TCP connections that have sent requests."""
+        return len(self._transports)
+
+    @property
+    def address(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def watcher_count(self) -> int:
+        return len(self._watchers)
+
+    @property
+    def routing_keys(self) -> FrozenSet[str]:
+        return self._history[self.revision]
+
+    def set_routing_keys(self, routing_keys: Iterable[str]) -> None:
+        previous_revision = self.revision
+        self.revision += 1
+        self._history[self.revision] = frozenset(routing_keys)
+        for queue in self._watchers:
+            queue.put_nowait(self._routing_rules_body(previous_revision))
+
+    def drop_watchers(self) -> None:
+        """Close every open watch stream, as a route server restart would."""
+        for queue in self._watchers:
+            queue.put_nowait(None)
+
+    def reset_counters(self) -> None:
+        self.request_count = 0
+        self.not_modified_count = 0
+        self._transports = set()
+
+    def _routing_rules_body(self, since_revision: Optional[int] = None) -> dict:
+        if not self.conditional:
+            return {'routingRules': [{'routingKey': key} for key in sorted(self.routing_keys)]}
+        previous = self._history.get(since_revision) if since_revision is not None else None
+        if previous is None:
+            return {
+                'revision': self.revision,
+                'routingRules': [{'routingKey': key} for key in sorted(self.routing_keys)]
+            }
+        return {
+            'revision': self.revision,
+            'addedRoutingRules': [{'routingKey': key} for key in sorted(self.routing_keys - previous)],
+            'removedRoutingRules': [{'routingKey': key} for key in sorted(previous - self.routing_keys)]
+        }
+
+    async def _handle_routing_rules(self, request: web.Request) -> web.StreamResponse:
+        self.request_count += 1
+        self._transports.add(request.transport)
+        since_revision = request.query.get('sinceRevision')
+        since_revision = int(since_revision) if since_revision and self.conditional else None
+        if request.query.get('watch') == 'true':
+            return await self._handle_watch(request, since_revision)
+        if self.slow_probability and random.random() < self.slow_probability:
+            await asyncio.sleep(self.slow_delay)
+        if not self.conditional:
+            return web.json_response(self._routing_rules_body())
+        etag = f'"{self.revision}"'
+        if request.headers.get('If-None-Match') == etag:
+            self.not_modified_count += 1
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.json_response(self._routing_rules_body(since_revision), headers={'ETag': etag})
+
+    async def _handle_watch(self, request: web.Request, since_revision: Optional[int]) -> web.StreamResponse:
+        response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+        queue: asyncio.Queue = asyncio.Queue()
+        queue.put_nowait(self._routing_rules_body(since_revision))
+        self._watchers.append(queue)
+        try:
+            while True:
+                try:
+                    body = await asyncio.wait_for(queue.get(), timeout=self.heartbeat_interval)
+                except asyncio.TimeoutError:
+                    await response.write(b"\n")
+                    continue
+                if body is None:
+                    break
+                await response.write(json.dumps(body).encode() + b"\n")
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            self._watchers.remove(queue)
+        return response
+
+    def _make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get(ROUTES_PATH, self._handle_routing_rules)
+        return app
+
+    async def start(self) -> None:
+        self._runner = web.AppRunner(self._make_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # Resolve the bound port when an ephemeral port was requested
+        self.port = site._server.sockets[0].getsockname()[1]
+        logger.info(f"RouteServer: listening on {self.address}")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+async def _serve(args) -> None:
+    keys = [k for k in args.keys.split(',') if k]
+    server = RouteServer(keys, host=args.host, port=args.port)
+    await server.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(name)s %(message)s')
+    parser = argparse.ArgumentParser(description="Local stand-in for the Signadot route server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7778)
+    parser.add_argument("--keys", default="", help="Comma-separated routing keys to serve")
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
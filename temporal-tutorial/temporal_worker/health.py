@@ -0,0 +1,52 @@
+import logging
+from typing import Callable
+
+from aiohttp import web
+
+import metrics
+
+logger = logging.getLogger("temporal_worker.health")
+
+
+class HealthServer:
+    """
+    Minimal HTTP server exposing liveness and readiness for Kubernetes probes.
+
+    - `/healthz`: 200 while the worker and its routing poller are running
+    - `/readyz`: 200 once routing data is available and the worker is polling
+    Both return a JSON body describing the routing cache and poller state.
+    `/metrics` serves the routing and task metrics in Prometheus format.
+    """
+
+    def __init__(self, status_fn: Callable[[], dict], port: int, host: str = "0.0.0.0"):
+        self.status_fn = status_fn
+        self.host = host
+        self.port = port
+        self._runner = None
+
+    async def _handle_healthz(self, request: web.Request) -> web.Response:
+        status = self.status_fn()
+        return web.json_response(status, status=200 if status['live'] else 503)
+
+    async def _handle_readyz(self, request: web.Request) -> web.Response:
+        status = self.status_fn()
+        return web.json_response(status, status=200 if status['ready'] else 503)
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        body, content_type = metrics.render()
+        return web.Response(body=body, headers={'Content-Type': content_type})
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get('/healthz', self._handle_healthz)
+        app.router.add_get('/readyz', self._handle_readyz)
+        app.router.add_get('/metrics', self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Health server listening on {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
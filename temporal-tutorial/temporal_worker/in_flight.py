@@ -0,0 +1,38 @@
+import itertools
+import time
+from typing import Dict, List, Tuple
+
+from temporalio import activity
+
+
+class InFlightActivities:
+    """
+    Activities currently executing in this worker process, so a draining worker
+    can report what it is still waiting for. Shared by all of the process's
+    Workers; activities may start and finish on other threads.
+    """
+
+    def __init__(self):
+        self._tokens = itertools.count()
+        # token -> (activity type, workflow ID, activity ID, start time)
+        self._running: Dict[int, Tuple[str, str, str, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._running)
+
+    def start(self, info: activity.Info) -> int:
+        token = next(self._tokens)
+        self._running[token] = (info.activity_type, info.workflow_id, info.activity_id, time.monotonic())
+        return token
+
+    def finish(self, token: int) -> None:
+        self._running.pop(token, None)
+
+    def describe(self, limit: int = 10) -> List[str]:
+        """The longest-running activities, e.g. `withdraw (workflow transfer-1, activity 1) for 2.1s`."""
+        now = time.monotonic()
+        running = sorted(list(self._running.values()), key=lambda entry: entry[3])
+        return [
+            f"{activity_type} (workflow {workflow_id}, activity {activity_id}) for {now - started:.1f}s"
+            for activity_type, workflow_id, activity_id, started in running[:limit]
+        ]
@@ -1,57 +1,138 @@
-import json
 import logging
 import os
-import sys
+from temporalio import activity, workflow
 from temporalio.worker import Interceptor
 from temporalio.worker._interceptor import (
     ExecuteActivityInput,
     ExecuteWorkflowInput,
+    StartActivityInput,
+    StartLocalActivityInput,
     WorkflowInboundInterceptor,
+    WorkflowOutboundInterceptor,
     ActivityInboundInterceptor,
     WorkflowInterceptorClassInput
 )
-from opentelemetry import baggage
+from typing import FrozenSet, Optional
+from baggage_parser import RoutingKeyCache
+from routing_decision import ROUTING_DECISION_HEADER, RoutingDecision
+import metrics
 from routing import RoutesAPIClient
+from multi_tenant import SandboxDispatcher
+from in_flight import InFlightActivities
 
-ROUTING_KEY = "sd-routing-key"
 logger = logging.getLogger("temporal_worker.interceptors")
 
 class SelectiveTaskInterceptor(Interceptor):
     """
     Interceptor for selective processing of workflows and activities based on routing keys.
     Uses RoutesAPIClient to determine if a task should be processed.
+    With a SandboxDispatcher (multi-sandbox workers), accepted tasks are also
+    dispatched to the implementation of the sandbox their routing key maps to.
+
+    The decision made when a workflow is accepted is pinned: it is sent along with
+    every activity the workflow schedules, and activities follow it instead of
+    looking the routing key up again, so a run never splits between a sandbox
+    and the baseline when the routing rules change mid-workflow.
+
+    Accepted activities are recorded in `in_flight`, if given, while they run.
     """
-    def __init__(self, routes_client: RoutesAPIClient, sandbox_name: str, task_queue: str):
+    def __init__(self, routes_client: RoutesAPIClient, sandbox_name: str, task_queue: str,
+                 dispatcher: Optional[SandboxDispatcher] = None,
+                 in_flight: Optional[InFlightActivities] = None):
         super().__init__()
         self.sandbox_name = sandbox_name
         self.task_queue = task_queue
         self.routes_client = routes_client
+        self.dispatcher = dispatcher
+        self.in_flight = in_flight
+        # Routing key per workflow run, shared by the run's workflow and activity tasks
+        self.routing_keys = RoutingKeyCache(int(os.environ.get("WORKER_ROUTING_KEY_CACHE_SIZE", "10000")))
         # Worker identity constructed from passed parameters
-        self.worker_ident = f"sandbox={sandbox_name or 'baseline'} task_queue={task_queue}"
+        if dispatcher is not None:
+            self.worker_ident = f"sandboxes={','.join(dispatcher.sandbox_names)} task_queue={task_queue}"
+            self.served_sandboxes: FrozenSet[str] = frozenset(dispatcher.sandbox_names).union(
+                [""] if routes_client.serve_baseline else []
+            )
+        else:
+            self.worker_ident = f"sandbox={sandbox_name or 'baseline'} task_queue={task_queue}"
+            self.served_sandboxes = frozenset([sandbox_name])
+        # `worker` metric label
+        self.metrics_worker = sandbox_name or ("multi-sandbox" if dispatcher is not None else "baseline")
+
+    def _route(self, routing_key: str) -> Optional[str]:
+        """The sandbox ("" for baseline) this worker runs the task as, or None to reject it."""
+        if self.dispatcher is not None:
+            return self.routes_client.route_sync(routing_key)
+        if self.routes_client and not self.routes_client.should_process_sync(routing_key):
+            return None
+        return self.sandbox_name
 
     def workflow_interceptor_class(self, input: WorkflowInterceptorClassInput):
         outer_self = self
+        class _RoutingDecisionOutboundInterceptor(WorkflowOutboundInterceptor):
+            def __init__(self, next_interceptor, inbound):
+                super().__init__(next_interceptor)
+                self.inbound = inbound
+
+            def start_activity(self, input: StartActivityInput):
+                if self.inbound.decision_header is not None:
+                    input.headers = {**input.headers, ROUTING_DECISION_HEADER: self.inbound.decision_header}
+                return self.next.start_activity(input)
+
+            def start_local_activity(self, input: StartLocalActivityInput):
+                if self.inbound.decision_header is not None:
+                    input.headers = {**input.headers, ROUTING_DECISION_HEADER: self.inbound.decision_header}
+                return self.next.start_local_activity(input)
+
         class _SelectiveWorkflowInboundInterceptor(WorkflowInboundInterceptor):
             def __init__(self, next_interceptor):
                 super().__init__(next_interceptor)
                 self.routes_client = outer_self.routes_client
                 self.sandbox_name = outer_self.sandbox_name
+                self.dispatcher = outer_self.dispatcher
+                self.routing_keys = outer_self.routing_keys
                 self.worker_ident = outer_self.worker_ident
+                self.decision_header = None
+
+            def init(self, outbound: WorkflowOutboundInterceptor) -> None:
+                super().init(_RoutingDecisionOutboundInterceptor(outbound, self))
 
             async def execute_workflow(self, input: ExecuteWorkflowInput):
-                routing_key = baggage.get_baggage(ROUTING_KEY) or ""
+                """
+                Route the run and pin the decision for its activities.
+
+                The decision is not persisted in the workflow's history: when a run is
+                replayed (after a sticky cache eviction or on another worker) it is made
+                again from the current routing rules. If the rules changed since the
+                first task, the replayed run may be rejected by this worker, and the
+                activities it schedules from then on carry the new decision. Replays
+                are not counted in the task metrics or logged.
+                """
+                replaying = workflow.unsafe.is_replaying()
+                routing_key = self.routing_keys.get(workflow.info().run_id, input.headers)
                 workflow_name = getattr(input.run_fn, "__name__", str(input.run_fn))
-                should_process = True
-                
-                if self.routes_client and not await self.routes_client.should_process(routing_key):
-                    should_process = False
+                target_sandbox = outer_self._route(routing_key)
                 
-                if not should_process:
+                if target_sandbox is None:
                     error_msg = f"Workflow/Worker cannot handle routing key: {routing_key} - Worker: {self.worker_ident}"
-                    logger.info(error_msg)
+                    if not replaying:
+                        metrics.count_task(
+                            "workflow", workflow.info().workflow_type, outer_self.metrics_worker, "none", "rejected"
+                        )
+                        logger.info(error_msg)
                     raise Exception(error_msg)
                 
-                logger.info(f"[Worker:{self.worker_ident}] Workflow: {workflow_name}: Processing task with routing key '{routing_key}'")
+                if self.dispatcher is not None:
+                    self.dispatcher.bind_workflow(target_sandbox, input)
+                generation = self.routes_client.generation if self.routes_client else 0
+                self.decision_header = RoutingDecision(target_sandbox, generation, routing_key).to_payload()
+                
+                if not replaying:
+                    metrics.count_task(
+                        "workflow", workflow.info().workflow_type, outer_self.metrics_worker,
+                        target_sandbox or "baseline", "accepted"
+                    )
+                    logger.info(f"[Worker:{self.worker_ident}] Workflow: {workflow_name}: Processing task with routing key '{routing_key}'")
                 return await self.next.execute_workflow(input)
         
         return _SelectiveWorkflowInboundInterceptor
@@ -63,37 +144,52 @@ class SelectiveTaskInterceptor(Interceptor):
                 super().__init__(next_interceptor)
                 self.routes_client = outer_self.routes_client
                 self.sandbox_name = outer_self.sandbox_name
+                self.dispatcher = outer_self.dispatcher
+                self.routing_keys = outer_self.routing_keys
+                self.served_sandboxes = outer_self.served_sandboxes
                 self.worker_ident = outer_self.worker_ident
-            
-            def _extract_routing_key_from_headers(self, input: ExecuteActivityInput) -> str:
-                try:
-                    if hasattr(input, 'headers') and input.headers:
-                        tracer_data = input.headers.get('_tracer-data')
-                        if tracer_data and hasattr(tracer_data, 'data'):
-                            data = json.loads(tracer_data.data)
-                            if 'baggage' in data:
-                                baggage_str = data['baggage']
-                                for item in baggage_str.split(','):
-                                    if item.strip().startswith('sd-routing-key='):
-                                        return item.split('=', 1)[1]
-                except Exception as e:
-                    logger.error(f"[ActivityDebug] Failed to extract routing key: {e}")
-                return ""
+                self.in_flight = outer_self.in_flight
             
             async def execute_activity(self, input: ExecuteActivityInput):
-                routing_key = self._extract_routing_key_from_headers(input)
                 activity_name = getattr(input.fn, "__name__", str(input.fn))
-                should_process = True
-                
-                if self.routes_client and not await self.routes_client.should_process(routing_key):
-                    should_process = False
+                decision = RoutingDecision.from_headers(input.headers)
+                if decision is not None:
+                    # Pinned by the workflow: follow it without another routing lookup
+                    routing_key = decision.routing_key
+                    target_sandbox = decision.sandbox_name if decision.sandbox_name in self.served_sandboxes else None
+                else:
+                    # Scheduled by a workflow that predates pinned decisions
+                    routing_key = self.routing_keys.get(activity.info().workflow_run_id, input.headers)
+                    target_sandbox = outer_self._route(routing_key)
                 
-                if not should_process:
+                if target_sandbox is None:
+                    metrics.count_task(
+                        "activity", activity.info().activity_type, outer_self.metrics_worker, "none", "rejected"
+                    )
                     error_msg = f"Activity/Worker cannot handle routing key: {routing_key} - Worker: {self.worker_ident}"
                     logger.info(error_msg)
                     raise Exception(error_msg)
-
-                logger.info(f"[Worker:{self.worker_ident}] Activity: {activity_name}: Processing task with routing key '{routing_key}'")
-                return await self.next.execute_activity(input)
+                
+                if self.dispatcher is not None:
+                    self.dispatcher.bind_activity(target_sandbox, input)
+                metrics.count_task(
+                    "activity", activity.info().activity_type, outer_self.metrics_worker,
+                    target_sandbox or "baseline", "accepted"
+                )
+                
+                if decision is not None:
+                    logger.debug(
+                        "[Worker:%s] Activity: %s: Processing task with routing key '%s' (pinned at generation %d)",
+                        self.worker_ident, activity_name, routing_key, decision.generation
+                    )
+                else:
+                    logger.info(f"[Worker:{self.worker_ident}] Activity: {activity_name}: Processing task with routing key '{routing_key}'")
+                if self.in_flight is None:
+                    return await self.next.execute_activity(input)
+                token = self.in_flight.start(activity.info())
+                try:
+                    return await self.next.execute_activity(input)
+                finally:
+                    self.in_flight.finish(token)
 
         return _SelectiveActivityInboundInterceptor(next)
@@ -1,29 +1,46 @@
-import logging_config  # global logging config must be first
+import logging_config  # noqa: F401  # global logging config must be first
 import os
 import asyncio
 from sandbox_aware_worker import SandboxAwareWorker
-from workflows import MoneyTransferWorkflow
-from activities import BankingActivities
+from worker_pool import WorkerPool
+from workflows import MoneyTransferWorkflow, BulkTransferWorkflow, AccountEntityWorkflow
+from activities import AccountEntityActivities, BankingActivities, TransferResultSink
 
-async def main():
+def build_worker() -> SandboxAwareWorker:
     # Get task queue from environment
     task_queue = os.environ["TASK_QUEUE"]
-    
+
     # Create banking activities instance
     banking_activities = BankingActivities()
-    
+    transfer_result_sink = TransferResultSink()
+    account_entity_activities = AccountEntityActivities(task_queue)
+
     # Create the SandboxAware worker
-    worker = SandboxAwareWorker(
+    return SandboxAwareWorker(
         task_queue=task_queue,
-        workflows=[MoneyTransferWorkflow],
+        workflows=[MoneyTransferWorkflow, BulkTransferWorkflow, AccountEntityWorkflow],
         activities=[
             banking_activities.withdraw,
             banking_activities.deposit,
+            banking_activities.transfer,
+            banking_activities.withdraw_batch,
+            banking_activities.deposit_batch,
+            banking_activities.checkpoint_account,
+            account_entity_activities.signal_account_entity,
+            transfer_result_sink.record_transfer_results,
         ]
     )
-    
+
+async def main():
+    worker = build_worker()
+
     # Start the worker
     await worker.start()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    # Number of worker processes per pod; more than one runs a supervised pool
+    worker_processes = int(os.environ.get("WORKER_PROCESSES", "1"))
+    if worker_processes > 1:
+        WorkerPool(build_worker, worker_processes).run()
+    else:
+        asyncio.run(main())
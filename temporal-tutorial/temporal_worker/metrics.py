@@ -0,0 +1,148 @@
+import math
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.multiprocess import MultiProcessCollector, mark_process_dead
+
+if TYPE_CHECKING:
+    from routing import RoutesAPIClient
+
+TASKS = Counter(
+    "temporal_worker_tasks_total",
+    "Workflow and activity tasks seen by the selective interceptor, by routing outcome",
+    ["kind", "name", "worker", "target_sandbox", "outcome"]
+)
+ROUTING_REFRESH_SECONDS = Histogram(
+    "temporal_worker_routing_refresh_duration_seconds",
+    "Duration of routing-rule refreshes from the route server, including failed ones",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+ROUTING_FETCH_ERRORS = Counter(
+    "temporal_worker_routing_fetch_errors_total",
+    "Failed routing-rule refreshes and dropped watch streams, by reason",
+    ["reason"]
+)
+ROUTING_CACHE_AGE = Gauge(
+    "temporal_worker_routing_cache_age_seconds",
+    "Seconds since the routing cache was last confirmed current (NaN before the first load)"
+)
+ROUTING_CACHE_KEYS = Gauge(
+    "temporal_worker_routing_cache_keys",
+    "Routing keys in the routing cache"
+)
+ROUTING_CACHE_GENERATION = Gauge(
+    "temporal_worker_routing_cache_generation",
+    "Number of times the routing cache contents changed"
+)
+ROUTING_READY = Gauge(
+    "temporal_worker_routing_ready",
+    "1 once routing data is available (fetched or warm-started)"
+)
+# In a worker pool, the tuning gauges are summed (lag: maxed) over the live worker processes
+WORKER_SLOT_LIMIT = Gauge(
+    "temporal_worker_slot_limit",
+    "Current auto-tuned limit of concurrent tasks, by slot type",
+    ["slot_type"],
+    multiprocess_mode="livesum"
+)
+WORKER_SLOTS_IN_USE = Gauge(
+    "temporal_worker_slots_in_use",
+    "Auto-tuned slots currently running a task, by slot type",
+    ["slot_type"],
+    multiprocess_mode="livesum"
+)
+ACTIVITY_QUEUEING_SECONDS = Histogram(
+    "temporal_worker_activity_queueing_seconds",
+    "Time sync activities waited for a free thread/process pool worker, by pool",
+    ["pool"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+EVENT_LOOP_LAG = Gauge(
+    "temporal_worker_event_loop_lag_seconds",
+    "Event-loop lag measured by the worker auto-tuner",
+    multiprocess_mode="livemax"
+)
+
+# Label children by label values; `labels()` takes a lock and builds a key per call
+_task_counters: Dict[Tuple[str, str, str, str], Counter] = {}
+_queueing_histograms: Dict[str, Histogram] = {}
+# Metrics the pool's worker processes write to PROMETHEUS_MULTIPROC_DIR, by family name
+_WORKER_PROCESS_METRICS = frozenset([
+    "temporal_worker_tasks", "temporal_worker_activity_queueing_seconds", "temporal_worker_slot_limit",
+    "temporal_worker_slots_in_use", "temporal_worker_event_loop_lag_seconds"
+])
+# Worker pool parent only: PROMETHEUS_MULTIPROC_DIR of the worker processes
+_worker_processes_dir: Optional[str] = None
+
+
+def count_task(kind: str, name: str, worker: str, target_sandbox: str, outcome: str) -> None:
+    """
+    Count one workflow/activity task accepted or rejected by the routing interceptor
+    of `worker` (its sandbox, `baseline` or `multi-sandbox`). `target_sandbox` is the
+    sandbox an accepted task runs as (`baseline` for none); `none` for rejected tasks.
+    """
+    key = (kind, name, worker, target_sandbox, outcome)
+    counter = _task_counters.get(key)
+    if counter is None:
+        counter = _task_counters[key] = TASKS.labels(kind, name, worker, target_sandbox, outcome)
+    counter.inc()
+
+
+def observe_activity_queueing(pool: str, seconds: float) -> None:
+    """Record how long a sync activity waited for a worker of `pool`."""
+    histogram = _queueing_histograms.get(pool)
+    if histogram is None:
+        histogram = _queueing_histograms[pool] = ACTIVITY_QUEUEING_SECONDS.labels(pool)
+    histogram.observe(max(0.0, seconds))
+
+
+def track_routing(routes_client: "RoutesAPIClient") -> None:
+    """Report the routing cache state of `routes_client` at scrape time."""
+    def cache_age() -> float:
+        age = routes_client.cache_age
+        return age if age is not None else math.nan
+
+    ROUTING_CACHE_AGE.set_function(cache_age)
+    ROUTING_CACHE_KEYS.set_function(lambda: len(routes_client._routing_keys_cache))
+    ROUTING_CACHE_GENERATION.set_function(lambda: routes_client.generation)
+    ROUTING_READY.set_function(lambda: 1 if routes_client.is_ready else 0)
+
+
+class _WorkerPoolCollector:
+    """
+    Routing metrics from this (refreshing) process plus task counts, activity
+    queueing delays and auto-tuning state aggregated over the pool's worker
+    processes, which write them to PROMETHEUS_MULTIPROC_DIR.
+    """
+
+    def __init__(self, path: str):
+        self._workers = MultiProcessCollector(None, path)
+
+    def collect(self):
+        for metric in REGISTRY.collect():
+            if metric.name not in _WORKER_PROCESS_METRICS:
+                yield metric
+        for metric in self._workers.collect():
+            if metric.name in _WORKER_PROCESS_METRICS:
+                yield metric
+
+
+def collect_worker_processes(path: str) -> None:
+    """Export the task metrics of worker processes using `path` as PROMETHEUS_MULTIPROC_DIR."""
+    global _worker_processes_dir
+    _worker_processes_dir = path
+
+
+def worker_process_exited(pid: int) -> None:
+    """Drop the live gauges of an exited worker pool process."""
+    if _worker_processes_dir is not None:
+        mark_process_dead(pid, _worker_processes_dir)
+
+
+def render() -> Tuple[bytes, str]:
+    """Prometheus text exposition of all metrics, and its content type."""
+    if _worker_processes_dir is None:
+        return generate_latest(), CONTENT_TYPE_LATEST
+    registry = CollectorRegistry()
+    registry.register(_WorkerPoolCollector(_worker_processes_dir))
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -1,5 +1,19 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from decimal import Decimal
+from typing import List, Optional
+
+# How MoneyTransferWorkflow moves the money: `withdraw` then `deposit` (two-step),
+# both legs in one `transfer` activity (atomic), or debit/credit signals to the
+# accounts' AccountEntityWorkflows (entity); "-local" runs the activities as local activities
+TRANSFER_MODE_TWO_STEP = "two-step"
+TRANSFER_MODE_TWO_STEP_LOCAL = "two-step-local"
+TRANSFER_MODE_ATOMIC = "atomic"
+TRANSFER_MODE_ATOMIC_LOCAL = "atomic-local"
+TRANSFER_MODE_ENTITY = "entity"
+TRANSFER_MODES = (
+    TRANSFER_MODE_TWO_STEP, TRANSFER_MODE_TWO_STEP_LOCAL, TRANSFER_MODE_ATOMIC, TRANSFER_MODE_ATOMIC_LOCAL,
+    TRANSFER_MODE_ENTITY
+)
 
 @dataclass
 class PaymentDetails:
@@ -9,12 +23,15 @@ class PaymentDetails:
     amount: str
     currency: str = "USD"
     reference: str = ""
+    transfer_mode: str = TRANSFER_MODE_TWO_STEP
     
     def __post_init__(self):
         if Decimal(self.amount) <= 0:
             raise ValueError("Amount must be positive")
         if not self.from_account or not self.to_account:
             raise ValueError("Account IDs cannot be empty")
+        if self.transfer_mode not in TRANSFER_MODES:
+            raise ValueError(f"Unknown transfer mode '{self.transfer_mode}', expected one of {', '.join(TRANSFER_MODES)}")
 
 @dataclass
 class WithdrawRequest:
@@ -48,4 +65,131 @@ class DepositResponse:
     amount: str
     balance_after: str
     success: bool
-    message: str = ""
\ No newline at end of file
+    message: str = ""
+
+@dataclass
+class TransferRequest:
+    """Transfer activity input"""
+    from_account: str
+    to_account: str
+    amount: str
+    reference: str = ""
+
+@dataclass
+class TransferResponse:
+    """Transfer activity output"""
+    transaction_id: str
+    from_account: str
+    to_account: str
+    amount: str
+    from_balance_after: str
+    to_balance_after: str
+    success: bool
+    message: str = ""
+
+@dataclass
+class AccountOperation:
+    """Debit or credit signalled to an AccountEntityWorkflow"""
+    operation_id: str
+    amount: str
+    # Workflow the AccountOperationResult is signalled back to
+    reply_to: str = ""
+    # "debit" or "credit": set by the entity from the signal it arrived on
+    kind: str = ""
+
+@dataclass
+class AccountOperationResult:
+    """Outcome of an AccountOperation, signalled back to the requesting workflow"""
+    operation_id: str
+    account_id: str
+    success: bool
+    balance_after: str
+    message: str = ""
+
+@dataclass
+class AccountEntitySignal:
+    """Signal-with-start of an AccountEntityWorkflow (signal_account_entity activity input)"""
+    workflow_id: str
+    account_id: str
+    # "debit" or "credit"
+    signal: str
+    operation: AccountOperation
+
+@dataclass
+class AccountCheckpoint:
+    """Checkpoint activity input: the net balance change since the last checkpoint"""
+    account_id: str
+    delta: str
+    reference: str = ""
+
+@dataclass
+class AccountCheckpointResponse:
+    """Checkpoint activity output"""
+    account_id: str
+    balance_after: str
+
+@dataclass
+class AccountEntityInput:
+    """AccountEntityWorkflow input, also carried across continue-as-new"""
+    account_id: str
+    # Balance carried over from the previous run (None: load it from the account store)
+    balance: Optional[str] = None
+    # Operations received but not yet applied by the previous run
+    pending: List[AccountOperation] = field(default_factory=list)
+    # Recently applied operation IDs, so a redelivered signal is not applied twice
+    applied: List[str] = field(default_factory=list)
+    # Operations applied per run before continuing as new
+    max_operations: int = 1000
+    # Checkpoint to the account store after this many operations, or this long after the first unsaved one
+    checkpoint_every: int = 100
+    checkpoint_interval_seconds: float = 5.0
+    # Complete (after a checkpoint) when no operation arrives for this long; the next one starts a new run
+    idle_timeout_seconds: float = 3600.0
+
+@dataclass
+class TransferResult:
+    """Outcome of one transfer of a bulk transfer"""
+    reference: str
+    from_account: str
+    to_account: str
+    amount: str
+    success: bool
+    withdraw_transaction_id: str = ""
+    deposit_transaction_id: str = ""
+    message: str = ""
+
+@dataclass
+class TransferResultBatch:
+    """Results of consecutive transfers of a bulk transfer, starting at `offset`"""
+    bulk_id: str
+    offset: int
+    results: List[TransferResult]
+
+@dataclass
+class BulkTransferProgress:
+    """Transfers of a bulk transfer done so far (across continue-as-new runs)"""
+    total: int
+    completed: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    runs: int = 1
+
+@dataclass
+class BulkTransferRequest:
+    """
+    Bulk transfer workflow input. `payments` are the transfers still to do;
+    `offset` is the index of the first one in the original list.
+    """
+    payments: List[PaymentDetails]
+    # Transfers per withdraw_batch/deposit_batch activity pair
+    batch_size: int = 100
+    # Batches (or shards) in flight at once
+    max_concurrency: int = 4
+    # > 0: split the payments into child workflows of this many transfers each
+    shard_size: int = 0
+    # Batches (or shards) started per run before continuing as new
+    batches_per_run: int = 100
+    # ID results are recorded under (default: the top-level workflow ID)
+    bulk_id: str = ""
+    offset: int = 0
+    progress: Optional[BulkTransferProgress] = None
@@ -0,0 +1,125 @@
+import inspect
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Type
+
+from temporalio import activity, workflow
+from temporalio.worker._interceptor import ExecuteActivityInput, ExecuteWorkflowInput
+
+logger = logging.getLogger("temporal_worker.multi_tenant")
+
+
+@dataclass
+class SandboxImplementation:
+    """
+    The workflow and activity versions one sandbox runs in a multi-sandbox worker.
+    Only what the sandbox changes needs to be listed; anything missing falls back
+    to the baseline implementation registered with the worker.
+    """
+    workflows: List[Type] = field(default_factory=list)
+    activities: List[Callable] = field(default_factory=list)
+
+
+class SandboxDispatcher:
+    """
+    Dispatch table for a worker process that serves several sandboxes.
+
+    Temporal registers exactly one implementation per workflow/activity name, so
+    the worker registers the baseline versions (plus any names only sandboxes
+    define) and the interceptor swaps in the sandbox version per task, based on
+    the routing decision for the task's routing key.
+
+    Sandbox workflow versions run in place of the registered one's `run` method;
+    signal and query handlers still resolve against the registered class. A name
+    only sandboxes define is run only for those sandboxes: its tasks are rejected
+    when they are routed elsewhere, including to the baseline.
+    """
+
+    def __init__(self, workflows: List[Type], activities: List[Callable],
+                 sandboxes: Dict[str, SandboxImplementation]):
+        self._workflows: Dict[str, Dict[str, Type]] = {}
+        self._activities: Dict[str, Dict[str, Callable]] = {}
+        # Names with no baseline version -> the sandboxes that define them
+        self._sandbox_only_workflows: Dict[str, Set[str]] = {}
+        self._sandbox_only_activities: Dict[str, Set[str]] = {}
+        self.workflows = list(workflows)
+        self.activities = list(activities)
+        registered_workflows = {workflow._Definition.must_from_class(cls).name for cls in workflows}
+        registered_activities = {
+            activity._Definition.must_from_callable(fn).name: fn for fn in activities
+        }
+        for sandbox_name, impl in sandboxes.items():
+            self._workflows[sandbox_name] = {}
+            for cls in impl.workflows:
+                name = workflow._Definition.must_from_class(cls).name
+                self._workflows[sandbox_name][name] = cls
+                if name not in registered_workflows:
+                    registered_workflows.add(name)
+                    self.workflows.append(cls)
+                    self._sandbox_only_workflows[name] = set()
+                if name in self._sandbox_only_workflows:
+                    self._sandbox_only_workflows[name].add(sandbox_name)
+            self._activities[sandbox_name] = {}
+            for fn in impl.activities:
+                name = activity._Definition.must_from_callable(fn).name
+                registered = registered_activities.get(name)
+                if registered is None:
+                    registered_activities[name] = fn
+                    self.activities.append(fn)
+                    self._sandbox_only_activities[name] = set()
+                elif inspect.iscoroutinefunction(registered) != inspect.iscoroutinefunction(fn):
+                    raise ValueError(
+                        f"Sandbox '{sandbox_name}' activity '{name}' must be "
+                        f"{'async' if inspect.iscoroutinefunction(registered) else 'sync'} like the baseline version"
+                    )
+                self._activities[sandbox_name][name] = fn
+                if name in self._sandbox_only_activities:
+                    self._sandbox_only_activities[name].add(sandbox_name)
+
+    @property
+    def sandbox_names(self) -> List[str]:
+        return sorted(self._workflows)
+
+    @staticmethod
+    def _check_defined_for(kind: str, name: str, sandbox_name: str, defined_by: Optional[Set[str]]) -> None:
+        if defined_by is not None and sandbox_name not in defined_by:
+            raise Exception(
+                f"{kind} '{name}' exists only in sandboxes {sorted(defined_by)}, "
+                f"not in {f'sandbox {sandbox_name!r}' if sandbox_name else 'the baseline'}"
+            )
+
+    def bind_workflow(self, sandbox_name: str, input: ExecuteWorkflowInput) -> None:
+        """
+        Point `input.run_fn` at the sandbox's version of the workflow, if it has one.
+        Raises if the workflow exists only in other sandboxes.
+        """
+        name = workflow._Definition.must_from_class(input.type).name
+        self._check_defined_for("Workflow", name, sandbox_name, self._sandbox_only_workflows.get(name))
+        if not sandbox_name:
+            return
+        cls = self._workflows.get(sandbox_name, {}).get(name)
+        if cls is None or cls is input.type:
+            return
+        if hasattr(cls.__init__, "__temporal_workflow_init"):
+            instance = cls(*input.args)
+        else:
+            instance = cls()
+        run_fn = workflow._Definition.must_from_class(cls).run_fn
+
+        async def run_sandbox_version(_registered_instance: Any, *args: Any) -> Any:
+            return await run_fn(instance, *args)
+
+        input.run_fn = run_sandbox_version
+
+    def bind_activity(self, sandbox_name: str, input: ExecuteActivityInput) -> None:
+        """
+        Point `input.fn` at the sandbox's version of the activity, if it has one.
+        Raises if the activity exists only in other sandboxes.
+        """
+        name = activity.info().activity_type
+        self._check_defined_for("Activity", name, sandbox_name, self._sandbox_only_activities.get(name))
+        if not sandbox_name:
+            return
+        fn: Optional[Callable] = self._activities.get(sandbox_name, {}).get(name)
+        if fn is not None:
+            input.fn = fn
@@ -1,9 +1,13 @@
 import os
 import asyncio
+import json
 import time
+from collections import deque
 import aiohttp
-from typing import Set, Optional
+from typing import Set, FrozenSet, Dict, Iterable, Optional, List, Tuple
 from urllib.parse import urlencode, urlunparse, urlparse, ParseResult
+from shared_cache import SharedRoutingCache
+import metrics
 import logging
 logger = logging.getLogger("temporal_worker.routing")
 
@@ -12,24 +16,98 @@ class RoutesAPIClient:
     """
     Client for fetching routing rules from the central platform routing API.
     Handles caching and refresh of routing keys for sandbox/baseline selection.
+
+    With `hosted_sandboxes`, one client serves several sandboxes from a single
+    process: it fetches every rule for the baseline workload in one call and keeps
+    a routing-key-to-sandbox index (from each rule's `destinationSandboxName`).
     """
-    def __init__(self, sandbox_name: str):
+    def __init__(self, sandbox_name: str, hosted_sandboxes: Optional[Iterable[str]] = None,
+                 serve_baseline: bool = False):
         self.sandbox_name = sandbox_name
+        # Multi-tenant mode: the sandboxes this process runs, and whether it also runs baseline traffic
+        self.hosted_sandboxes: Optional[FrozenSet[str]] = \
+            frozenset(hosted_sandboxes) if hosted_sandboxes is not None else None
+        self.serve_baseline = serve_baseline
+        if self.hosted_sandboxes is not None and sandbox_name:
+            raise ValueError("hosted_sandboxes cannot be combined with a single sandbox_name")
+        # One or more comma-separated route server addresses (extra ones are used for hedging/failover)
         self.route_server_addr_base = os.environ["ROUTES_API_ROUTE_SERVER_ADDR"]
-        parsed_addr = urlparse(self.route_server_addr_base)
-        self.route_server_scheme = parsed_addr.scheme or "http"
-        self.route_server_netloc = parsed_addr.netloc
+        self.route_servers: List[Tuple[str, str]] = []
+        for addr in self.route_server_addr_base.split(","):
+            if addr.strip():
+                parsed_addr = urlparse(addr.strip())
+                self.route_servers.append((parsed_addr.scheme or "http", parsed_addr.netloc))
+        if not self.route_servers:
+            raise ValueError(
+                f"ROUTES_API_ROUTE_SERVER_ADDR has no route server address: {self.route_server_addr_base!r}"
+            )
         self.baseline_kind = os.environ["ROUTES_API_BASELINE_KIND"]
         self.baseline_namespace = os.environ["ROUTES_API_BASELINE_NAMESPACE"]
         self.baseline_name = os.environ["ROUTES_API_BASELINE_NAME"]
         self.refresh_interval = int(os.environ["ROUTES_API_REFRESH_INTERVAL_SECONDS"])
-        self._routing_keys_cache: Set[str] = set()
+        # Connection pool settings for the long-lived HTTP session
+        self.connection_limit = int(os.environ.get("ROUTES_API_CONNECTION_LIMIT", "4"))
+        self.keepalive_timeout = float(os.environ.get("ROUTES_API_KEEPALIVE_SECONDS", "300"))
+        self.dns_cache_ttl = int(os.environ.get("ROUTES_API_DNS_CACHE_SECONDS", "300"))
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Request deadlines, so a hung route server cannot stall refreshes indefinitely
+        self.connect_timeout = float(os.environ.get("ROUTES_API_CONNECT_TIMEOUT_SECONDS", "2"))
+        self.read_timeout = float(os.environ.get("ROUTES_API_READ_TIMEOUT_SECONDS", "5"))
+        # Fire a request at the next route server if the previous one has not answered in time
+        self.hedge_delay = float(os.environ.get("ROUTES_API_HEDGE_DELAY_SECONDS", "0"))
+        self._refresh_latencies = deque(maxlen=int(os.environ.get("ROUTES_API_LATENCY_WINDOW", "512")))
+        self._refresh_count = 0
+        # Watch mode keeps one streaming connection open instead of polling
+        self.watch_enabled = os.environ.get("ROUTES_API_WATCH", "false").lower() == "true"
+        self.watch_retry_seconds = float(os.environ.get("ROUTES_API_WATCH_RETRY_SECONDS", "5"))
+        self.watch_idle_timeout = float(os.environ.get("ROUTES_API_WATCH_IDLE_TIMEOUT_SECONDS", "60"))
+        self._watch_server_index = 0
+        self._watch_unsupported_logged = False
+        # Conditional refresh state: last ETag and revision cursor seen from the server
+        self._etag: Optional[str] = None
+        self._revision: Optional[str] = None
+        # Immutable snapshot, replaced (never mutated) on every change so readers
+        # can use it without locking; `generation` counts the replacements
+        self._routing_keys_cache: FrozenSet[str] = frozenset()
+        self.generation = 0
+        # Multi-tenant mode only: routing key -> destination sandbox name (replaced, never mutated)
+        self._routing_index: Dict[str, str] = {}
         self._cache_update_lock = asyncio.Lock()
         self._cache_updated_event = asyncio.Event()
+        # Set whenever the routing snapshot is replaced (see `wait_for_routing_change`)
+        self._routing_changed_event = asyncio.Event()
         self._last_successful_update_time: float = 0.0
         self._is_first_update_done = False
+        # Set once routing data is available (first fetch or a warm-start snapshot)
+        self._ready_event = asyncio.Event()
+        self.poller_state = "idle"
+        # Optional node-local cache shared with the other worker processes on this node
+        self._shared_cache: Optional[SharedRoutingCache] = None
+        self._shared_generation = 0
+        self._published_keys: Optional[FrozenSet[str]] = None
+        # Optional on-disk snapshot used to warm-start the cache after a restart
+        self.snapshot_path = os.environ.get("ROUTES_API_SNAPSHOT_PATH", "")
+        self.snapshot_max_age = float(os.environ.get("ROUTES_API_SNAPSHOT_MAX_AGE_SECONDS", "600"))
+        self.warm_started = False
+        self._saved_keys: Optional[FrozenSet[str]] = None
+        self._last_snapshot_time = 0.0
+        if self.snapshot_path:
+            self._load_snapshot()
+        shared_cache_dir = os.environ.get("ROUTES_API_SHARED_CACHE_DIR", "")
+        if shared_cache_dir:
+            self.shared_cache_poll_seconds = float(os.environ.get("ROUTES_API_SHARED_CACHE_POLL_SECONDS", "1"))
+            # Never become the refresher (e.g. worker pool children, whose parent refreshes)
+            self.shared_cache_follow_only = \
+                os.environ.get("ROUTES_API_SHARED_CACHE_FOLLOW_ONLY", "false").lower() == "true"
+            self._shared_cache = SharedRoutingCache(
+                SharedRoutingCache.path_for(
+                    shared_cache_dir, self.baseline_kind, self.baseline_namespace,
+                    self.baseline_name, self.sandbox_name or ("multi-tenant" if self._tracks_destinations else "")
+                ),
+                max_bytes=int(os.environ.get("ROUTES_API_SHARED_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+            )
 
-    def _build_routes_url(self) -> str:
+    def _build_routes_url(self, watch: bool = False, server_index: int = 0) -> str:
         query_params = {
             'baselineKind': self.baseline_kind,
             'baselineNamespace': self.baseline_namespace,
@@ -37,10 +115,14 @@ class RoutesAPIClient:
         }
         if self.sandbox_name:
             query_params['destinationSandboxName'] = self.sandbox_name
+        if self._revision is not None:
+            query_params['sinceRevision'] = self._revision
+        if watch:
+            query_params['watch'] = 'true'
         path = '/api/v1/workloads/routing-rules'
         url_parts = ParseResult(
-            scheme=self.route_server_scheme,
-            netloc=self.route_server_netloc,
+            scheme=self.route_servers[server_index][0],
+            netloc=self.route_servers[server_index][1],
             path=path,
             params='',
             query=urlencode(query_params),
@@ -48,34 +130,329 @@ class RoutesAPIClient:
         )
         return urlunparse(url_parts)
 
-    async def _perform_fetch_and_update(self) -> None:
-        url = self._build_routes_url()
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Return the pooled HTTP session, creating it on first use.
+        The session keeps connections to the route server alive between refreshes
+        instead of paying a new TCP/TLS handshake on every poll.
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.connection_limit,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl,
+                use_dns_cache=True
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def close(self) -> None:
+        """Close the pooled HTTP session and release its connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        if self._shared_cache is not None:
+            self._shared_cache.close()
+            self._shared_cache = None
+
+    @staticmethod
+    def _keys_from_rules(rules) -> Set[str]:
+        routing_keys = set()
+        if isinstance(rules, list):
+            for rule in rules:
+                if isinstance(rule, dict) and 'routingKey' in rule and rule['routingKey'] is not None:
+                    routing_keys.add(str(rule['routingKey']))
+        return routing_keys
+
+    @staticmethod
+    def _destinations_from_rules(rules) -> Dict[str, str]:
+        destinations = {}
+        if isinstance(rules, list):
+            for rule in rules:
+                if isinstance(rule, dict) and rule.get('routingKey') is not None:
+                    destinations[str(rule['routingKey'])] = str(rule.get('destinationSandboxName') or "")
+        return destinations
+
+    @property
+    def _tracks_destinations(self) -> bool:
+        return self.hosted_sandboxes is not None
+
+    @staticmethod
+    def _extract_routing_keys(data) -> Set[str]:
+        """Extract the routing keys from a routing-rules response document."""
+        if isinstance(data, dict) and 'routingRules' in data:
+            return RoutesAPIClient._keys_from_rules(data['routingRules'])
+        return set()
+
+    def _set_routing_keys(self, routing_keys: FrozenSet[str], destinations: Optional[Dict[str, str]] = None) -> None:
+        self._routing_keys_cache = routing_keys
+        if destinations is not None:
+            self._routing_index = destinations
+        self.generation += 1
+        self._routing_changed_event.set()
+
+    def _apply_routing_keys(self, new_routing_keys: Set[str], destinations: Optional[Dict[str, str]] = None) -> None:
+        """Replace the cached routing keys and mark the cache as fresh."""
+        # Only log if the routing keys have changed
+        if new_routing_keys != self._routing_keys_cache or \
+           (destinations is not None and destinations != self._routing_index):
+            logger.info(f"RoutesAPIClient: Routing keys updated: {list(new_routing_keys)}")
+            self._set_routing_keys(frozenset(new_routing_keys), destinations)
+        self._mark_cache_fresh()
+
+    def _apply_routing_delta(self, added: Set[str], removed: Set[str],
+                             added_destinations: Optional[Dict[str, str]] = None) -> None:
+        """Apply an incremental update without rebuilding the set from a full list."""
+        moved = {key for key, dest in (added_destinations or {}).items() if self._routing_index.get(key) != dest}
+        added = added - self._routing_keys_cache
+        removed = removed & self._routing_keys_cache
+        if added or removed or moved:
+            logger.info(f"RoutesAPIClient: Routing keys changed: added={list(added)}, removed={list(removed)}")
+            destinations = None
+            if added_destinations is not None:
+                destinations = {key: dest for key, dest in self._routing_index.items() if key not in removed}
+                destinations.update(added_destinations)
+            self._set_routing_keys(self._routing_keys_cache.difference(removed).union(added), destinations)
+        self._mark_cache_fresh()
+
+    def _apply_routing_document(self, data) -> None:
+        """
+        Apply a routing-rules document, which is either a full list (`routingRules`)
+        or a delta against our revision cursor (`addedRoutingRules`/`removedRoutingRules`).
+        """
+        if not isinstance(data, dict):
+            raise ValueError(f"unexpected routing-rules document: {type(data).__name__}")
+        is_full = 'routingRules' in data
+        if not is_full and 'addedRoutingRules' not in data and 'removedRoutingRules' not in data:
+            raise ValueError("routing-rules document has neither full rules nor a delta")
+        # Advance the cursor before applying so the persisted snapshot matches it
+        if data.get('revision') is not None:
+            self._revision = str(data['revision'])
+        if is_full:
+            destinations = self._destinations_from_rules(data['routingRules']) if self._tracks_destinations else None
+            self._apply_routing_keys(self._extract_routing_keys(data), destinations)
+        else:
+            added_rules = data.get('addedRoutingRules')
+            self._apply_routing_delta(
+                self._keys_from_rules(added_rules),
+                self._keys_from_rules(data.get('removedRoutingRules')),
+                self._destinations_from_rules(added_rules) if self._tracks_destinations else None
+            )
+
+    def _mark_cache_fresh(self) -> None:
+        self._last_successful_update_time = time.monotonic()
+        self._is_first_update_done = True
+        self._ready_event.set()
+        if self._shared_cache is not None and self._shared_cache.is_leader:
+            if self._routing_keys_cache is not self._published_keys:
+                self._shared_cache.publish(
+                    self._routing_keys_cache, self._routing_index if self._tracks_destinations else None
+                )
+                self._published_keys = self._routing_keys_cache
+            else:
+                self._shared_cache.touch()
+        self._save_snapshot()
+
+    def _snapshot_identity(self) -> dict:
+        identity = {
+            'baselineKind': self.baseline_kind,
+            'baselineNamespace': self.baseline_namespace,
+            'baselineName': self.baseline_name,
+            'sandboxName': self.sandbox_name
+        }
+        if self._tracks_destinations:
+            identity['multiTenant'] = True
+        return identity
+
+    def _load_snapshot(self) -> None:
+        """
+        Warm-start the cache from the last persisted routing snapshot if it is fresh
+        enough. The cache is still refreshed from the route server right away; this
+        only avoids routing against an empty cache until that first fetch completes.
+        """
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logger.warning(f"RoutesAPIClient: Ignoring unreadable routing snapshot {self.snapshot_path}: {e}")
+            return
+        if not isinstance(snapshot, dict) or snapshot.get('identity') != self._snapshot_identity():
+            logger.warning(f"RoutesAPIClient: Ignoring routing snapshot {self.snapshot_path} for a different worker")
+            return
+        age = time.time() - float(snapshot.get('savedAt', 0))
+        if age < 0 or age > self.snapshot_max_age:
+            logger.info(f"RoutesAPIClient: Routing snapshot is {age:.0f}s old, not warm-starting")
+            return
+        destinations = dict(snapshot.get('routingDestinations', {})) if self._tracks_destinations else None
+        self._set_routing_keys(frozenset(snapshot.get('routingKeys', [])), destinations)
+        self._etag = snapshot.get('etag')
+        self._revision = snapshot.get('revision')
+        self._last_successful_update_time = time.monotonic() - age
+        self.warm_started = True
+        self._ready_event.set()
+        logger.info(f"RoutesAPIClient: Warm-started with {len(self._routing_keys_cache)} routing keys from snapshot ({age:.0f}s old)")
+
+    def _save_snapshot(self) -> None:
+        """Persist the routing cache when it changed, or at most once per refresh interval."""
+        if not self.snapshot_path:
+            return
+        now = time.monotonic()
+        if self._routing_keys_cache is self._saved_keys and \
+           now - self._last_snapshot_time < self.refresh_interval:
+            return
+        snapshot = {
+            'identity': self._snapshot_identity(),
+            'savedAt': time.time(),
+            'etag': self._etag,
+            'revision': self._revision,
+            'routingKeys': sorted(self._routing_keys_cache)
+        }
+        if self._tracks_destinations:
+            snapshot['routingDestinations'] = self._routing_index
+        tmp_path = f"{self.snapshot_path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(snapshot, f)
+            # Atomic replace so a crash never leaves a truncated snapshot behind
+            os.replace(tmp_path, self.snapshot_path)
+            self._saved_keys = self._routing_keys_cache
+            self._last_snapshot_time = now
+        except OSError as e:
+            logger.warning(f"RoutesAPIClient: Failed to save routing snapshot {self.snapshot_path}: {e}")
+
+    def _sync_from_shared_cache(self) -> None:
+        """
+        Adopt the routing snapshot published by this node's refreshing process. The
+        keys are copied into this process's own frozenset, so routing lookups never
+        touch the shared file.
+        """
+        snapshot = self._shared_cache.read(self._shared_generation)
+        if snapshot is not None:
+            self._shared_generation, routing_keys, destinations, _ = snapshot
+            # Our ETag/revision cursor describes our own last fetch, not these keys: if this
+            # process becomes the refresher, it starts with a full fetch
+            self._etag = None
+            self._revision = None
+            if routing_keys != self._routing_keys_cache or \
+               (self._tracks_destinations and destinations != self._routing_index):
+                logger.info(f"RoutesAPIClient: Routing keys updated from shared cache: {list(routing_keys)}")
+                self._set_routing_keys(routing_keys, destinations if self._tracks_destinations else None)
+        if self._shared_generation:
+            # Cache age follows the leader's last confirmed refresh
+            age = max(0.0, time.time() - self._shared_cache.published_at)
+            self._last_successful_update_time = time.monotonic() - age
+            self._is_first_update_done = True
+            self._ready_event.set()
+
+    async def _fetch_from(self, server_index: int) -> Tuple[int, Optional[dict], Optional[str]]:
+        """Fetch routing rules from one route server; returns (status, document, ETag)."""
+        url = self._build_routes_url(server_index=server_index)
+        headers = {'If-None-Match': self._etag} if self._etag else {}
+        timeout = aiohttp.ClientTimeout(
+            total=self.connect_timeout + self.read_timeout,
+            sock_connect=self.connect_timeout,
+            sock_read=self.read_timeout
+        )
+        session = self._get_session()
+        async with session.get(url, headers=headers, timeout=timeout) as response:
+            if response.status == 304:
+                return response.status, None, self._etag
+            if response.status == 200:
+                return response.status, await response.json(), response.headers.get('ETag')
+            raise aiohttp.ClientResponseError(
+                response.request_info, response.history,
+                status=response.status, message=await response.text()
+            )
+
+    async def _fetch_hedged(self) -> Tuple[int, Optional[dict], Optional[str]]:
+        """
+        Fetch from the route servers in order. With a hedge delay, the next server
+        is also queried whenever the outstanding requests have not answered within
+        it; without one, the next server is only tried after a failure. The first
+        successful answer wins and the remaining requests are cancelled.
+        """
+        tasks = []
+        errors = []
+        next_index = 0
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        new_routing_keys = set()
-                        if isinstance(data, dict) and 'routingRules' in data and isinstance(data['routingRules'], list):
-                            for rule in data['routingRules']:
-                                if isinstance(rule, dict) and 'routingKey' in rule and rule['routingKey'] is not None:
-                                    new_routing_keys.add(str(rule['routingKey']))
-                        # Only log if the routing keys have changed
-                        if new_routing_keys != self._routing_keys_cache:
-                            logger.info(f"RoutesAPIClient: Routing keys updated: {list(new_routing_keys)}")
-                        self._routing_keys_cache = new_routing_keys
-                        self._last_successful_update_time = time.monotonic()
-                        self._is_first_update_done = True
+            while True:
+                if next_index < len(self.route_servers):
+                    tasks.append(asyncio.create_task(self._fetch_from(next_index)))
+                    next_index += 1
+                pending = [task for task in tasks if not task.done()]
+                if not pending:
+                    raise errors[-1]
+                can_hedge = self.hedge_delay > 0 and next_index < len(self.route_servers)
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.hedge_delay if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.cancelled():
+                        # Cancelled from inside the HTTP client rather than by us
+                        errors.append(aiohttp.ClientError("route server request was cancelled"))
+                    elif task.exception() is None:
+                        return task.result()
                     else:
-                        logger.error(f"RoutesAPIClient: Error fetching routes. Status: {response.status}, Body: {await response.text()}")
+                        errors.append(task.exception())
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _record_refresh_latency(self, latency: float) -> None:
+        self._refresh_latencies.append(latency)
+        metrics.ROUTING_REFRESH_SECONDS.observe(latency)
+        self._refresh_count += 1
+        if self._refresh_count % 100 == 0:
+            p = self.refresh_latency_percentiles()
+            logger.info(
+                f"RoutesAPIClient: Refresh latency over last {len(self._refresh_latencies)} refreshes: "
+                f"p50={p['p50']:.3f}s p90={p['p90']:.3f}s p99={p['p99']:.3f}s max={p['max']:.3f}s"
+            )
+
+    def refresh_latency_percentiles(self) -> dict:
+        """Refresh latency percentiles (seconds) over the recent refresh window."""
+        ordered = sorted(self._refresh_latencies)
+        if not ordered:
+            return {'p50': 0.0, 'p90': 0.0, 'p99': 0.0, 'max': 0.0}
+        def pct(q: float) -> float:
+            return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+        return {'p50': pct(0.50), 'p90': pct(0.90), 'p99': pct(0.99), 'max': ordered[-1]}
+
+    async def _perform_fetch_and_update(self) -> None:
+        start = time.perf_counter()
+        try:
+            status, data, etag = await self._fetch_hedged()
+            if status == 304:
+                # Unchanged since the last fetch: nothing to download or parse
+                self._mark_cache_fresh()
+            else:
+                # Forget the old ETag first: a document that fails to apply must not
+                # be skipped by a later 304
+                self._etag = None
+                self._apply_routing_document(data)
+                self._etag = etag
+        except aiohttp.ClientResponseError as e:
+            metrics.ROUTING_FETCH_ERRORS.labels("http_status").inc()
+            logger.error(f"RoutesAPIClient: Error fetching routes. Status: {e.status}, Body: {e.message}")
+        except asyncio.TimeoutError:
+            metrics.ROUTING_FETCH_ERRORS.labels("timeout").inc()
+            logger.error(f"RoutesAPIClient: Timed out fetching routes from {self.route_server_addr_base}")
         except aiohttp.ClientError as e:
+            metrics.ROUTING_FETCH_ERRORS.labels("connection").inc()
             logger.error(f"RoutesAPIClient: HTTP client error fetching routes: {e}")
         except Exception as e:
+            metrics.ROUTING_FETCH_ERRORS.labels("invalid_response").inc()
             logger.error(f"RoutesAPIClient: Error during route fetch/parse: {e}")
+        finally:
+            self._record_refresh_latency(time.perf_counter() - start)
 
-    async def _ensure_cache_fresh(self) -> None:
+    async def _ensure_cache_fresh(self, force: bool = False) -> None:
         current_time = time.monotonic()
-        needs_update = not self._is_first_update_done or \
+        needs_update = force or not self._is_first_update_done or \
                        (current_time - self._last_successful_update_time > self.refresh_interval)
         if needs_update:
             if self._cache_update_lock.locked():
@@ -83,7 +460,7 @@ class RoutesAPIClient:
             else:
                 async with self._cache_update_lock:
                     current_time_after_lock = time.monotonic()
-                    if not self._is_first_update_done or \
+                    if force or not self._is_first_update_done or \
                        (current_time_after_lock - self._last_successful_update_time > self.refresh_interval):
                         self._cache_updated_event.clear()
                         try:
@@ -93,40 +470,216 @@ class RoutesAPIClient:
                     else:
                         if not self._cache_updated_event.is_set(): self._cache_updated_event.set()
 
+    async def _watch_stream(self) -> Tuple[bool, bool]:
+        """
+        Consume the routing-rules watch stream until it ends.
+        The server sends newline-delimited JSON documents shaped like the polling
+        response; blank lines are heartbeats. Returns whether the server streamed
+        (sent a heartbeat or more than one document, rather than answering with a
+        single polling response, as a server without watch support does) and
+        whether at least one update was received before the stream closed.
+        """
+        url = self._build_routes_url(watch=True, server_index=self._watch_server_index)
+        documents = 0
+        streamed = False
+        session = self._get_session()
+        # Heartbeats keep an idle stream inside the read deadline
+        timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=self.connect_timeout, sock_read=self.watch_idle_timeout
+        )
+        async with session.get(url, timeout=timeout) as response:
+            if response.status != 200:
+                raise aiohttp.ClientResponseError(
+                    response.request_info, response.history,
+                    status=response.status, message=await response.text()
+                )
+            if response.content_type == "application/json":
+                # Watch not supported: a plain polling response
+                self._etag = None
+                self._apply_routing_document(json.loads(await response.read()))
+                self._etag = response.headers.get('ETag')
+                return False, True
+            self.poller_state = "watching"
+            async for line in response.content:
+                line = line.strip()
+                if not line:
+                    # Heartbeat: the stream is alive, so the cache is current
+                    streamed = True
+                    if self._is_first_update_done:
+                        self._mark_cache_fresh()
+                    continue
+                self._apply_routing_document(json.loads(line))
+                documents += 1
+                streamed = streamed or documents > 1
+        return streamed, documents > 0
+
+    async def _watch_cache_updater(self):
+        """
+        Apply pushed routing updates, falling back to polling while the stream is down.
+        Against a route server that answers watch requests with a single document,
+        the reconnect delay keeps backing off to the refresh interval, so the worker
+        ends up polling at the refresh interval.
+        """
+        retry_delay = self.watch_retry_seconds
+        while True:
+            received_update = False
+            try:
+                streamed, received_update = await self._watch_stream()
+                if streamed:
+                    retry_delay = self.watch_retry_seconds
+                    logger.warning("RoutesAPIClient: Routing watch stream closed, falling back to polling")
+                elif not self._watch_unsupported_logged:
+                    self._watch_unsupported_logged = True
+                    logger.warning(
+                        "RoutesAPIClient: Route server answered the watch request without streaming; "
+                        f"retrying the watch with backoff up to the {self.refresh_interval}s refresh interval"
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                metrics.ROUTING_FETCH_ERRORS.labels("watch").inc()
+                logger.warning(f"RoutesAPIClient: Routing watch stream failed, falling back to polling: {e}")
+                streamed = False
+            self.poller_state = "fallback"
+            # Reconnect to the next route server, if several are configured
+            self._watch_server_index = (self._watch_server_index + 1) % len(self.route_servers)
+            if streamed or not received_update:
+                # Updates may have been missed while disconnected
+                await self._ensure_cache_fresh(force=True)
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, self.refresh_interval)
+
+    async def _run_refresher(self):
+        sandbox_info = f"sandbox '{self.sandbox_name}'" if self.sandbox_name else "baseline"
+        if self.watch_enabled:
+            logger.info(f"RoutesAPIClient: Starting routing watch for {sandbox_info} with polling fallback")
+            await self._watch_cache_updater()
+            return
+        logger.info(f"RoutesAPIClient: Starting periodic cache updater for {sandbox_info} with {self.refresh_interval}s polling interval")
+        self.poller_state = "polling"
+        
+        while True:
+            await self._ensure_cache_fresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    def try_become_refresher(self) -> bool:
+        """
+        Take the node's routing refresher role now if no other process holds it, so
+        processes started afterwards follow this one. True if this process refreshes
+        (always, without a shared routing cache).
+        """
+        if self._shared_cache is None:
+            return True
+        return not self.shared_cache_follow_only and self._shared_cache.try_acquire_leadership()
+
+    async def _shared_cache_updater(self):
+        """
+        Follow the node's shared routing cache, taking over refreshing if no other
+        process holds the refresher lock (e.g. after the previous leader exited).
+        """
+        logger.info(f"RoutesAPIClient: Using shared routing cache {self._shared_cache.path}")
+        self.poller_state = "following"
+        while True:
+            if not self.shared_cache_follow_only and self._shared_cache.try_acquire_leadership():
+                logger.info("RoutesAPIClient: This process is the routing refresher for the node")
+                await self._run_refresher()
+                return
+            self._sync_from_shared_cache()
+            await asyncio.sleep(self.shared_cache_poll_seconds)
+
     async def _periodic_cache_updater(self):
         try:
-            sandbox_info = f"sandbox '{self.sandbox_name}'" if self.sandbox_name else "baseline"
-            logger.info(f"RoutesAPIClient: Starting periodic cache updater for {sandbox_info} with {self.refresh_interval}s polling interval")
-            
-            while True:
-                await self._ensure_cache_fresh()
-                await asyncio.sleep(self.refresh_interval)
+            if self._shared_cache is not None:
+                await self._shared_cache_updater()
+            else:
+                await self._run_refresher()
         except asyncio.CancelledError:
             pass
         except Exception as e:
             logger.error(f"RoutesAPIClient: Periodic cache updater for sandbox '{self.sandbox_name or 'baseline'}' error: {e}")
+        finally:
+            self.poller_state = "stopped"
 
-    async def should_process(self, routing_key: Optional[str]) -> bool:
+    @property
+    def is_ready(self) -> bool:
+        """True once routing data is available, from a fetch or a warm-start snapshot."""
+        return self._ready_event.is_set()
+
+    @property
+    def cache_age(self) -> Optional[float]:
+        """Seconds since the routing cache was last confirmed current, or None if never."""
+        if not self.is_ready:
+            return None
+        return time.monotonic() - self._last_successful_update_time
+
+    async def wait_until_ready(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for routing data; returns whether it arrived."""
+        try:
+            await asyncio.wait_for(self._ready_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def status(self) -> dict:
+        """Routing cache state for health reporting."""
+        cache_age = self.cache_age
+        return {
+            'ready': self.is_ready,
+            'warmStarted': self.warm_started,
+            'pollerState': self.poller_state,
+            'cacheAgeSeconds': round(cache_age, 3) if cache_age is not None else None,
+            'routingKeys': len(self._routing_keys_cache),
+            'hostedSandboxes': sorted(self.hosted_sandboxes) if self.hosted_sandboxes is not None else None,
+            'refreshLatencySeconds': {k: round(v, 4) for k, v in self.refresh_latency_percentiles().items()}
+        }
+
+    async def wait_for_routing_change(self, generation: int) -> int:
+        """Wait until the routing snapshot moves past `generation`; returns the new generation."""
+        while self.generation == generation:
+            self._routing_changed_event.clear()
+            await self._routing_changed_event.wait()
+        return self.generation
+
+    def served_routing_keys(self) -> FrozenSet[str]:
+        """The routing keys whose tasks this worker runs instead of the baseline."""
+        if self.hosted_sandboxes is not None:
+            return frozenset(key for key, dest in self._routing_index.items() if dest in self.hosted_sandboxes)
+        if self.sandbox_name:
+            return self._routing_keys_cache
+        return frozenset()
+
+    def route_sync(self, routing_key: Optional[str]) -> Optional[str]:
         """
-        Determine if a workflow/activity with the given routing key should be processed by this worker.
+        Multi-tenant routing decision: the hosted sandbox that should run a task
+        with this routing key, "" to run it as baseline, or None to reject it.
         """
-        current_cached_keys = self._routing_keys_cache
+        destination = self._routing_index.get(routing_key)
+        if destination is None:
+            if routing_key in self._routing_keys_cache:
+                # Routed to a sandbox, but the route server did not say which
+                return None
+            return "" if self.serve_baseline else None
+        return destination if destination in self.hosted_sandboxes else None
+
+    def should_process_sync(self, routing_key: Optional[str]) -> bool:
+        """
+        Synchronous routing decision for the per-task hot path: one set lookup on
+        the current immutable snapshot, with no awaiting, logging or allocation.
+        """
+        if self.hosted_sandboxes is not None:
+            return self.route_sync(routing_key) is not None
         if self.sandbox_name:
-            if routing_key is None:
-                logger.debug(f"Sandbox worker: No routing key provided, will not process.")
-                return False
-            should = routing_key in current_cached_keys
-            logger.debug(
-                f"Sandbox worker: routing_key={routing_key}, cache={list(current_cached_keys)}, should_process={should}"
-            )
-            return should
-        else:
-            if routing_key is None:
-                logger.debug(f"Baseline worker: No routing key provided, will process.")
-                return True
-            should = routing_key not in current_cached_keys
-            logger.debug(
-                f"Baseline worker: routing_key={routing_key}, cache={list(current_cached_keys)}, should_process={should}"
-            )
-            return should
+            return routing_key is not None and routing_key in self._routing_keys_cache
+        return routing_key is None or routing_key not in self._routing_keys_cache
 
+    async def should_process(self, routing_key: Optional[str]) -> bool:
+        """
+        Determine if a workflow/activity with the given routing key should be processed by this worker.
+        Kept for compatibility; prefer `should_process_sync` on hot paths.
+        """
+        should = self.should_process_sync(routing_key)
+        logger.debug(
+            "%s worker: routing_key=%s, cached_keys=%d, should_process=%s",
+            "Sandbox" if self.sandbox_name else "Baseline", routing_key, len(self._routing_keys_cache), should
+        )
+        return should
@@ -0,0 +1,47 @@
+from typing import Dict, Mapping, NamedTuple, Optional
+
+from temporalio.api.common.v1 import Payload
+
+# Header carrying the workflow's routing decision to the activities it schedules
+ROUTING_DECISION_HEADER = "sd-routing-decision"
+_ENCODING = b"binary/plain"
+# Decoded headers by payload bytes; every activity of a run carries the same one
+_DECODED_MAX_SIZE = 4096
+_decoded: Dict[bytes, "RoutingDecision"] = {}
+
+
+class RoutingDecision(NamedTuple):
+    """
+    Routing decision made when a workflow task was accepted: which sandbox runs
+    the workflow ("" for baseline) and the routing snapshot generation it was
+    based on. Encoded as `<generation>:<sandbox>:<routing key>`.
+    """
+    sandbox_name: str
+    generation: int
+    routing_key: str
+
+    def to_payload(self) -> Payload:
+        return Payload(
+            metadata={"encoding": _ENCODING},
+            data=f"{self.generation}:{self.sandbox_name}:{self.routing_key}".encode()
+        )
+
+    @staticmethod
+    def from_headers(headers: Optional[Mapping[str, Payload]]) -> Optional["RoutingDecision"]:
+        """Return the decision carried in `headers`, or None if there is none (or it is malformed)."""
+        if not headers:
+            return None
+        payload = headers.get(ROUTING_DECISION_HEADER)
+        if payload is None:
+            return None
+        data = payload.data
+        decision = _decoded.get(data)
+        if decision is None:
+            parts = data.decode().split(":", 2)
+            if len(parts) != 3 or not parts[0].isdigit():
+                return None
+            decision = RoutingDecision(sandbox_name=parts[1], generation=int(parts[0]), routing_key=parts[2])
+            if len(_decoded) >= _DECODED_MAX_SIZE:
+                _decoded.clear()
+            _decoded[data] = decision
+        return decision
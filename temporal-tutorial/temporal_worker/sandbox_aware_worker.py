@@ -3,13 +3,22 @@ import asyncio
 import logging
 import signal
 import sys
-from typing import List, Any
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from typing import Dict, List, Any, Optional
 from temporalio.worker import Worker
 from temporalio.client import Client
 from temporalio.contrib.opentelemetry import TracingInterceptor
 
 from routing import RoutesAPIClient
 from interceptors import SelectiveTaskInterceptor
+from health import HealthServer
+from multi_tenant import SandboxDispatcher, SandboxImplementation
+from task_queues import TaskQueueImplementation, routing_task_queue
+from in_flight import InFlightActivities
+from activity_executors import ActivityExecutors
+from worker_tuning import DEFAULT_MAX_SLOTS, AdaptiveConcurrencyController, worker_options_from_env
+import metrics
 
 logger = logging.getLogger("temporal_worker.sandbox_aware_worker")
 
@@ -19,7 +28,12 @@ class SandboxAwareWorker:
     Developers can extend this class to add their domain-specific workflows and activities.
     """
     
-    def __init__(self, task_queue: str, workflows: List[Any], activities: List[Any]):
+    def __init__(self, task_queue: str, workflows: List[Any], activities: List[Any],
+                 sandboxes: Optional[Dict[str, SandboxImplementation]] = None,
+                 serve_baseline: bool = False,
+                 task_queues: Optional[Dict[str, TaskQueueImplementation]] = None,
+                 thread_pool: Optional[ThreadPoolExecutor] = None,
+                 process_pool: Optional[ProcessPoolExecutor] = None):
         """
         Initialize the SandboxAware worker.
         
@@ -27,21 +41,87 @@ class SandboxAwareWorker:
             task_queue: The task queue name for this worker
             workflows: List of workflow classes to register
             activities: List of activity functions to register
+            sandboxes: Multi-sandbox mode: sandbox name -> the workflow/activity versions
+                that sandbox runs. One process then serves all of these sandboxes.
+            serve_baseline: In multi-sandbox mode, also run tasks not routed to any sandbox
+            task_queues: Additional task queues -> the workflows/activities run on each.
+                All task queues share one Temporal client connection, one routing client
+                and (with WORKER_AUTOTUNE) one set of slot limits.
+            thread_pool: Pool for sync activities, the Workers' `activity_executor` (default:
+                a TimedThreadPoolExecutor sized by WORKER_ACTIVITY_THREADS)
+            process_pool: Pool for sync activities marked `offload(PROCESS_POOL)` (default:
+                created on first use, sized by WORKER_ACTIVITY_PROCESSES)
         """
         self.task_queue = task_queue
-        self.workflows = workflows
-        self.activities = activities
         self.sandbox_name = os.environ.get("SIGNADOT_SANDBOX_NAME", "")
+        if sandboxes and self.sandbox_name:
+            raise ValueError("Multi-sandbox mode cannot be used in a sandbox fork (SIGNADOT_SANDBOX_NAME is set)")
+        # Task queue -> registered workflows/activities (and sandbox dispatch table in multi-sandbox mode)
+        self.task_queues: Dict[str, TaskQueueImplementation] = {}
+        self.dispatchers: Dict[str, SandboxDispatcher] = {}
+        # Worker concurrency, pollers and sticky cache size; optionally auto-tuned slot limits
+        self.worker_options = worker_options_from_env()
+        max_concurrent_activities = self.worker_options.get("max_concurrent_activities", DEFAULT_MAX_SLOTS)
+        self.tuning = None
+        if os.environ.get("WORKER_AUTOTUNE", "false").lower() == "true":
+            self.tuning = AdaptiveConcurrencyController.from_env(self.worker_options)
+            self.worker_options = self.tuning.apply_to(self.worker_options)
+        # Sync activities run in these pools, off the event loop
+        self.activity_executors = ActivityExecutors(thread_pool, process_pool, max_concurrent_activities)
+        all_task_queues = {task_queue: TaskQueueImplementation(workflows=workflows, activities=activities)}
+        for name, impl in (task_queues or {}).items():
+            if name in all_task_queues:
+                raise ValueError(f"Task queue '{name}' is configured more than once")
+            all_task_queues[name] = impl
+        if sandboxes:
+            sandboxes = {
+                sandbox: SandboxImplementation(
+                    workflows=impl.workflows, activities=self.activity_executors.wrap_all(impl.activities)
+                )
+                for sandbox, impl in sandboxes.items()
+            }
+        for name, impl in all_task_queues.items():
+            impl = TaskQueueImplementation(
+                workflows=impl.workflows, activities=self.activity_executors.wrap_all(impl.activities)
+            )
+            if sandboxes:
+                dispatcher = self.dispatchers[name] = SandboxDispatcher(impl.workflows, impl.activities, sandboxes)
+                impl = TaskQueueImplementation(workflows=dispatcher.workflows, activities=dispatcher.activities)
+            self.task_queues[name] = impl
+        self.dispatcher = self.dispatchers.get(task_queue)
+        self.workflows = self.task_queues[task_queue].workflows
+        self.activities = self.task_queues[task_queue].activities
         self.temporal_url = os.environ["TEMPORAL_SERVER_URL"]
         
+        # Optionally hold task polling until routing data is available
+        self.readiness_gate = os.environ.get("WORKER_READINESS_GATE", "false").lower() == "true"
+        self.startup_deadline = float(os.environ.get("WORKER_STARTUP_DEADLINE_SECONDS", "30"))
+        self.health_port = int(os.environ.get("HEALTH_PORT", "0"))
+        # On SIGTERM, stop polling and give in-flight tasks this long to finish (0 = cancel right away)
+        self.drain_timeout = float(os.environ.get("WORKER_DRAIN_TIMEOUT_SECONDS", "0"))
+        # Poll one task queue per served routing key (`<task queue>@<routing key>`)
+        self.routing_task_queues = os.environ.get("WORKER_ROUTING_TASK_QUEUES", "false").lower() == "true"
+        
         # Initialize routes client for sandbox routing
-        self.routes_client = RoutesAPIClient(sandbox_name=self.sandbox_name)
+        if self.dispatcher is not None:
+            self.routes_client = RoutesAPIClient(
+                sandbox_name="", hosted_sandboxes=self.dispatcher.sandbox_names, serve_baseline=serve_baseline
+            )
+        else:
+            self.routes_client = RoutesAPIClient(sandbox_name=self.sandbox_name)
+        metrics.track_routing(self.routes_client)
         
-        # Worker state
-        self.worker = None
+        # Worker state: one Worker per polled task queue
+        self.workers: Dict[str, Worker] = {}
+        self.routing_workers: Dict[str, Worker] = {}
         self.client = None
         self.tasks = []
         self.stop_event = asyncio.Event()
+        self.polling = False
+        self.draining = False
+        self._drain_task = None
+        self.in_flight = InFlightActivities()
+        self.health_server = None
     
     async def _cache_updater(self):
         """Background task to update routing cache."""
@@ -50,6 +130,37 @@ class SandboxAwareWorker:
         except asyncio.CancelledError:
             logger.info("Cache updater cancelled.")
     
+    async def _wait_for_routing(self):
+        """Hold polling until the first routing data arrives or the startup deadline passes."""
+        logger.info(f"Waiting up to {self.startup_deadline}s for routing data before polling...")
+        if await self.routes_client.wait_until_ready(self.startup_deadline):
+            logger.info("Routing data available.")
+        else:
+            logger.warning("Startup deadline passed without routing data, starting to poll anyway.")
+    
+    def _worker_identity(self) -> str:
+        task_queues = ','.join(self.task_queues)
+        if self.dispatcher is not None:
+            return f"sandboxes={','.join(self.dispatcher.sandbox_names)} task_queue={task_queues}"
+        return f"sandbox={self.sandbox_name or 'baseline'} task_queue={task_queues}"
+    
+    def _health_status(self) -> dict:
+        """Liveness/readiness state reported by the health server."""
+        routing = self.routes_client.status()
+        live = not self.stop_event.is_set() and routing['pollerState'] != "stopped"
+        return {
+            'live': live,
+            'ready': live and self.polling and routing['ready'],
+            'polling': self.polling,
+            'draining': self.draining,
+            'inFlightActivities': len(self.in_flight),
+            'taskQueue': self.task_queue,
+            'taskQueues': self._polled_task_queues(),
+            'sandbox': self.sandbox_name or ("multi-sandbox" if self.dispatcher is not None else "baseline"),
+            'routing': routing,
+            'tuning': self.tuning.status() if self.tuning is not None else None
+        }
+    
     async def _setup_signal_handlers(self):
         """Setup signal handlers for graceful shutdown."""
         loop = asyncio.get_running_loop()
@@ -58,11 +169,74 @@ class SandboxAwareWorker:
     
     def _shutdown(self):
         """Handle shutdown signal."""
+        if self.drain_timeout > 0 and self.polling and not self.draining:
+            logger.info(f"Received shutdown signal. Draining for up to {self.drain_timeout}s...")
+            self.draining = True
+            self._drain_task = asyncio.create_task(self._drain())
+            return
         logger.info("Received shutdown signal. Cancelling tasks...")
         for task in self.tasks:
             task.cancel()
         self.stop_event.set()
     
+    async def _drain(self):
+        """
+        Stop polling and wait for in-flight tasks: workflow tasks run to completion,
+        activities get `drain_timeout` before they are cancelled. Then shut down.
+        """
+        self.polling = False
+        workers = list(self.workers.values()) + list(self.routing_workers.values())
+        drained = asyncio.ensure_future(
+            asyncio.gather(*(worker.shutdown() for worker in workers), return_exceptions=True)
+        )
+        # Leave time for activities cancelled at the deadline to wind down
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.drain_timeout + 5
+        try:
+            while not drained.done() and loop.time() < deadline:
+                await asyncio.wait([drained], timeout=min(5.0, deadline - loop.time()))
+                if not drained.done() and len(self.in_flight):
+                    logger.info(f"Draining: {len(self.in_flight)} activities in flight: {'; '.join(self.in_flight.describe())}")
+            if not drained.done() or len(self.in_flight):
+                logger.warning(
+                    f"Drain incomplete, {len(self.in_flight)} activities still in flight: "
+                    f"{'; '.join(self.in_flight.describe())}"
+                )
+            else:
+                logger.info("Drain complete.")
+        finally:
+            drained.cancel()
+            await asyncio.gather(drained, return_exceptions=True)
+            self._shutdown()
+    
+    def _polled_task_queues(self) -> List[str]:
+        return list(self.workers) + sorted(self.routing_workers)
+    
+    def _new_worker(self, task_queue: str, routing_key: Optional[str] = None) -> Worker:
+        """
+        Create a worker with sandbox-aware interceptors for one task queue, or for
+        its `<task queue>@<routing key>` queue if `routing_key` is given.
+        """
+        polled_task_queue = routing_task_queue(task_queue, routing_key)
+        impl = self.task_queues[task_queue]
+        dispatcher = self.dispatchers.get(task_queue)
+        return Worker(
+            self.client,
+            task_queue=polled_task_queue,
+            workflows=impl.workflows,
+            activities=impl.activities,
+            interceptors=[
+                TracingInterceptor(always_create_workflow_spans=True),
+                SelectiveTaskInterceptor(
+                    self.routes_client, self.sandbox_name, polled_task_queue, dispatcher, self.in_flight
+                )
+            ],
+            activity_executor=self.activity_executors.thread_pool(),
+            graceful_shutdown_timeout=timedelta(seconds=self.drain_timeout),
+            # Per-key workers share the auto-tuned slot suppliers, so the limits hold per process
+            **self.worker_options
+        )
+    
     async def _create_worker(self):
         """Create and configure the Temporal worker."""
         # Connect to Temporal server
@@ -72,34 +246,70 @@ class SandboxAwareWorker:
         )
         logger.info(f"Connected to Temporal server: {self.temporal_url}")
         
-        # Create worker with sandbox-aware interceptors
-        self.worker = Worker(
-            self.client,
-            task_queue=self.task_queue,
-            workflows=self.workflows,
-            activities=self.activities,
-            interceptors=[
-                TracingInterceptor(always_create_workflow_spans=True),
-                SelectiveTaskInterceptor(self.routes_client, self.sandbox_name, self.task_queue)
-            ]
-        )
+        # Also with routing-key task queues: routed tasks still land on the shared queue
+        # when started by clients without them or before a client learns of the route
+        for task_queue in self.task_queues:
+            self.workers[task_queue] = self._new_worker(task_queue)
         
-        worker_identity = f"sandbox={self.sandbox_name or 'baseline'} task_queue={self.task_queue}"
-        logger.info(f"Worker created successfully: {worker_identity}")
+        logger.info(f"Worker created successfully: {self._worker_identity()}")
+    
+    async def _reconcile_routing_task_queues(self, runs: Dict[str, asyncio.Task]):
+        """Start/stop per-key workers (`runs`: their run tasks) to match the served routing keys."""
+        served = {
+            routing_task_queue(task_queue, routing_key): (task_queue, routing_key)
+            for routing_key in self.routes_client.served_routing_keys()
+            for task_queue in self.task_queues
+        }
+        for polled_task_queue in served.keys() - runs.keys():
+            self.routing_workers[polled_task_queue] = self._new_worker(*served[polled_task_queue])
+            runs[polled_task_queue] = asyncio.create_task(self.routing_workers[polled_task_queue].run())
+            logger.info(f"Polling routing task queue: {polled_task_queue}")
+        for polled_task_queue in runs.keys() - served.keys():
+            logger.info(f"Stopping routing task queue: {polled_task_queue}")
+            await self.routing_workers.pop(polled_task_queue).shutdown()
+            await asyncio.gather(runs.pop(polled_task_queue), return_exceptions=True)
+    
+    async def _run_routing_task_queues(self):
+        """
+        Poll `<task queue>@<routing key>` for every task queue and routing key served
+        here, starting and stopping per-key workers as the routing rules change.
+        """
+        runs: Dict[str, asyncio.Task] = {}
+        generation = -1
+        try:
+            while True:
+                # While draining, the running workers are being shut down: start and stop none
+                if not self.draining:
+                    await self._reconcile_routing_task_queues(runs)
+                generation = await self.routes_client.wait_for_routing_change(generation)
+        finally:
+            for run in runs.values():
+                run.cancel()
+            await asyncio.gather(*runs.values(), return_exceptions=True)
+            self.routing_workers.clear()
     
     async def _run_worker(self):
         """Run the worker and cache updater tasks."""
         try:
+            # Start cache updater task first so routing data loads while we connect
+            cache_task = asyncio.create_task(self._cache_updater())
+            self.tasks.append(cache_task)
+            if self.tuning is not None:
+                self.tasks.append(asyncio.create_task(self.tuning.run()))
+            
             # Create worker
             await self._create_worker()
             
-            # Start cache updater task
-            cache_task = asyncio.create_task(self._cache_updater())
-            self.tasks.append(cache_task)
+            if self.readiness_gate:
+                await self._wait_for_routing()
             
             # Start worker
             logger.info("Starting to poll for tasks...")
-            await self.worker.run()
+            self.polling = True
+            runs = [worker.run() for worker in self.workers.values()]
+            if self.routing_task_queues:
+                runs.append(self._run_routing_task_queues())
+            await asyncio.gather(*runs)
             
         except asyncio.CancelledError:
             logger.info("Worker cancelled.")
@@ -113,6 +323,11 @@ class SandboxAwareWorker:
             # Setup signal handlers
             await self._setup_signal_handlers()
             
+            # Start health/readiness endpoint
+            if self.health_port:
+                self.health_server = HealthServer(self._health_status, self.health_port)
+                await self.health_server.start()
+            
             # Start worker task
             worker_task = asyncio.create_task(self._run_worker())
             self.tasks.append(worker_task)
@@ -124,6 +339,12 @@ class SandboxAwareWorker:
             await asyncio.gather(*self.tasks, return_exceptions=True)
             
         finally:
+            self.polling = False
+            if self.health_server is not None:
+                await self.health_server.stop()
+            # Release pooled connections to the route server
+            await self.routes_client.close()
+            self.activity_executors.shutdown()
             logger.info("Shutdown complete.")
             # Check for exceptions
             for task in self.tasks:
@@ -0,0 +1,139 @@
+import fcntl
+import mmap
+import os
+import re
+import struct
+import time
+from typing import Dict, FrozenSet, Mapping, Optional, Tuple
+import logging
+logger = logging.getLogger("temporal_worker.shared_cache")
+
+# Header layout: magic, generation, payload length, publish time (wall clock)
+_HEADER = struct.Struct("<8sQQd")
+_GENERATION = struct.Struct("<Q")
+_GENERATION_OFFSET = 8
+_PUBLISHED_AT = struct.Struct("<d")
+_PUBLISHED_AT_OFFSET = 24
+_MAGIC = b"SDROUTE1"
+_MAX_READ_ATTEMPTS = 1000
+
+
+class SharedRoutingCache:
+    """
+    Node-local routing-key snapshot shared between worker processes.
+
+    One process (the leader, elected with an exclusive file lock) refreshes the
+    routing rules and publishes them into a memory-mapped file. Every other
+    process reads that file lock-free: the generation counter is a seqlock that
+    is odd while a write is in progress, so readers retry instead of blocking.
+
+    This removes the duplicate polling, not the per-process copies of the keys:
+    each reader decodes a new snapshot into its own frozenset, because routing
+    lookups run on every task and a set lookup is cheaper than a seqlock read of
+    the file per lookup.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.is_leader = False
+        self._lock_fd: Optional[int] = None
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < _HEADER.size + max_bytes:
+                os.ftruncate(fd, _HEADER.size + max_bytes)
+            self._mmap = mmap.mmap(fd, _HEADER.size + max_bytes)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def path_for(directory: str, baseline_kind: str, baseline_namespace: str,
+                 baseline_name: str, sandbox_name: str) -> str:
+        """Return the shared cache file path for one baseline workload and sandbox."""
+        ident = "-".join([baseline_kind, baseline_namespace, baseline_name, sandbox_name or "baseline"])
+        return os.path.join(directory, f"routes-{re.sub(r'[^A-Za-z0-9_.-]', '_', ident)}.mmap")
+
+    def try_acquire_leadership(self) -> bool:
+        """Become the refreshing process if no other process holds the lock."""
+        if self.is_leader:
+            return True
+        fd = os.open(self.path + ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        self.is_leader = True
+        return True
+
+    @property
+    def generation(self) -> int:
+        return _GENERATION.unpack_from(self._mmap, _GENERATION_OFFSET)[0]
+
+    def publish(self, routing_keys: FrozenSet[str], destinations: Optional[Mapping[str, str]] = None) -> None:
+        """
+        Write a new routing-key snapshot (leader only). With `destinations`, each
+        key is stored alongside its destination sandbox as `key<TAB>sandbox`.
+        """
+        if destinations is not None:
+            payload = "\n".join(f"{key}\t{destinations.get(key, '')}" for key in routing_keys).encode()
+        else:
+            payload = "\n".join(routing_keys).encode()
+        if len(payload) > self.max_bytes:
+            logger.error(f"SharedRoutingCache: Snapshot of {len(payload)} bytes exceeds {self.max_bytes} bytes, not published")
+            return
+        # An odd generation left behind by a leader that died mid-write is skipped
+        writing = self.generation + 1
+        if writing % 2 == 0:
+            writing += 1
+        _GENERATION.pack_into(self._mmap, _GENERATION_OFFSET, writing)
+        self._mmap[_HEADER.size:_HEADER.size + len(payload)] = payload
+        _HEADER.pack_into(self._mmap, 0, _MAGIC, writing, len(payload), time.time())
+        _GENERATION.pack_into(self._mmap, _GENERATION_OFFSET, writing + 1)
+
+    @property
+    def published_at(self) -> float:
+        """Wall-clock time the leader last confirmed the snapshot was current."""
+        return _PUBLISHED_AT.unpack_from(self._mmap, _PUBLISHED_AT_OFFSET)[0]
+
+    def touch(self) -> None:
+        """
+        Record that the published snapshot was confirmed current (leader only).
+        Only the timestamp changes, so readers do not re-read the key set.
+        """
+        _PUBLISHED_AT.pack_into(self._mmap, _PUBLISHED_AT_OFFSET, time.time())
+
+    def read(self, last_generation: int = 0) -> Optional[Tuple[int, FrozenSet[str], Dict[str, str], float]]:
+        """
+        Return (generation, routing keys, destinations, published_at) if the snapshot
+        changed since `last_generation`, or None if it did not (or nothing is published
+        yet). `destinations` is empty unless the leader published them.
+        """
+        for _ in range(_MAX_READ_ATTEMPTS):
+            generation = self.generation
+            if generation == last_generation or generation == 0:
+                return None
+            if generation % 2:
+                # Writer in progress
+                time.sleep(0)
+                continue
+            magic, _, length, published_at = _HEADER.unpack_from(self._mmap, 0)
+            payload = self._mmap[_HEADER.size:_HEADER.size + length]
+            if self.generation != generation:
+                continue
+            if magic != _MAGIC:
+                return None
+            lines = payload.decode().split("\n") if length else []
+            destinations = dict(line.split("\t", 1) for line in lines if "\t" in line)
+            routing_keys = frozenset(line.split("\t", 1)[0] for line in lines)
+            return generation, routing_keys, destinations, published_at
+        # The writer is stuck (or died mid-write); keep the previous snapshot
+        return None
+
+    def close(self) -> None:
+        self._mmap.close()
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+            self.is_leader = False
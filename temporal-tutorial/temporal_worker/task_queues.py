@@ -0,0 +1,19 @@
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional, Type
+
+# `<task queue>@<routing key>`, e.g. `money-transfer@abc123`
+ROUTING_TASK_QUEUE_SEPARATOR = "@"
+
+
+def routing_task_queue(task_queue: str, routing_key: Optional[str]) -> str:
+    """Return the per-routing-key task queue derived from `task_queue`."""
+    if not routing_key:
+        return task_queue
+    return f"{task_queue}{ROUTING_TASK_QUEUE_SEPARATOR}{routing_key}"
+
+
+@dataclass
+class TaskQueueImplementation:
+    """The workflows and activities a SandboxAwareWorker runs on one additional task queue."""
+    workflows: List[Type] = field(default_factory=list)
+    activities: List[Callable] = field(default_factory=list)
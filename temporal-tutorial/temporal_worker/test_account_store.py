@@ -0,0 +1,160 @@
+import asyncio
+import sqlite3
+import threading
+from decimal import Decimal
+
+import pytest
+
+from account_store import DEFAULT_BALANCE, DEFAULT_RESULT_TTL_SECONDS, MemoryAccountStore, SqliteAccountStore
+
+
+def test_cancelled_query_keeps_its_connection_until_done(tmp_path):
+    async def main():
+        store = SqliteAccountStore(str(tmp_path / "accounts.db"), pool_size=1)
+        await store.get_account("acc_001")
+        release = threading.Event()
+        running = threading.Event()
+
+        def slow_query(conn):
+            running.set()
+            release.wait(5)
+            return conn
+
+        slow = asyncio.create_task(store._run(slow_query))
+        await asyncio.get_running_loop().run_in_executor(None, running.wait, 5)
+        slow.cancel()
+        await asyncio.sleep(0.05)
+        # The only connection is still in use by the cancelled query, not back in the pool
+        assert store._connections.qsize() == 0
+        release.set()
+        assert await store._run(lambda conn: conn) is not None
+        assert store._connections.qsize() == 1
+        await store.close()
+
+    asyncio.run(main())
+
+
+def test_cancelled_compare_and_set_records_result_only_with_balance(tmp_path):
+    async def main():
+        path = str(tmp_path / "accounts.db")
+        store = SqliteAccountStore(path, pool_size=2, busy_timeout=2)
+        balance, version = await store.get_account("acc_001")
+        # Another writer holds the database, so the update is still running when cancelled
+        blocker = sqlite3.connect(path, isolation_level=None)
+        blocker.execute("BEGIN IMMEDIATE")
+        cancelled = asyncio.create_task(store.compare_and_set("acc_001", version, balance - 1, ("cancelled", "1")))
+        await asyncio.sleep(0.1)
+        cancelled.cancel()
+        racing = [
+            asyncio.create_task(store.compare_and_set("acc_001", version, balance - 2, (f"racing-{i}", "2")))
+            for i in range(2)
+        ]
+        await asyncio.sleep(0.1)
+        blocker.execute("ROLLBACK")
+        blocker.close()
+        await asyncio.gather(cancelled, *racing, return_exceptions=True)
+        # Every connection is back once the cancelled update finished
+        for _ in range(20):
+            if store._connections.qsize() == 2:
+                break
+            await asyncio.sleep(0.05)
+        assert store._connections.qsize() == 2
+
+        new_balance, new_version = await store.get_account("acc_001")
+        assert new_version == version + 1
+        recorded = await store.get_results(["cancelled", "racing-0", "racing-1"])
+        # Exactly one update won, and only its result was recorded
+        assert len(recorded) == 1
+        assert new_balance == balance - int(next(iter(recorded.values())))
+        await store.close()
+
+    asyncio.run(main())
+
+
+def test_failed_open_is_retried(tmp_path):
+    async def main():
+        path = tmp_path / "missing" / "accounts.db"
+        store = SqliteAccountStore(str(path))
+        try:
+            await store.get_account("acc_001")
+        except Exception:
+            pass
+        else:
+            raise AssertionError("opening a database in a missing directory should fail")
+        path.parent.mkdir()
+        assert await store.get_account("acc_001") == (Decimal("1000.00"), 1)
+        await store.close()
+
+    asyncio.run(main())
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store_factory(request, tmp_path):
+    def make(result_ttl=DEFAULT_RESULT_TTL_SECONDS):
+        if request.param == "memory":
+            return MemoryAccountStore(result_ttl=result_ttl)
+        return SqliteAccountStore(str(tmp_path / "accounts.db"), pool_size=2, result_ttl=result_ttl)
+    return make
+
+
+def test_compare_and_set_rejects_a_stale_version(store_factory):
+    async def main():
+        store = store_factory()
+        balance, version = await store.get_account("acc_001")
+        assert await store.compare_and_set("acc_001", version, balance - 10, ("first", "1"))
+        # Still at the version read before the first update
+        assert not await store.compare_and_set("acc_001", version, balance - 20, ("second", "2"))
+        assert await store.get_account("acc_001") == (balance - 10, version + 1)
+        assert await store.get_result("first") == "1"
+        assert await store.get_result("second") is None
+        await store.close()
+
+    asyncio.run(main())
+
+
+def test_unknown_account_is_created_at_version_zero_once(store_factory):
+    async def main():
+        store = store_factory()
+        assert await store.get_account("new") == (DEFAULT_BALANCE, 0)
+        assert await store.compare_and_set("new", 0, Decimal("5"))
+        assert not await store.compare_and_set("new", 0, Decimal("6"))
+        assert await store.get_account("new") == (Decimal("5"), 1)
+        await store.close()
+
+    asyncio.run(main())
+
+
+def test_compare_and_set_many_is_all_or_nothing(store_factory):
+    async def main():
+        store = store_factory()
+        accounts = await store.get_accounts(["acc_001", "acc_002"])
+        (balance_1, version_1), (balance_2, version_2) = accounts["acc_001"], accounts["acc_002"]
+        assert await store.compare_and_set("acc_002", version_2, balance_2 + 1)
+        updates = [("acc_001", version_1, balance_1 - 1), ("acc_002", version_2, balance_2 + 2)]
+        assert not await store.compare_and_set_many(updates, [("batch", "x")])
+        assert await store.get_account("acc_001") == (balance_1, version_1)
+        assert await store.get_account("acc_002") == (balance_2 + 1, version_2 + 1)
+        assert await store.get_results(["batch"]) == {}
+
+        updates = [("acc_001", version_1, balance_1 - 1), ("acc_002", version_2 + 1, balance_2 + 3)]
+        assert await store.compare_and_set_many(updates, [("a", "1"), ("b", "2")])
+        assert await store.get_balance("acc_001") == balance_1 - 1
+        assert await store.get_balance("acc_002") == balance_2 + 3
+        assert await store.get_results(["a", "b", "c"]) == {"a": "1", "b": "2"}
+        await store.close()
+
+    asyncio.run(main())
+
+
+def test_recorded_results_expire(store_factory):
+    async def main():
+        store = store_factory(result_ttl=0.05)
+        balance, version = await store.get_account("acc_001")
+        assert await store.compare_and_set("acc_001", version, balance, ("key", "done"))
+        assert await store.get_result("key") == "done"
+        await asyncio.sleep(0.1)
+        assert await store.get_result("key") is None
+        assert await store.get_results(["key"]) == {}
+        await store.close()
+
+    asyncio.run(main())
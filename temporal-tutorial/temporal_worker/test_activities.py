@@ -0,0 +1,77 @@
+import asyncio
+from decimal import Decimal
+
+import pytest
+from temporalio.exceptions import ApplicationError
+from temporalio.testing import ActivityEnvironment
+
+from account_store import MemoryAccountStore
+from activities import BankingActivities
+from models import TransferRequest, WithdrawRequest
+
+
+class _InterleavingStore(MemoryAccountStore):
+    """A memory store that yields between reads and writes, as a real database does."""
+
+    async def get_accounts(self, account_ids):
+        accounts = await super().get_accounts(account_ids)
+        await asyncio.sleep(0)
+        return accounts
+
+
+async def _transfer_all(activities: BankingActivities, count: int) -> None:
+    env = ActivityEnvironment()
+    await asyncio.gather(*(
+        env.run(activities.transfer, TransferRequest("acc_001", "acc_002", "1.00", f"ref-{i}"))
+        for i in range(count)
+    ))
+
+
+@pytest.mark.parametrize("lock_shards, conflicts", [("0", True), ("4", False)])
+def test_transfer_honours_lock_shards(monkeypatch, lock_shards, conflicts):
+    monkeypatch.setenv("ACCOUNT_LOCK_SHARDS", lock_shards)
+    store = _InterleavingStore()
+    activities = BankingActivities(store)
+    asyncio.run(_transfer_all(activities, 20))
+    assert (activities.conflicts > 0) == conflicts
+    assert asyncio.run(store.get_balance("acc_001")) == Decimal("980.00")
+    assert asyncio.run(store.get_balance("acc_002")) == Decimal("520.00")
+
+
+def test_retried_withdraw_returns_the_recorded_response():
+    store = MemoryAccountStore()
+    activities = BankingActivities(store)
+    env = ActivityEnvironment()
+    request = WithdrawRequest("acc_001", "10.00", "ref")
+    first = asyncio.run(env.run(activities.withdraw, request))
+    # Same workflow, run and activity ID: a retry of the same activity
+    retry = asyncio.run(env.run(activities.withdraw, request))
+    assert retry == first
+    assert activities.deduplicated == 1
+    assert asyncio.run(store.get_balance("acc_001")) == Decimal("990.00")
+
+
+def test_insufficient_funds_is_not_retryable():
+    activities = BankingActivities(MemoryAccountStore())
+    with pytest.raises(ApplicationError) as error:
+        asyncio.run(ActivityEnvironment().run(activities.withdraw, WithdrawRequest("acc_002", "600.00", "ref")))
+    assert error.value.non_retryable
+
+
+def test_batch_items_fail_alone_and_retries_skip_applied_chunks(monkeypatch):
+    monkeypatch.setenv("ACCOUNT_BATCH_CHUNK_SIZE", "2")
+    store = MemoryAccountStore()
+    activities = BankingActivities(store)
+    env = ActivityEnvironment()
+    requests = [
+        WithdrawRequest("acc_002", "300.00", "a"),
+        WithdrawRequest("acc_002", "300.00", "b"),
+        WithdrawRequest("acc_001", "1.00", "c"),
+    ]
+    responses = asyncio.run(env.run(activities.withdraw_batch, requests))
+    assert [response.success for response in responses] == [True, False, True]
+    assert responses[1].message.startswith("Insufficient funds")
+    assert asyncio.run(env.run(activities.withdraw_batch, requests)) == responses
+    assert activities.deduplicated == len(requests)
+    assert asyncio.run(store.get_balance("acc_002")) == Decimal("200.00")
+    assert asyncio.run(store.get_balance("acc_001")) == Decimal("999.00")
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+from opentelemetry import baggage
+from opentelemetry.baggage.propagation import W3CBaggagePropagator
+from temporalio.api.common.v1 import Payload
+from temporalio.converter import PayloadConverter
+
+from baggage_parser import TRACER_HEADER, RoutingKeyCache, routing_key_from_baggage, routing_key_from_headers
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+def _headers(carrier: dict) -> dict:
+    """Temporal headers as the OpenTelemetry TracingInterceptor writes them."""
+    return {TRACER_HEADER: PayloadConverter.default.to_payloads([carrier])[0]}
+
+
+def _raw_headers(data: bytes) -> dict:
+    return {TRACER_HEADER: Payload(metadata={"encoding": b"json/plain"}, data=data)}
+
+
+def _w3c_routing_key(baggage_header: str) -> str:
+    context = W3CBaggagePropagator().extract({"baggage": baggage_header})
+    return str(baggage.get_baggage("sd-routing-key", context) or "")
+
+
+@pytest.mark.parametrize("baggage_header", [
+    "sd-routing-key=abc123",
+    "sd-routing-key=abc123,tenant=acme,user=42",
+    "tenant=acme, sd-routing-key=abc123 ,user=42",
+    # Keys that merely start or end with the routing key's name
+    "sd-routing-key-x=nope,sd-routing-key=abc123",
+    "sd-routing-key-x=nope",
+    "x-sd-routing-key=nope,sd-routing-keys=nope",
+    # Percent and `+` decoding
+    "sd-routing-key=a%2Fb+c",
+    "note=sd-routing-key%3Dnope,sd-routing-key=k%201",
+    "",
+])
+def test_matches_w3c_propagator(baggage_header):
+    expected = _w3c_routing_key(baggage_header)
+    assert routing_key_from_baggage(baggage_header) == expected
+    assert routing_key_from_headers(_headers({"traceparent": TRACEPARENT, "baggage": baggage_header})) == expected
+
+
+def test_prefix_key_is_not_matched():
+    assert routing_key_from_baggage("sd-routing-key-x=other,sd-routing-key=mine") == "mine"
+    assert routing_key_from_baggage("sd-routing-key-x=other") == ""
+
+
+def test_properties_are_dropped():
+    # The W3C propagator rejects entries with properties; the parser keeps the value
+    assert routing_key_from_baggage("sd-routing-key=abc;prop1=1;prop2") == "abc"
+    assert routing_key_from_baggage("sd-routing-key=abc ; ttl=60,tenant=acme") == "abc"
+
+
+def test_percent_and_plus_decoding():
+    assert routing_key_from_baggage("sd-routing-key=a%2Fb%3Dc") == "a/b=c"
+    assert routing_key_from_baggage("sd-routing-key=a+b") == "a b"
+
+
+def test_escaped_json_carrier_falls_back_to_json_decoding():
+    data = json.dumps({"traceparent": TRACEPARENT, "baggage": 'tenant="acme",sd-routing-key=k1'}).encode()
+    assert b'\\"' in data
+    assert routing_key_from_headers(_raw_headers(data)) == "k1"
+    assert routing_key_from_headers(_raw_headers(b'{"baggage": "sd-routing-key=caf\\u00e9"}')) == "café"
+
+
+@pytest.mark.parametrize("headers", [
+    None,
+    {},
+    {"other-header": Payload(data=b"x")},
+    _raw_headers(b""),
+    _raw_headers(b"not json"),
+    _raw_headers(b'{"traceparent": "x"}'),
+    _raw_headers(b'{"baggage": ""}'),
+    # Escaped and truncated: the JSON fallback fails
+    _raw_headers(b'{"baggage": "sd-routing-key=k1\\'),
+    _headers({"traceparent": TRACEPARENT}),
+])
+def test_missing_or_malformed_headers(headers):
+    assert routing_key_from_headers(headers) == ""
+
+
+def test_routing_key_cache_evicts_least_recently_used_run():
+    cache = RoutingKeyCache(max_size=2)
+    assert cache.get("run-1", _headers({"baggage": "sd-routing-key=one"})) == "one"
+    assert cache.get("run-2", _headers({"baggage": "sd-routing-key=two"})) == "two"
+    # Cached: the headers are not parsed again
+    assert cache.get("run-1", None) == "one"
+    # run-2 is now the least recently used, so it makes room for run-3
+    assert cache.get("run-3", _headers({"baggage": "sd-routing-key=three"})) == "three"
+    assert cache.get("run-1", None) == "one"
+    assert cache.get("run-2", None) == ""
+
+
+def test_routing_key_cache_without_run_id_parses_every_time():
+    cache = RoutingKeyCache(max_size=2)
+    assert cache.get("", _headers({"baggage": "sd-routing-key=one"})) == "one"
+    assert cache.get("", _headers({"baggage": "sd-routing-key=two"})) == "two"
@@ -0,0 +1,78 @@
+import dataclasses
+from datetime import timedelta
+
+import pytest
+from temporalio import activity, workflow
+from temporalio.testing import ActivityEnvironment
+from temporalio.worker._interceptor import ExecuteActivityInput, ExecuteWorkflowInput
+
+from multi_tenant import SandboxDispatcher, SandboxImplementation
+
+
+@activity.defn(name="charge")
+async def baseline_charge() -> str:
+    return "baseline"
+
+
+@activity.defn(name="charge")
+async def sandbox_charge() -> str:
+    return "pr-1"
+
+
+@activity.defn(name="refund")
+async def sandbox_refund() -> str:
+    return "pr-1 refund"
+
+
+@workflow.defn(name="Refund")
+class RefundWorkflow:
+    @workflow.run
+    async def run(self) -> str:
+        return await workflow.execute_activity(sandbox_refund, start_to_close_timeout=timedelta(seconds=5))
+
+
+def _dispatcher() -> SandboxDispatcher:
+    return SandboxDispatcher(
+        workflows=[],
+        activities=[baseline_charge],
+        sandboxes={
+            "pr-1": SandboxImplementation(workflows=[RefundWorkflow], activities=[sandbox_charge, sandbox_refund]),
+            "pr-2": SandboxImplementation(),
+        },
+    )
+
+
+def _bind_activity(dispatcher: SandboxDispatcher, sandbox_name: str, fn) -> ExecuteActivityInput:
+    input = ExecuteActivityInput(fn=fn, args=[], executor=None, headers={})
+    env = ActivityEnvironment()
+    env.info = dataclasses.replace(env.info, activity_type=activity._Definition.must_from_callable(fn).name)
+    env.run(dispatcher.bind_activity, sandbox_name, input)
+    return input
+
+
+def test_sandbox_only_names_are_registered():
+    dispatcher = _dispatcher()
+    assert sandbox_refund in dispatcher.activities
+    assert RefundWorkflow in dispatcher.workflows
+
+
+def test_activity_is_swapped_for_its_sandbox_version():
+    assert _bind_activity(_dispatcher(), "pr-1", baseline_charge).fn is sandbox_charge
+    assert _bind_activity(_dispatcher(), "pr-2", baseline_charge).fn is baseline_charge
+    assert _bind_activity(_dispatcher(), "", baseline_charge).fn is baseline_charge
+
+
+@pytest.mark.parametrize("sandbox_name", ["", "pr-2"])
+def test_sandbox_only_activity_is_rejected_elsewhere(sandbox_name):
+    with pytest.raises(Exception, match="exists only in sandboxes"):
+        _bind_activity(_dispatcher(), sandbox_name, sandbox_refund)
+    assert _bind_activity(_dispatcher(), "pr-1", sandbox_refund).fn is sandbox_refund
+
+
+@pytest.mark.parametrize("sandbox_name", ["", "pr-2"])
+def test_sandbox_only_workflow_is_rejected_elsewhere(sandbox_name):
+    input = ExecuteWorkflowInput(type=RefundWorkflow, run_fn=RefundWorkflow.run, args=[], headers={})
+    with pytest.raises(Exception, match="exists only in sandboxes"):
+        _dispatcher().bind_workflow(sandbox_name, input)
+    _dispatcher().bind_workflow("pr-1", input)
+    assert input.run_fn is RefundWorkflow.run
@@ -0,0 +1,167 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp import web
+
+from benchmarks.common import configure_routes_env
+from benchmarks.route_server import RouteServer
+
+
+class _NoWatchRouteServer(RouteServer):
+    """A route server that ignores `watch=true` and answers with one document."""
+
+    def __init__(self, *args, content_type: str = "application/json", **kwargs):
+        super().__init__(*args, **kwargs)
+        self.content_type = content_type
+
+    async def _handle_watch(self, request, since_revision):
+        return web.Response(body=json.dumps(self._routing_rules_body()), content_type=self.content_type)
+
+
+def _client(monkeypatch, server: RouteServer, refresh_interval: int = 120, **env):
+    from routing import RoutesAPIClient
+
+    configure_routes_env(server.address, refresh_interval)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return RoutesAPIClient(sandbox_name="sbx")
+
+
+@pytest.mark.parametrize("content_type", ["application/json", "text/plain"])
+def test_watch_against_server_without_watch_backs_off_to_polling(monkeypatch, content_type):
+    async def main():
+        server = _NoWatchRouteServer(["key-a"], content_type=content_type)
+        await server.start()
+        client = _client(monkeypatch, server, refresh_interval=1, ROUTES_API_WATCH_RETRY_SECONDS="0.05")
+        updater = asyncio.create_task(client._watch_cache_updater())
+        await asyncio.sleep(1.6)
+        updater.cancel()
+        await asyncio.gather(updater, return_exceptions=True)
+        assert client.should_process_sync("key-a")
+        # Delays 0.05, 0.1, 0.2, 0.4, 0.8, 1: one request each, no forced fetch after a full answer
+        assert server.request_count <= 7
+        await client.close()
+        await server.stop()
+
+    asyncio.run(main())
+
+
+def test_watch_reconnects_promptly_after_a_streamed_connection_drops(monkeypatch):
+    async def main():
+        server = RouteServer(["key-a"], heartbeat_interval=0.05)
+        await server.start()
+        client = _client(monkeypatch, server, refresh_interval=60, ROUTES_API_WATCH_RETRY_SECONDS="0.05")
+        updater = asyncio.create_task(client._watch_cache_updater())
+        for _ in range(3):
+            while server.watcher_count == 0:
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.1)
+            server.drop_watchers()
+            await asyncio.sleep(0.01)
+        # The stream was real, so the delay was reset each time instead of growing to 60s
+        await asyncio.wait_for(_until(lambda: server.watcher_count == 1), timeout=1)
+        server.set_routing_keys(["key-a", "key-b"])
+        await asyncio.wait_for(_until(lambda: client.should_process_sync("key-b")), timeout=1)
+        updater.cancel()
+        await asyncio.gather(updater, return_exceptions=True)
+        await client.close()
+        await server.stop()
+
+    asyncio.run(main())
+
+
+async def _until(condition) -> None:
+    while not condition():
+        await asyncio.sleep(0.01)
+
+
+def test_delta_documents_update_the_cached_keys(monkeypatch):
+    server = RouteServer()
+    client = _client(monkeypatch, server)
+    client._apply_routing_document({"revision": 1, "routingRules": [{"routingKey": "a"}, {"routingKey": "b"}]})
+    assert client._routing_keys_cache == {"a", "b"} and client._revision == "1"
+    generation = client.generation
+    client._apply_routing_document({
+        "revision": 2,
+        "addedRoutingRules": [{"routingKey": "c"}],
+        "removedRoutingRules": [{"routingKey": "a"}, {"routingKey": "missing"}],
+    })
+    assert client._routing_keys_cache == {"b", "c"} and client._revision == "2"
+    assert client.generation == generation + 1
+    # A delta that changes nothing keeps the snapshot
+    client._apply_routing_document({"revision": 3, "addedRoutingRules": [{"routingKey": "b"}]})
+    assert client.generation == generation + 1 and client._revision == "3"
+    with pytest.raises(ValueError):
+        client._apply_routing_document({"revision": 4})
+    with pytest.raises(ValueError):
+        client._apply_routing_document(["a"])
+
+
+def test_conditional_refresh_uses_etag_and_revision(monkeypatch):
+    async def main():
+        server = RouteServer(["a", "b"])
+        await server.start()
+        client = _client(monkeypatch, server)
+        await client._perform_fetch_and_update()
+        assert client._routing_keys_cache == {"a", "b"}
+        await client._perform_fetch_and_update()
+        assert server.not_modified_count == 1
+        server.set_routing_keys(["b", "c"])
+        await client._perform_fetch_and_update()
+        assert client._routing_keys_cache == {"b", "c"}
+        assert client._revision == str(server.revision)
+        await client.close()
+        await server.stop()
+
+    asyncio.run(main())
+
+
+def test_hedged_request_answers_from_the_faster_server(monkeypatch):
+    async def main():
+        slow = RouteServer(["slow"], slow_probability=1.0, slow_delay=2.0)
+        fast = RouteServer(["fast"])
+        await slow.start()
+        await fast.start()
+        monkeypatch.setenv("ROUTES_API_HEDGE_DELAY_SECONDS", "0.05")
+        configure_routes_env(f"{slow.address},{fast.address}")
+        from routing import RoutesAPIClient
+        client = RoutesAPIClient(sandbox_name="sbx")
+        started = asyncio.get_running_loop().time()
+        await client._perform_fetch_and_update()
+        assert asyncio.get_running_loop().time() - started < 1.0
+        assert client._routing_keys_cache == {"fast"}
+        assert slow.request_count == 1 and fast.request_count == 1
+        await client.close()
+        await slow.stop()
+        await fast.stop()
+
+    asyncio.run(main())
+
+
+def test_failed_server_falls_over_to_the_next_one(monkeypatch):
+    async def main():
+        down = RouteServer()
+        await down.start()
+        down_address = down.address
+        await down.stop()
+        up = RouteServer(["up"])
+        await up.start()
+        configure_routes_env(f"{down_address},{up.address}")
+        from routing import RoutesAPIClient
+        client = RoutesAPIClient(sandbox_name="sbx")
+        await client._perform_fetch_and_update()
+        assert client._routing_keys_cache == {"up"}
+        await client.close()
+        await up.stop()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("addresses", ["", " , ,"])
+def test_route_server_list_must_not_be_empty(monkeypatch, addresses):
+    from routing import RoutesAPIClient
+
+    configure_routes_env(addresses)
+    with pytest.raises(ValueError, match="ROUTES_API_ROUTE_SERVER_ADDR"):
+        RoutesAPIClient(sandbox_name="sbx")
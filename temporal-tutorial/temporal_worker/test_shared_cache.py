@@ -0,0 +1,95 @@
+import threading
+
+from shared_cache import SharedRoutingCache, _GENERATION, _GENERATION_OFFSET
+
+
+def _cache(tmp_path, max_bytes: int = 4096) -> SharedRoutingCache:
+    return SharedRoutingCache(str(tmp_path / "routes.mmap"), max_bytes=max_bytes)
+
+
+def test_published_snapshot_is_read_by_another_mapping(tmp_path):
+    leader, follower = _cache(tmp_path), _cache(tmp_path)
+    assert follower.read() is None
+    leader.publish(frozenset({"a", "b"}), {"a": "sbx-1", "b": "sbx-2"})
+    generation, keys, destinations, published_at = follower.read()
+    assert keys == {"a", "b"}
+    assert destinations == {"a": "sbx-1", "b": "sbx-2"}
+    assert generation % 2 == 0 and published_at > 0
+    # Unchanged since that generation
+    assert follower.read(generation) is None
+    leader.touch()
+    assert follower.read(generation) is None
+    assert follower.published_at >= published_at
+    leader.close()
+    follower.close()
+
+
+def test_empty_key_set_round_trips(tmp_path):
+    cache = _cache(tmp_path)
+    cache.publish(frozenset())
+    _, keys, destinations, _ = cache.read()
+    assert keys == frozenset() and destinations == {}
+    cache.close()
+
+
+def test_write_in_progress_is_not_read(tmp_path):
+    leader, follower = _cache(tmp_path), _cache(tmp_path)
+    leader.publish(frozenset({"a"}))
+    generation = leader.generation
+    # A leader that died mid-write leaves an odd generation behind
+    _GENERATION.pack_into(leader._mmap, _GENERATION_OFFSET, generation + 1)
+    assert follower.read(generation) is None
+    leader.publish(frozenset({"b"}))
+    new_generation, keys, _, _ = follower.read(generation)
+    assert keys == {"b"} and new_generation % 2 == 0 and new_generation > generation
+    leader.close()
+    follower.close()
+
+
+def test_reader_never_sees_a_torn_snapshot(tmp_path):
+    leader, follower = _cache(tmp_path, max_bytes=1 << 16), _cache(tmp_path, max_bytes=1 << 16)
+    snapshots = [frozenset(f"{i}-{n}" for n in range(200 + i)) for i in range(8)]
+    leader.publish(snapshots[0])
+    stop = threading.Event()
+
+    def keep_publishing():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            leader.publish(snapshots[i % len(snapshots)])
+
+    writer = threading.Thread(target=keep_publishing)
+    writer.start()
+    try:
+        seen = 0
+        for _ in range(2000):
+            snapshot = follower.read()
+            if snapshot is not None:
+                seen += 1
+                assert snapshot[1] in snapshots
+    finally:
+        stop.set()
+        writer.join()
+    assert seen
+    leader.close()
+    follower.close()
+
+
+def test_oversized_snapshot_is_not_published(tmp_path):
+    cache = _cache(tmp_path, max_bytes=16)
+    cache.publish(frozenset({"a"}))
+    generation = cache.generation
+    cache.publish(frozenset({"a" * 32}))
+    assert cache.generation == generation
+    assert cache.read()[1] == {"a"}
+    cache.close()
+
+
+def test_one_leader_at_a_time(tmp_path):
+    first, second = _cache(tmp_path), _cache(tmp_path)
+    assert first.try_acquire_leadership()
+    assert first.try_acquire_leadership()
+    assert not second.try_acquire_leadership()
+    first.close()
+    assert second.try_acquire_leadership()
+    second.close()
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import tempfile
+import time
+from multiprocessing.process import BaseProcess
+from typing import Callable, Iterable, Optional
+
+import metrics
+from health import HealthServer
+from routing import RoutesAPIClient
+from sandbox_aware_worker import SandboxAwareWorker
+
+logger = logging.getLogger("temporal_worker.worker_pool")
+
+# A worker that ran at least this long before exiting is restarted without backoff
+_STABLE_RUN_SECONDS = 60.0
+
+
+def _run_worker_process(worker_factory: Callable[[], SandboxAwareWorker]) -> None:
+    """Entry point of a pool worker process."""
+    # The pool parent serves health/metrics and refreshes the routing rules
+    os.environ["HEALTH_PORT"] = "0"
+    os.environ["ROUTES_API_SHARED_CACHE_FOLLOW_ONLY"] = "true"
+
+    async def run() -> None:
+        # Built inside the event loop, like main.py does for a single worker
+        await worker_factory().start()
+
+    asyncio.run(run())
+
+
+class _WorkerSlot:
+    def __init__(self, index: int):
+        self.index = index
+        self.process: Optional[BaseProcess] = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = 0.0
+        self.restart_at = 0.0
+
+
+class WorkerPool:
+    """
+    Runs `processes` copies of a SandboxAwareWorker, each in its own process, so a
+    pod can use more than one core.
+
+    The parent process owns the signal handlers, the health/metrics endpoint and
+    the only routing refresher: it publishes the routing rules to the node-local
+    shared cache, which the worker processes follow. Worker processes that exit
+    are restarted, with exponential backoff if they keep crashing.
+
+    `worker_factory` builds the worker in each process; it must be a module-level
+    function so it can be passed to spawned processes. For multi-sandbox workers,
+    pass the same `hosted_sandboxes` (sandbox names) and `serve_baseline` as the
+    workers use, so the pool refreshes the routing rules they follow.
+    """
+
+    def __init__(self, worker_factory: Callable[[], SandboxAwareWorker], processes: int,
+                 hosted_sandboxes: Optional[Iterable[str]] = None, serve_baseline: bool = False):
+        self.worker_factory = worker_factory
+        self.processes = processes
+        self.hosted_sandboxes = hosted_sandboxes
+        self.serve_baseline = serve_baseline
+        self.restart_backoff = float(os.environ.get("WORKER_POOL_RESTART_BACKOFF_SECONDS", "1"))
+        self.restart_backoff_max = float(os.environ.get("WORKER_POOL_RESTART_BACKOFF_MAX_SECONDS", "30"))
+        self.shutdown_timeout = float(os.environ.get("WORKER_POOL_SHUTDOWN_TIMEOUT_SECONDS", "30"))
+        self.health_port = int(os.environ.get("HEALTH_PORT", "0"))
+        # Spawned (not forked) children: no inherited event loop, threads or sockets
+        self._context = multiprocessing.get_context("spawn")
+        self._slots = [_WorkerSlot(index) for index in range(processes)]
+        self._runtime_dir: Optional[str] = None
+        self.routes_client = None
+        self.stop_event: Optional[asyncio.Event] = None
+        self.health_server = None
+
+    def _prepare_runtime_dir(self) -> None:
+        """
+        Set up the shared routing cache and the worker processes' metrics directory.
+        Must run before any worker process is started: both are passed through the
+        environment.
+        """
+        base_dir = os.environ.get("ROUTES_API_SHARED_CACHE_DIR") or tempfile.gettempdir()
+        os.environ["ROUTES_API_SHARED_CACHE_DIR"] = base_dir
+        self._runtime_dir = tempfile.mkdtemp(prefix="worker-pool-", dir=base_dir)
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = self._runtime_dir
+        metrics.collect_worker_processes(self._runtime_dir)
+
+    def _start_process(self, slot: _WorkerSlot) -> None:
+        slot.process = self._context.Process(
+            target=_run_worker_process, args=(self.worker_factory,), name=f"temporal-worker-{slot.index}"
+        )
+        slot.process.start()
+        slot.started_at = time.monotonic()
+        logger.info(f"WorkerPool: Started worker process {slot.index} (pid {slot.process.pid})")
+
+    def _supervise(self) -> None:
+        """Restart worker processes that exited, backing off if they crash right after starting."""
+        now = time.monotonic()
+        for slot in self._slots:
+            if slot.process is not None and slot.process.exitcode is not None:
+                exitcode = slot.process.exitcode
+                metrics.worker_process_exited(slot.process.pid)
+                slot.process.close()
+                slot.process = None
+                if now - slot.started_at >= _STABLE_RUN_SECONDS:
+                    slot.backoff = 0.0
+                else:
+                    slot.backoff = min(max(slot.backoff * 2, self.restart_backoff), self.restart_backoff_max)
+                slot.restart_at = now + slot.backoff
+                logger.warning(
+                    f"WorkerPool: Worker process {slot.index} exited with code {exitcode}, "
+                    f"restarting in {slot.backoff:.1f}s"
+                )
+            if slot.process is None and now >= slot.restart_at:
+                slot.restarts += 1 if slot.started_at else 0
+                self._start_process(slot)
+
+    def _health_status(self) -> dict:
+        routing = self.routes_client.status()
+        alive = sum(1 for slot in self._slots if slot.process is not None and slot.process.is_alive())
+        live = not self.stop_event.is_set() and routing['pollerState'] != "stopped"
+        return {
+            'live': live,
+            'ready': live and routing['ready'] and alive == self.processes,
+            'processes': [
+                {
+                    'index': slot.index,
+                    'pid': slot.process.pid if slot.process is not None else None,
+                    'alive': slot.process is not None and slot.process.is_alive(),
+                    'restarts': slot.restarts
+                }
+                for slot in self._slots
+            ],
+            'routing': routing
+        }
+
+    def _shutdown(self) -> None:
+        logger.info("WorkerPool: Received shutdown signal, stopping worker processes...")
+        self.stop_event.set()
+
+    async def _stop_processes(self) -> None:
+        running = [slot.process for slot in self._slots if slot.process is not None]
+        for process in running:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.shutdown_timeout
+        while any(process.is_alive() for process in running) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        for process in running:
+            if process.is_alive():
+                logger.warning(f"WorkerPool: Worker process {process.pid} did not stop in time, killing it")
+                process.kill()
+            process.join()
+
+    async def start(self) -> None:
+        """Start the worker processes and supervise them until a shutdown signal."""
+        self.stop_event = asyncio.Event()
+        self._prepare_runtime_dir()
+        # Configured like the workers' routing clients, so it refreshes the shared cache they follow
+        if self.hosted_sandboxes is not None:
+            self.routes_client = RoutesAPIClient(
+                sandbox_name="", hosted_sandboxes=self.hosted_sandboxes, serve_baseline=self.serve_baseline
+            )
+        else:
+            self.routes_client = RoutesAPIClient(sandbox_name=os.environ.get("SIGNADOT_SANDBOX_NAME", ""))
+        metrics.track_routing(self.routes_client)
+        if not self.routes_client.try_become_refresher():
+            logger.info("WorkerPool: Another process refreshes the routing rules for this node, following it")
+        refresher = asyncio.create_task(self.routes_client._periodic_cache_updater())
+
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._shutdown)
+        try:
+            if self.health_port:
+                self.health_server = HealthServer(self._health_status, self.health_port)
+                await self.health_server.start()
+            logger.info(f"WorkerPool: Starting {self.processes} worker processes")
+            while not self.stop_event.is_set():
+                self._supervise()
+                try:
+                    await asyncio.wait_for(self.stop_event.wait(), 1.0)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self._stop_processes()
+            refresher.cancel()
+            await asyncio.gather(refresher, return_exceptions=True)
+            if self.health_server is not None:
+                await self.health_server.stop()
+            await self.routes_client.close()
+            shutil.rmtree(self._runtime_dir, ignore_errors=True)
+            logger.info("WorkerPool: Shutdown complete.")
+
+    def run(self) -> None:
+        """Entry point for running the pool."""
+        asyncio.run(self.start())
@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from temporalio.worker import (
+    CustomSlotSupplier,
+    SlotMarkUsedContext,
+    SlotPermit,
+    SlotReleaseContext,
+    SlotReserveContext,
+    WorkerTuner,
+)
+
+import metrics
+
+logger = logging.getLogger("temporal_worker.worker_tuning")
+
+# Env var -> temporalio.worker.Worker argument; unset ones keep the SDK default
+_WORKER_INT_OPTIONS = {
+    "WORKER_MAX_CACHED_WORKFLOWS": "max_cached_workflows",
+    "WORKER_MAX_CONCURRENT_WORKFLOW_TASKS": "max_concurrent_workflow_tasks",
+    "WORKER_MAX_CONCURRENT_ACTIVITIES": "max_concurrent_activities",
+    "WORKER_MAX_CONCURRENT_LOCAL_ACTIVITIES": "max_concurrent_local_activities",
+    "WORKER_MAX_WORKFLOW_TASK_POLLS": "max_concurrent_workflow_task_polls",
+    "WORKER_MAX_ACTIVITY_TASK_POLLS": "max_concurrent_activity_task_polls",
+}
+# Slot limits the SDK uses when none are configured
+DEFAULT_MAX_SLOTS = 100
+
+
+def worker_options_from_env() -> Dict[str, Any]:
+    """Worker concurrency options set through the environment."""
+    options = {}
+    for env_var, option in _WORKER_INT_OPTIONS.items():
+        value = os.environ.get(env_var, "")
+        if value:
+            options[option] = int(value)
+    return options
+
+
+class _TimedPermit(SlotPermit):
+    def __init__(self):
+        self.used_at: Optional[float] = None
+
+
+class AdaptiveSlotSupplier(CustomSlotSupplier):
+    """
+    Slot supplier whose limit is moved between `minimum` and `maximum` by an
+    AdaptiveConcurrencyController. Also tracks how long used slots are held
+    (the task latency) as an exponential moving average.
+    """
+
+    def __init__(self, slot_type: str, minimum: int, maximum: int):
+        self.slot_type = slot_type
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = minimum
+        self.reserved = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.latency_ema: Optional[float] = None
+        # Reservations are awaited on the worker's event loop; releases may come from other threads
+        self._lock = threading.Lock()
+        self._waiters: Deque[Tuple[asyncio.AbstractEventLoop, "asyncio.Future[None]"]] = deque()
+
+    def _wake(self, count: int) -> None:
+        """Wake up to `count` pending reservations (lock held)."""
+        while count > 0 and self._waiters:
+            loop, waiter = self._waiters.popleft()
+            if not waiter.done():
+                loop.call_soon_threadsafe(self._resolve, waiter)
+                count -= 1
+
+    def _resolve(self, waiter: "asyncio.Future[None]") -> None:
+        if not waiter.done():
+            waiter.set_result(None)
+        else:
+            # Cancelled after being picked: pass the wake-up on
+            with self._lock:
+                self._wake(self.limit - self.reserved)
+
+    async def reserve_slot(self, ctx: SlotReserveContext) -> SlotPermit:
+        while True:
+            with self._lock:
+                if self.reserved < self.limit:
+                    self.reserved += 1
+                    return _TimedPermit()
+                loop = asyncio.get_running_loop()
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            await waiter
+
+    def try_reserve_slot(self, ctx: SlotReserveContext) -> Optional[SlotPermit]:
+        with self._lock:
+            if self.reserved < self.limit:
+                self.reserved += 1
+                return _TimedPermit()
+        return None
+
+    def mark_slot_used(self, ctx: SlotMarkUsedContext) -> None:
+        if isinstance(ctx.permit, _TimedPermit):
+            ctx.permit.used_at = time.monotonic()
+        with self._lock:
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def release_slot(self, ctx: SlotReleaseContext) -> None:
+        used_at = ctx.permit.used_at if isinstance(ctx.permit, _TimedPermit) else None
+        with self._lock:
+            self.reserved -= 1
+            if used_at is not None:
+                self.in_use -= 1
+                latency = time.monotonic() - used_at
+                self.latency_ema = latency if self.latency_ema is None else 0.8 * self.latency_ema + 0.2 * latency
+            self._wake(self.limit - self.reserved)
+
+    def set_limit(self, limit: int) -> None:
+        with self._lock:
+            self.limit = max(self.minimum, min(self.maximum, limit))
+            self._wake(self.limit - self.reserved)
+
+    def take_peak_in_use(self) -> int:
+        """Most slots used at once since the last call."""
+        with self._lock:
+            peak, self.peak_in_use = self.peak_in_use, self.in_use
+        return peak
+
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+    except OSError:
+        return None
+    return int(value) if value.isdigit() else None
+
+
+def _memory_limit_bytes() -> Optional[int]:
+    """Container memory limit (cgroup v2 or v1), or None if unlimited/unknown."""
+    limit = _read_int("/sys/fs/cgroup/memory.max") or _read_int("/sys/fs/cgroup/memory/memory.limit_in_bytes")
+    # cgroup v1 reports "unlimited" as a huge number
+    if limit is None or limit >= 1 << 60:
+        return None
+    return limit
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class AdaptiveConcurrencyController:
+    """
+    Auto-tunes the worker's workflow, activity and local activity slot limits.
+
+    Every interval, each limit is cut by a quarter if the process is under
+    pressure (event-loop lag, memory use or that slot type's task latency above
+    target) and grown if it was fully used without pressure, so small sandbox
+    pods and large baseline pods each settle on a limit that suits them.
+    """
+
+    def __init__(self, maximums: Dict[str, int]):
+        self.interval = float(os.environ.get("WORKER_AUTOTUNE_INTERVAL_SECONDS", "1"))
+        self.max_loop_lag = float(os.environ.get("WORKER_AUTOTUNE_MAX_LOOP_LAG_SECONDS", "0.1"))
+        self.target_memory = float(os.environ.get("WORKER_AUTOTUNE_TARGET_MEMORY", "0.8"))
+        self.latency_factor = float(os.environ.get("WORKER_AUTOTUNE_LATENCY_FACTOR", "2"))
+        minimum = int(os.environ.get("WORKER_AUTOTUNE_MIN_SLOTS", "2"))
+        memory_limit = os.environ.get("WORKER_AUTOTUNE_MEMORY_LIMIT_BYTES", "")
+        self.memory_limit = int(memory_limit) if memory_limit else _memory_limit_bytes()
+        self.suppliers = {
+            slot_type: AdaptiveSlotSupplier(slot_type, min(minimum, maximum), maximum)
+            for slot_type, maximum in maximums.items()
+        }
+        # Per slot type, the lowest recent task latency: the reference for "slower than usual"
+        self._best_latency: Dict[str, float] = {}
+        self.loop_lag = 0.0
+        self.report_metrics()
+
+    @staticmethod
+    def from_env(worker_options: Dict[str, Any]) -> "AdaptiveConcurrencyController":
+        """Controller whose maximums are the configured slot limits (or the SDK defaults)."""
+        return AdaptiveConcurrencyController({
+            "workflow": worker_options.get("max_concurrent_workflow_tasks", DEFAULT_MAX_SLOTS),
+            "activity": worker_options.get("max_concurrent_activities", DEFAULT_MAX_SLOTS),
+            "local-activity": worker_options.get("max_concurrent_local_activities", DEFAULT_MAX_SLOTS),
+        })
+
+    def tuner(self) -> WorkerTuner:
+        return WorkerTuner.create_composite(
+            workflow_supplier=self.suppliers["workflow"],
+            activity_supplier=self.suppliers["activity"],
+            local_activity_supplier=self.suppliers["local-activity"],
+        )
+
+    def apply_to(self, worker_options: Dict[str, Any]) -> Dict[str, Any]:
+        """Worker options using this controller's tuner (mutually exclusive with fixed slot limits)."""
+        options = {
+            option: value for option, value in worker_options.items()
+            if option not in ("max_concurrent_workflow_tasks", "max_concurrent_activities",
+                              "max_concurrent_local_activities")
+        }
+        options["tuner"] = self.tuner()
+        return options
+
+    def _memory_pressure(self) -> bool:
+        if not self.memory_limit:
+            return False
+        rss = _rss_bytes()
+        return rss is not None and rss > self.target_memory * self.memory_limit
+
+    def _latency_pressure(self, slot_type: str, supplier: AdaptiveSlotSupplier) -> bool:
+        latency = supplier.latency_ema
+        if latency is None:
+            return False
+        # Drifts up slowly so one unusually fast task doesn't set the bar forever
+        best = min(self._best_latency.get(slot_type, latency) * 1.05, latency)
+        self._best_latency[slot_type] = best
+        return latency > self.latency_factor * best
+
+    def report_metrics(self) -> None:
+        """
+        Export the current limits, slots in use and loop lag. Set every interval rather
+        than read at scrape time, so a worker pool can aggregate them across processes.
+        """
+        for slot_type, supplier in self.suppliers.items():
+            metrics.WORKER_SLOT_LIMIT.labels(slot_type).set(supplier.limit)
+            metrics.WORKER_SLOTS_IN_USE.labels(slot_type).set(supplier.in_use)
+        metrics.EVENT_LOOP_LAG.set(self.loop_lag)
+
+    def adjust(self) -> None:
+        """One tuning step (also called by `run` every interval)."""
+        overloaded = self.loop_lag > self.max_loop_lag or self._memory_pressure()
+        for slot_type, supplier in self.suppliers.items():
+            peak = supplier.take_peak_in_use()
+            if overloaded or self._latency_pressure(slot_type, supplier):
+                new_limit = supplier.limit - max(1, supplier.limit // 4)
+            elif peak >= supplier.limit:
+                new_limit = supplier.limit + max(1, supplier.limit // 4)
+            else:
+                continue
+            new_limit = max(supplier.minimum, min(supplier.maximum, new_limit))
+            if new_limit != supplier.limit:
+                logger.info(
+                    f"WorkerTuning: {slot_type} slots {supplier.limit} -> {new_limit} "
+                    f"(loop lag {self.loop_lag * 1000:.0f}ms, in use {peak})"
+                )
+                supplier.set_limit(new_limit)
+
+    async def run(self) -> None:
+        """Measure event-loop lag and adjust the slot limits until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.loop_lag = max(0.0, loop.time() - expected)
+            self.adjust()
+            self.report_metrics()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            'loopLagSeconds': round(self.loop_lag, 4),
+            'slots': {
+                slot_type: {'limit': s.limit, 'inUse': s.in_use, 'max': s.maximum}
+                for slot_type, s in self.suppliers.items()
+            }
+        }
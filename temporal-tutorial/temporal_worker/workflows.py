@@ -1,9 +1,18 @@
+import asyncio
+import dataclasses
 from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
 from temporalio import workflow
 from temporalio.common import RetryPolicy
-from temporalio.exceptions import ApplicationError
-from models import PaymentDetails, WithdrawRequest, DepositRequest
-from activities import BankingActivities
+from temporalio.exceptions import ApplicationError, FailureError
+from models import (
+    PaymentDetails, WithdrawRequest, DepositRequest, TransferRequest, TransferResult, TransferResultBatch,
+    BulkTransferProgress, BulkTransferRequest, AccountOperation, AccountOperationResult, AccountEntitySignal,
+    AccountCheckpoint, AccountEntityInput, TRANSFER_MODE_ATOMIC, TRANSFER_MODE_ATOMIC_LOCAL,
+    TRANSFER_MODE_TWO_STEP_LOCAL, TRANSFER_MODE_ENTITY
+)
+from activities import AccountEntityActivities, BankingActivities, TransferResultSink
 
 import logging
 logger = logging.getLogger("temporal_worker.product.workflows")
@@ -16,14 +25,93 @@ COMMON_RETRY_POLICY = RetryPolicy(
     maximum_interval=timedelta(seconds=10)
 )
 
+# Account entities retry checkpoints until they succeed: failing would lose their state
+CHECKPOINT_RETRY_POLICY = RetryPolicy(
+    initial_interval=timedelta(seconds=1),
+    backoff_coefficient=2.0,
+    maximum_interval=timedelta(seconds=30)
+)
+
+# How long a transfer waits for an account entity to apply its debit/credit
+ACCOUNT_OPERATION_TIMEOUT = timedelta(minutes=5)
+
+
+async def _execute_banking_activity(activity: Callable, arg: Any, local: bool) -> Any:
+    """
+    Run a banking activity, as a local activity if `local`: executed by the worker
+    running the workflow task, without scheduling round trips through the server
+    or the activity's own scheduled/started/completed history events
+    """
+    if local:
+        return await workflow.execute_local_activity(
+            activity,
+            arg,
+            start_to_close_timeout=timedelta(seconds=5),
+            retry_policy=COMMON_RETRY_POLICY
+        )
+    return await workflow.execute_activity(
+        activity,
+        arg,
+        start_to_close_timeout=timedelta(seconds=30),
+        retry_policy=COMMON_RETRY_POLICY
+    )
+
+
+def account_entity_workflow_id(account_id: str) -> str:
+    """Workflow ID of the AccountEntityWorkflow of `account_id`"""
+    return f"account-{account_id}"
+
+
 @workflow.defn
 class MoneyTransferWorkflow:
-    """Baseline money transfer workflow - 2 step process"""
+    """
+    Baseline money transfer workflow - 2 step process
+
+    `transfer_mode` "atomic" does both steps in one `transfer` activity instead,
+    and the "-local" modes run the activities as local activities. "entity"
+    signals the debit and credit to the accounts' AccountEntityWorkflows and
+    waits for their results.
+    """
+    
+    def __init__(self):
+        # Operation ID -> result signalled back by an account entity
+        self._account_results: Dict[str, AccountOperationResult] = {}
+    
+    @workflow.signal
+    def account_operation_result(self, result: AccountOperationResult) -> None:
+        """Result of a debit/credit signalled to an account entity"""
+        self._account_results[result.operation_id] = result
     
     @workflow.run
     async def run(self, payment_details: PaymentDetails) -> str:
         """Execute money transfer workflow"""
-        logger.info(f"Starting money transfer: {payment_details.from_account} -> {payment_details.to_account}, amount: {payment_details.amount}")
+        logger.info(f"Starting money transfer: {payment_details.from_account} -> {payment_details.to_account}, amount: {payment_details.amount}, mode: {payment_details.transfer_mode}")
+        
+        if payment_details.transfer_mode == TRANSFER_MODE_ENTITY:
+            debit = await self._account_operation(payment_details.from_account, "debit", payment_details.amount)
+            if not debit.success:
+                # Business logic failure, as in the withdraw activity
+                raise ApplicationError(debit.message, non_retryable=True)
+            logger.info(f"Debit successful: {debit.operation_id}")
+            credit = await self._account_operation(payment_details.to_account, "credit", payment_details.amount)
+            logger.info("Money transfer completed successfully")
+            return f"Transfer complete: {debit.operation_id} -> {credit.operation_id}"
+        
+        if payment_details.transfer_mode in (TRANSFER_MODE_ATOMIC, TRANSFER_MODE_ATOMIC_LOCAL):
+            transfer_result = await _execute_banking_activity(
+                BankingActivities.transfer,
+                TransferRequest(
+                    from_account=payment_details.from_account,
+                    to_account=payment_details.to_account,
+                    amount=payment_details.amount,
+                    reference=payment_details.reference
+                ),
+                local=payment_details.transfer_mode == TRANSFER_MODE_ATOMIC_LOCAL
+            )
+            logger.info(f"Money transfer completed successfully: {transfer_result.transaction_id}")
+            return f"Transfer complete: {transfer_result.transaction_id}"
+        
+        local = payment_details.transfer_mode == TRANSFER_MODE_TWO_STEP_LOCAL
         
         # Step 1: Withdraw money from source account
         withdraw_request = WithdrawRequest(
@@ -32,12 +120,7 @@ class MoneyTransferWorkflow:
             reference=payment_details.reference
         )
         
-        withdraw_result = await workflow.execute_activity(
-            BankingActivities.withdraw,
-            withdraw_request,
-            start_to_close_timeout=timedelta(seconds=30),
-            retry_policy=COMMON_RETRY_POLICY
-        )
+        withdraw_result = await _execute_banking_activity(BankingActivities.withdraw, withdraw_request, local)
         
         logger.info(f"Withdrawal successful: {withdraw_result.transaction_id}")
         
@@ -48,14 +131,317 @@ class MoneyTransferWorkflow:
             reference=payment_details.reference
         )
         
-        deposit_result = await workflow.execute_activity(
-            BankingActivities.deposit,
-            deposit_request,
-            start_to_close_timeout=timedelta(seconds=30),
-            retry_policy=COMMON_RETRY_POLICY
-        )
+        deposit_result = await _execute_banking_activity(BankingActivities.deposit, deposit_request, local)
         
         logger.info(f"Deposit successful: {deposit_result.transaction_id}")
-        logger.info(f"Money transfer completed successfully")
+        logger.info("Money transfer completed successfully")
         
-        return f"Transfer complete: {withdraw_result.transaction_id} -> {deposit_result.transaction_id}"
\ No newline at end of file
+        return f"Transfer complete: {withdraw_result.transaction_id} -> {deposit_result.transaction_id}"
+    
+    async def _account_operation(self, account_id: str, signal: str, amount: str) -> AccountOperationResult:
+        """Signal a debit/credit to the account's entity workflow and wait for its result"""
+        info = workflow.info()
+        operation = AccountOperation(
+            operation_id=f"{info.workflow_id}/{info.run_id}/{signal}",
+            amount=amount,
+            reply_to=info.workflow_id
+        )
+        entity_id = account_entity_workflow_id(account_id)
+        try:
+            await workflow.get_external_workflow_handle(entity_id).signal(signal, operation)
+        except FailureError:
+            # Not running (not started yet, or completed when idle): signal-with-start it
+            await workflow.execute_local_activity(
+                AccountEntityActivities.signal_account_entity,
+                AccountEntitySignal(workflow_id=entity_id, account_id=account_id, signal=signal, operation=operation),
+                start_to_close_timeout=timedelta(seconds=10),
+                retry_policy=COMMON_RETRY_POLICY
+            )
+        try:
+            await workflow.wait_condition(
+                lambda: operation.operation_id in self._account_results, timeout=ACCOUNT_OPERATION_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            # No reply (e.g. the entity failed to signal back): the operation may still be applied later
+            raise ApplicationError(
+                f"Account entity {entity_id} did not reply to {signal} {operation.operation_id} "
+                f"within {ACCOUNT_OPERATION_TIMEOUT}",
+                non_retryable=True
+            )
+        return self._account_results.pop(operation.operation_id)
+
+
+@workflow.defn
+class AccountEntityWorkflow:
+    """
+    Long-lived account entity workflow - opt-in, for hot accounts
+
+    Holds the balance of one account and applies the debit/credit signals it receives
+    in memory, a batch at a time, signalling each result back to the requesting
+    workflow, so concurrent transfers on the account no longer race for the stored
+    balance. The net change is checkpointed to the account store after
+    `checkpoint_every` operations, or `checkpoint_interval_seconds` after the first
+    unsaved one. After `max_operations` operations (or when Temporal suggests it) the
+    workflow continues as new with its balance, unapplied signals and recently applied
+    operation IDs. Balance changes made outside the entity are only picked up at its
+    checkpoints, so an account should be updated through its entity only.
+    """
+    
+    def __init__(self):
+        self._pending: List[AccountOperation] = []
+        self._balance: Optional[Decimal] = None
+        # Net balance change not yet checkpointed to the account store
+        self._unsaved_delta = Decimal(0)
+        self._unsaved = 0
+    
+    @workflow.signal
+    def debit(self, operation: AccountOperation) -> None:
+        """Take `operation.amount` from the account, unless the balance is insufficient"""
+        self._pending.append(dataclasses.replace(operation, kind="debit"))
+    
+    @workflow.signal
+    def credit(self, operation: AccountOperation) -> None:
+        """Add `operation.amount` to the account"""
+        self._pending.append(dataclasses.replace(operation, kind="credit"))
+    
+    @workflow.query
+    def balance(self) -> Optional[str]:
+        """Current balance, including changes not yet checkpointed"""
+        return None if self._balance is None else str(self._balance)
+    
+    @workflow.run
+    async def run(self, entity: AccountEntityInput) -> str:
+        """Serve the account until idle; returns the final balance"""
+        # Operations the previous run did not get to come before any signalled to this one
+        self._pending[:0] = entity.pending
+        applied = list(entity.applied)
+        applied_ids = set(applied)
+        if entity.balance is None:
+            # A zero checkpoint loads the stored balance
+            await self._checkpoint(entity.account_id)
+        else:
+            self._balance = Decimal(entity.balance)
+        logger.info(f"Account entity {entity.account_id} started: balance {self._balance}, {len(self._pending)} pending")
+        
+        operations = 0
+        checkpoint_due = 0.0
+        while operations < entity.max_operations and not workflow.info().is_continue_as_new_suggested():
+            timeout = checkpoint_due - workflow.time() if self._unsaved else entity.idle_timeout_seconds
+            try:
+                await workflow.wait_condition(lambda: bool(self._pending), timeout=timedelta(seconds=max(timeout, 0.001)))
+            except asyncio.TimeoutError:
+                if self._unsaved:
+                    await self._checkpoint(entity.account_id)
+                    continue
+                logger.info(f"Account entity {entity.account_id} idle, completing: balance {self._balance}")
+                return str(self._balance)
+            
+            batch, self._pending = self._pending, []
+            if not self._unsaved:
+                checkpoint_due = workflow.time() + entity.checkpoint_interval_seconds
+            replies = []
+            for operation in batch:
+                # A signal-with-start retry can deliver an operation twice
+                if operation.operation_id in applied_ids:
+                    continue
+                result = self._apply(entity.account_id, operation)
+                applied.append(operation.operation_id)
+                applied_ids.add(operation.operation_id)
+                if operation.reply_to:
+                    replies.append(self._reply(operation.reply_to, result))
+            operations += len(batch)
+            await asyncio.gather(*replies)
+            if self._unsaved >= entity.checkpoint_every:
+                await self._checkpoint(entity.account_id)
+        
+        if self._unsaved:
+            await self._checkpoint(entity.account_id)
+        logger.info(f"Account entity {entity.account_id}: {operations} operations applied, continuing as new")
+        workflow.continue_as_new(dataclasses.replace(
+            entity,
+            balance=str(self._balance),
+            pending=self._pending,
+            applied=applied[-entity.max_operations:]
+        ))
+    
+    def _apply(self, account_id: str, operation: AccountOperation) -> AccountOperationResult:
+        amount = Decimal(operation.amount)
+        if operation.kind == "debit" and self._balance < amount:
+            return AccountOperationResult(
+                operation_id=operation.operation_id,
+                account_id=account_id,
+                success=False,
+                balance_after=str(self._balance),
+                message=f"Insufficient funds: balance={self._balance}, requested={operation.amount}"
+            )
+        change = -amount if operation.kind == "debit" else amount
+        self._balance += change
+        self._unsaved_delta += change
+        self._unsaved += 1
+        return AccountOperationResult(
+            operation_id=operation.operation_id,
+            account_id=account_id,
+            success=True,
+            balance_after=str(self._balance),
+            message="Debit successful" if operation.kind == "debit" else "Credit successful"
+        )
+    
+    async def _reply(self, workflow_id: str, result: AccountOperationResult) -> None:
+        try:
+            await workflow.get_external_workflow_handle(workflow_id).signal(
+                MoneyTransferWorkflow.account_operation_result, result
+            )
+        except FailureError as e:
+            # The requester is gone (e.g. timed out); the operation stays applied
+            logger.warning(f"Could not return result of {result.operation_id} to {workflow_id}: {e}")
+    
+    async def _checkpoint(self, account_id: str) -> None:
+        """Apply the unsaved net change to the account store and take its balance"""
+        response = await workflow.execute_activity(
+            BankingActivities.checkpoint_account,
+            AccountCheckpoint(account_id=account_id, delta=str(self._unsaved_delta), reference="checkpoint"),
+            start_to_close_timeout=timedelta(seconds=30),
+            retry_policy=CHECKPOINT_RETRY_POLICY
+        )
+        # Operations are only applied between checkpoints, so this includes all of them
+        self._balance = Decimal(response.balance_after)
+        self._unsaved_delta = Decimal(0)
+        self._unsaved = 0
+
+
+@workflow.defn
+class BulkTransferWorkflow:
+    """
+    Bulk transfer workflow - many transfers with bounded fan-out
+
+    Transfers are done a batch at a time by withdraw_batch/deposit_batch, with up to
+    `max_concurrency` batches in flight, and each batch's results are streamed to the
+    record_transfer_results activity instead of being returned. With `shard_size` set,
+    the payments are instead split into child BulkTransferWorkflows of that size, up to
+    `max_concurrency` at once. After `batches_per_run` batches (or shards), or when
+    Temporal suggests it, the workflow continues as new with the remaining payments,
+    so its history stays bounded. Progress is available through the `progress` query.
+    """
+
+    def __init__(self):
+        self._progress: Optional[BulkTransferProgress] = None
+        self._in_flight = 0
+
+    @workflow.query
+    def progress(self) -> Optional[BulkTransferProgress]:
+        """Transfers done so far"""
+        return self._progress
+
+    @workflow.run
+    async def run(self, request: BulkTransferRequest) -> BulkTransferProgress:
+        """Execute the bulk transfer; returns the transfer counts, not the per-transfer results"""
+        progress = self._progress = request.progress or BulkTransferProgress(total=len(request.payments))
+        bulk_id = request.bulk_id or workflow.info().workflow_id
+        unit = request.shard_size if request.shard_size > 0 else request.batch_size
+        logger.info(
+            f"Starting bulk transfer {bulk_id} run {progress.runs}: {len(request.payments)} transfers "
+            f"from #{request.offset}, {unit} per {'shard' if request.shard_size > 0 else 'batch'}"
+        )
+
+        tasks: List["asyncio.Task[None]"] = []
+        next_start = 0
+        while next_start < len(request.payments):
+            if len(tasks) >= request.batches_per_run or workflow.info().is_continue_as_new_suggested():
+                break
+            await workflow.wait_condition(lambda: self._in_flight < request.max_concurrency)
+            payments = request.payments[next_start:next_start + unit]
+            offset = request.offset + next_start
+            # Counted here, not when the task first runs, so the next wait sees it
+            self._in_flight += 1
+            if request.shard_size > 0:
+                tasks.append(asyncio.create_task(self._run_shard(request, bulk_id, offset, payments)))
+            else:
+                tasks.append(asyncio.create_task(self._run_batch(bulk_id, offset, payments)))
+            next_start += len(payments)
+        # Every transfer started in this run must finish before continuing as new
+        await asyncio.gather(*tasks)
+
+        if next_start < len(request.payments):
+            logger.info(f"Bulk transfer {bulk_id}: {progress.completed}/{progress.total} done, continuing as new")
+            progress.runs += 1
+            workflow.continue_as_new(BulkTransferRequest(
+                payments=request.payments[next_start:],
+                batch_size=request.batch_size,
+                max_concurrency=request.max_concurrency,
+                shard_size=request.shard_size,
+                batches_per_run=request.batches_per_run,
+                bulk_id=bulk_id,
+                offset=request.offset + next_start,
+                progress=progress,
+            ))
+        logger.info(f"Bulk transfer {bulk_id} completed: {progress.succeeded} succeeded, {progress.failed} failed")
+        return progress
+
+    async def _run_batch(self, bulk_id: str, offset: int, payments: List[PaymentDetails]) -> None:
+        try:
+            withdrawals = await workflow.execute_activity(
+                BankingActivities.withdraw_batch,
+                [WithdrawRequest(account_id=p.from_account, amount=p.amount, reference=p.reference) for p in payments],
+                start_to_close_timeout=timedelta(minutes=5),
+                heartbeat_timeout=timedelta(seconds=60),
+                retry_policy=COMMON_RETRY_POLICY
+            )
+            # Only transfers whose withdrawal succeeded are deposited
+            withdrawn = [i for i, withdrawal in enumerate(withdrawals) if withdrawal.success]
+            deposits = await workflow.execute_activity(
+                BankingActivities.deposit_batch,
+                [
+                    DepositRequest(account_id=payments[i].to_account, amount=payments[i].amount,
+                                   reference=payments[i].reference)
+                    for i in withdrawn
+                ],
+                start_to_close_timeout=timedelta(minutes=5),
+                heartbeat_timeout=timedelta(seconds=60),
+                retry_policy=COMMON_RETRY_POLICY
+            ) if withdrawn else []
+            deposit_ids = {i: deposit.transaction_id for i, deposit in zip(withdrawn, deposits)}
+            results = [
+                TransferResult(
+                    reference=payment.reference,
+                    from_account=payment.from_account,
+                    to_account=payment.to_account,
+                    amount=payment.amount,
+                    success=withdrawal.success,
+                    withdraw_transaction_id=withdrawal.transaction_id,
+                    deposit_transaction_id=deposit_ids.get(i, ""),
+                    message="Transfer complete" if withdrawal.success else withdrawal.message
+                )
+                for i, (payment, withdrawal) in enumerate(zip(payments, withdrawals))
+            ]
+            await workflow.execute_activity(
+                TransferResultSink.record_transfer_results,
+                TransferResultBatch(bulk_id=bulk_id, offset=offset, results=results),
+                start_to_close_timeout=timedelta(seconds=30),
+                retry_policy=COMMON_RETRY_POLICY
+            )
+            self._progress.completed += len(results)
+            self._progress.succeeded += len(withdrawn)
+            self._progress.failed += len(results) - len(withdrawn)
+        finally:
+            self._in_flight -= 1
+
+    async def _run_shard(self, request: BulkTransferRequest, bulk_id: str, offset: int,
+                         payments: List[PaymentDetails]) -> None:
+        try:
+            shard = await workflow.execute_child_workflow(
+                BulkTransferWorkflow.run,
+                BulkTransferRequest(
+                    payments=payments,
+                    batch_size=request.batch_size,
+                    max_concurrency=request.max_concurrency,
+                    batches_per_run=request.batches_per_run,
+                    bulk_id=bulk_id,
+                    offset=offset,
+                ),
+                id=f"{bulk_id}-shard-{offset}"
+            )
+            self._progress.completed += shard.completed
+            self._progress.succeeded += shard.succeeded
+            self._progress.failed += shard.failed
+        finally:
+            self._in_flight -= 1